@@ -22,12 +22,42 @@ import sys
 import os
 
 # Adjust path so alembic can find your app modules
-sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend')))
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+sys.path.insert(0, BACKEND_DIR)
 
-from app.database import Base  # or wherever your Base is defined
+from sqlalchemy.engine import make_url
+
+from app import database
+from app.database import Base, _normalize_url  # or wherever your Base is defined
+import app.models  # noqa: F401  registers the tables on Base.metadata
 
 target_metadata = Base.metadata
 
+
+
+def _database_url() -> str:
+    """The database the app opens: DATABASE_URL, else app.database's default.
+
+    DATABASE_URL is read at run time, not from app.database, so in-process
+    callers (the test suite) can switch it. The default is a SQLite file
+    relative to the app's working directory (backend/); it is resolved
+    against that directory so alembic hits the same file from the repo root
+    or from the Docker image's /app/backend.
+    """
+    if os.getenv("DATABASE_URL"):
+        return _normalize_url(os.environ["DATABASE_URL"])
+    url = make_url(database.DATABASE_URL)
+    if url.drivername.startswith("sqlite") and url.database and not os.path.isabs(url.database):
+        url = url.set(database=os.path.join(BACKEND_DIR, url.database))
+    return url.render_as_string(hide_password=False)
+
+
+# Always the app's database (SQLite or PostgreSQL); the ini's sqlalchemy.url is not used
+config.set_main_option("sqlalchemy.url", _database_url().replace("%", "%%"))
+
+# SQLite can't ALTER constraints in place; batch mode rebuilds the table instead.
+RENDER_AS_BATCH = config.get_main_option("sqlalchemy.url").startswith("sqlite")
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -52,6 +82,7 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        render_as_batch=RENDER_AS_BATCH,
     )
 
     with context.begin_transaction():
@@ -73,7 +104,9 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection,
+            target_metadata=target_metadata,
+            render_as_batch=RENDER_AS_BATCH,
         )
 
         with context.begin_transaction():
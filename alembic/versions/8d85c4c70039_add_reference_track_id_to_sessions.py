@@ -21,17 +21,19 @@ depends_on = None
 
 
 def upgrade():
-    op.add_column('sessions', sa.Column('reference_track_id', sa.String(), nullable=True))
-    op.create_foreign_key(
-        'fk_sessions_reference_track_id_tracks',
-        'sessions',
-        'tracks',
-        ['reference_track_id'],
-        ['id'],
-        ondelete='SET NULL'
-    )
+    # batch mode: SQLite can't add a foreign key to an existing table in place
+    with op.batch_alter_table('sessions') as batch_op:
+        batch_op.add_column(sa.Column('reference_track_id', sa.String(), nullable=True))
+        batch_op.create_foreign_key(
+            'fk_sessions_reference_track_id_tracks',
+            'tracks',
+            ['reference_track_id'],
+            ['id'],
+            ondelete='SET NULL'
+        )
 
 
 def downgrade():
-    op.drop_constraint('fk_sessions_reference_track_id_tracks', 'sessions', type_='foreignkey')
-    op.drop_column('sessions', 'reference_track_id')
\ No newline at end of file
+    with op.batch_alter_table('sessions') as batch_op:
+        batch_op.drop_constraint('fk_sessions_reference_track_id_tracks', type_='foreignkey')
+        batch_op.drop_column('reference_track_id')
\ No newline at end of file
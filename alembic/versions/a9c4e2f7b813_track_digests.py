@@ -0,0 +1,45 @@
+"""Add track_digests table and index chat_history.track_id
+
+Revision ID: a9c4e2f7b813
+Revises: f3b8d5e1a972
+Create Date: 2026-10-19 18:02:37.512904
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a9c4e2f7b813'
+down_revision: Union[str, Sequence[str], None] = 'f3b8d5e1a972'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = None if context.is_offline_mode() else sa.inspect(op.get_bind())
+
+    if inspector is None or 'track_digests' not in inspector.get_table_names():
+        op.create_table('track_digests',
+        sa.Column('track_id', sa.String(), nullable=False),
+        sa.Column('analysis_summary', sa.Text(), nullable=False),
+        sa.Column('feedback_digest', sa.Text(), nullable=False),
+        sa.Column('message_count', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.ForeignKeyConstraint(['track_id'], ['tracks.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('track_id')
+        )
+
+    if inspector is None or 'ix_chat_history_track_id' not in {
+        ix['name'] for ix in inspector.get_indexes('chat_history')
+    }:
+        op.create_index(op.f('ix_chat_history_track_id'), 'chat_history', ['track_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_chat_history_track_id'), table_name='chat_history')
+    op.drop_table('track_digests')
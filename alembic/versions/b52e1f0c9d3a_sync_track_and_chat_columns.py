@@ -0,0 +1,60 @@
+"""Sync tracks and chat_history columns with app.models
+
+Revision ID: b52e1f0c9d3a
+Revises: 8d85c4c70039
+Create Date: 2026-10-19 09:12:41.508113
+
+Adds the columns that were introduced through `Base.metadata.create_all` but
+never migrated (tracks.genre, tracks.upload_group_id and the comparison
+columns on chat_history). Columns that already exist are skipped.
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b52e1f0c9d3a'
+down_revision: Union[str, Sequence[str], None] = '8d85c4c70039'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _columns(table: str) -> set:
+    if context.is_offline_mode():
+        return set()
+    return {c['name'] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    track_cols = _columns('tracks')
+    if 'genre' not in track_cols:
+        op.add_column('tracks', sa.Column('genre', sa.String(), nullable=True))
+    if 'upload_group_id' not in track_cols:
+        op.add_column('tracks', sa.Column('upload_group_id', sa.String(), nullable=True))
+        # Existing tracks each become their own upload group
+        op.execute("UPDATE tracks SET upload_group_id = id WHERE upload_group_id IS NULL")
+        with op.batch_alter_table('tracks') as batch_op:
+            batch_op.alter_column('upload_group_id', existing_type=sa.String(), nullable=False)
+
+    chat_cols = _columns('chat_history')
+    for name, type_ in (
+        ('comparison_group_id', sa.String()),
+        ('compared_track_ids', sa.Text()),
+        ('compared_track_names', sa.Text()),
+    ):
+        if name not in chat_cols:
+            op.add_column('chat_history', sa.Column(name, type_, nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('chat_history') as batch_op:
+        batch_op.drop_column('compared_track_names')
+        batch_op.drop_column('compared_track_ids')
+        batch_op.drop_column('comparison_group_id')
+    with op.batch_alter_table('tracks') as batch_op:
+        batch_op.drop_column('upload_group_id')
+        batch_op.drop_column('genre')
@@ -0,0 +1,70 @@
+"""Recreate child foreign keys with ON DELETE CASCADE
+
+Revision ID: c3e9a7d41f20
+Revises: b52e1f0c9d3a
+Create Date: 2026-10-19 11:04:17.220931
+
+tracks.session_id, analysis_results.track_id, chat_history.session_id and
+chat_history.track_id now cascade on delete, so removing a session or track
+cleans up its children in the database. SQLite reflects these constraints
+without names, so batch mode assigns them names through a naming convention
+before they are dropped and recreated.
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3e9a7d41f20'
+down_revision: Union[str, Sequence[str], None] = 'b52e1f0c9d3a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+NAMING_CONVENTION = {"fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s"}
+
+# (table, column, referred table)
+CASCADE_FKS = (
+    ('tracks', 'session_id', 'sessions'),
+    ('analysis_results', 'track_id', 'tracks'),
+    ('chat_history', 'session_id', 'sessions'),
+    ('chat_history', 'track_id', 'tracks'),
+)
+
+
+def _conventional_name(table: str, column: str, referred: str) -> str:
+    return NAMING_CONVENTION["fk"] % {
+        "table_name": table, "column_0_name": column, "referred_table_name": referred,
+    }
+
+
+def _fk_name(table: str, column: str, referred: str) -> Union[str, None]:
+    """Name of the existing FK on `table.column`, falling back to the convention/PG default."""
+    if context.is_offline_mode():
+        # PostgreSQL's default name for constraints created by 7a38404fc5c7
+        return f"{table}_{column}_fkey"
+    for fk in sa.inspect(op.get_bind()).get_foreign_keys(table):
+        if fk['constrained_columns'] == [column]:
+            return fk.get('name') or _conventional_name(table, column, referred)
+    return None
+
+
+def _recreate(ondelete: Union[str, None]) -> None:
+    for table, column, referred in CASCADE_FKS:
+        name = _fk_name(table, column, referred)
+        new_name = _conventional_name(table, column, referred)
+        with op.batch_alter_table(table, naming_convention=NAMING_CONVENTION) as batch_op:
+            if name:
+                batch_op.drop_constraint(name, type_='foreignkey')
+            batch_op.create_foreign_key(new_name, referred, [column], ['id'], ondelete=ondelete)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _recreate('CASCADE')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _recreate(None)
@@ -0,0 +1,43 @@
+"""Add rag_conversations table
+
+Revision ID: c5d1e8a4f260
+Revises: a9c4e2f7b813
+Create Date: 2026-10-19 21:14:05.183526
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5d1e8a4f260'
+down_revision: Union[str, Sequence[str], None] = 'a9c4e2f7b813'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    inspector = None if context.is_offline_mode() else sa.inspect(op.get_bind())
+
+    if inspector is None or 'rag_conversations' not in inspector.get_table_names():
+        op.create_table('rag_conversations',
+        sa.Column('id', sa.String(), nullable=False),
+        sa.Column('corpus', sa.String(length=16), nullable=False),
+        sa.Column('summary', sa.Text(), nullable=True),
+        sa.Column('tail', sa.Text(), nullable=False),
+        sa.Column('summarized_pairs', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+        sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index(op.f('ix_rag_conversations_expires_at'), 'rag_conversations', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_rag_conversations_expires_at'), table_name='rag_conversations')
+    op.drop_table('rag_conversations')
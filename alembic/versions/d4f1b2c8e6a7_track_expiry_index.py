@@ -0,0 +1,47 @@
+"""Add indexed tracks.expires_at for incremental cleanup
+
+Revision ID: d4f1b2c8e6a7
+Revises: c3e9a7d41f20
+Create Date: 2026-10-19 13:27:05.913402
+
+Existing tracks expire one day after upload, matching the previous
+file-age based cleanup.
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4f1b2c8e6a7'
+down_revision: Union[str, Sequence[str], None] = 'c3e9a7d41f20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _columns(table: str) -> set:
+    if context.is_offline_mode():
+        return set()
+    return {c['name'] for c in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if 'expires_at' in _columns('tracks'):
+        return
+
+    op.add_column('tracks', sa.Column('expires_at', sa.DateTime(timezone=True), nullable=True))
+    op.create_index(op.f('ix_tracks_expires_at'), 'tracks', ['expires_at'], unique=False)
+
+    if op.get_context().dialect.name == 'sqlite':
+        op.execute("UPDATE tracks SET expires_at = datetime(uploaded_at, '+1 day') WHERE uploaded_at IS NOT NULL")
+    else:
+        op.execute("UPDATE tracks SET expires_at = uploaded_at + interval '1 day' WHERE uploaded_at IS NOT NULL")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_tracks_expires_at'), table_name='tracks')
+    with op.batch_alter_table('tracks') as batch_op:
+        batch_op.drop_column('expires_at')
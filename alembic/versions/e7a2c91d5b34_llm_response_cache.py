@@ -0,0 +1,45 @@
+"""Add llm_response_cache table
+
+Revision ID: e7a2c91d5b34
+Revises: d4f1b2c8e6a7
+Create Date: 2026-10-19 15:42:11.307786
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7a2c91d5b34'
+down_revision: Union[str, Sequence[str], None] = 'd4f1b2c8e6a7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if not context.is_offline_mode() and 'llm_response_cache' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table('llm_response_cache',
+    sa.Column('fingerprint', sa.String(length=64), nullable=False),
+    sa.Column('model', sa.String(), nullable=False),
+    sa.Column('response', sa.Text(), nullable=False),
+    sa.Column('prompt_tokens', sa.Integer(), nullable=True),
+    sa.Column('completion_tokens', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    sa.Column('expires_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('last_hit_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('hits', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('fingerprint')
+    )
+    op.create_index(op.f('ix_llm_response_cache_expires_at'), 'llm_response_cache', ['expires_at'], unique=False)
+    op.create_index(op.f('ix_llm_response_cache_last_hit_at'), 'llm_response_cache', ['last_hit_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_llm_response_cache_last_hit_at'), table_name='llm_response_cache')
+    op.drop_index(op.f('ix_llm_response_cache_expires_at'), table_name='llm_response_cache')
+    op.drop_table('llm_response_cache')
@@ -0,0 +1,48 @@
+"""Add token_usage_buckets table
+
+Revision ID: f3b8d5e1a972
+Revises: e7a2c91d5b34
+Create Date: 2026-10-19 17:08:46.512390
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3b8d5e1a972'
+down_revision: Union[str, Sequence[str], None] = 'e7a2c91d5b34'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+HISTOGRAM_COLUMNS = [f'latency_le_{bound}ms' for bound in (250, 500, 1000, 2000, 4000, 8000, 16000, 32000)] + [
+    'latency_gt_32000ms'
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if not context.is_offline_mode() and 'token_usage_buckets' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table('token_usage_buckets',
+    sa.Column('bucket_start', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('model', sa.String(length=64), nullable=False),
+    sa.Column('endpoint', sa.String(length=128), nullable=False),
+    sa.Column('requests', sa.Integer(), nullable=False),
+    sa.Column('errors', sa.Integer(), nullable=False),
+    sa.Column('prompt_tokens', sa.Integer(), nullable=False),
+    sa.Column('completion_tokens', sa.Integer(), nullable=False),
+    sa.Column('total_tokens', sa.Integer(), nullable=False),
+    sa.Column('cost', sa.Float(), nullable=False),
+    sa.Column('latency_count', sa.Integer(), nullable=False),
+    sa.Column('latency_sum_ms', sa.Float(), nullable=False),
+    *[sa.Column(name, sa.Integer(), nullable=False) for name in HISTOGRAM_COLUMNS],
+    sa.PrimaryKeyConstraint('bucket_start', 'model', 'endpoint')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('token_usage_buckets')
@@ -14,6 +14,8 @@ from typing import Tuple
 
 import numpy as np
 
+from app.metrics import StageClock
+
 # Prefer librosa/audioread if available
 try:
     import librosa  # type: ignore
@@ -97,9 +99,11 @@ def compute_rms_chunks(file_path, chunk_duration=0.5, json_output_path=None, smo
     Returns: list[float] of smoothed RMS in dB (same format as before).
     """
     print(f"🔍 Using RMS chunk duration: {float(chunk_duration):.3f} sec")
+    stages = StageClock("rms")
 
     # Decode robustly, match librosa default behavior with sr=22050 mono
     y, sr = _safe_decode(str(file_path), target_sr=22050)
+    stages.lap("decode")
 
     if y is None or y.size == 0 or not np.isfinite(y).any():
         raise RuntimeError("Empty or invalid audio buffer")
@@ -123,12 +127,14 @@ def compute_rms_chunks(file_path, chunk_duration=0.5, json_output_path=None, smo
         raw_rms.append(float(np.round(rms_db + 0.82, 2)))
 
     smoothed_rms = smooth_rms_values(raw_rms, smoothing_factor=smoothing_factor)
+    stages.lap("compute")
 
     if json_output_path:
         json_path = Path(json_output_path)
         json_path.parent.mkdir(parents=True, exist_ok=True)
         with open(json_path, "w", encoding="utf-8") as f:
             json.dump(smoothed_rms, f)
+        stages.lap("write")
 
     return smoothed_rms
 
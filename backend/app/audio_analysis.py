@@ -17,6 +17,8 @@ from typing import Tuple, Dict, Any
 
 import numpy as np
 
+from app.metrics import StageClock
+
 # Keep your numpy compat shim
 if not hasattr(np, "complex"):
     np.complex = complex  # for older libs expecting np.complex
@@ -295,8 +297,11 @@ def analyze_audio(file_path, genre=None):
     Perform a full technical analysis with Render-friendly resource usage.
     Returns a dict; any field may be None if its sub-analysis fails.
     """
+    stages = StageClock("analysis")
+
     # 1) Decode mono @ 22.05 kHz (small & stable)
     y, sr = _safe_decode_mono(str(file_path), target_sr=22050)
+    stages.lap("decode")
     if y is None or y.size == 0 or not np.isfinite(y).any():
         raise RuntimeError("Empty or invalid decoded audio")
 
@@ -312,6 +317,7 @@ def analyze_audio(file_path, genre=None):
     except Exception as e:
         print("true_peak failed:", repr(e))
         true_peak_db = None
+    stages.lap("true_peak")
 
     # 3) Loudness & DR
     try:
@@ -325,6 +331,7 @@ def analyze_audio(file_path, genre=None):
     except Exception as e:
         print("DR/RMS failed:", repr(e))
         rms_db_peak, crest_factor = None, None
+    stages.lap("loudness")
 
     # 4) Transients
     try:
@@ -340,6 +347,7 @@ def analyze_audio(file_path, genre=None):
         print("transients failed:", repr(e))
         avg_transients = max_transients = None
         transient_desc = None
+    stages.lap("transients")
 
     # 5) Tempo + Key
     try:
@@ -357,6 +365,7 @@ def analyze_audio(file_path, genre=None):
     except Exception as e:
         print("key failed:", repr(e))
         key = None
+    stages.lap("tempo_key")
 
     # 6) Spectral analysis
     try:
@@ -379,6 +388,7 @@ def analyze_audio(file_path, genre=None):
         normalized_low_end = None
         band_energies = {}
         spectral_description = None
+    stages.lap("spectral")
 
     # 7) Peak issues (native peak, not true-peak)
     try:
@@ -1,98 +1,171 @@
+"""
+Expired upload cleanup for ZoundZcope.
+
+Tracks carry an indexed `expires_at` timestamp set at upload time. Cleanup
+selects only rows that are due, in batches ordered by expiry, so a run costs
+proportionally to the number of expired tracks rather than the size of the
+table. For each expired track the audio file and RMS JSON are removed, its
+analysis results deleted and `file_path` cleared (the Track row and its chat
+history are kept).
+
+A second pass sweeps files in the upload and RMS folders that no Track row
+points at (e.g. interrupted uploads) using a single `os.scandir` walk.
+
+Expired RAG assistant conversations (app.rag_conversations) are deleted in
+the same run.
+
+`cleanup_old_uploads()` is blocking; main.py runs it in a worker thread.
+
+Configuration:
+    MAX_FILE_AGE_SECONDS : Lifetime of an upload (24h).
+    CLEANUP_BATCH_SIZE   : Expired tracks processed per transaction (default 500).
+"""
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 import os
 import time
 import logging
 from app.database import SessionLocal
+from app.deletion import rms_path_for
 from app.models import Track, AnalysisResult
+from app.rag_conversations import purge_expired
+from app.storage import UPLOAD_FOLDER, RMS_ANALYSIS_FOLDER, storage
 
 logger = logging.getLogger("cleanup")
 
-BASE_DIR = Path(os.getcwd()).parent
-UPLOAD_FOLDER = BASE_DIR / "backend" / "uploads"
-RMS_ANALYSIS_FOLDER = BASE_DIR / "frontend-html" / "static" / "analysis"
 MAX_FILE_AGE_SECONDS =  24 * 60 * 60 # run daily
+CLEANUP_BATCH_SIZE = int(os.getenv("CLEANUP_BATCH_SIZE", "500"))
 
-def cleanup_old_uploads():
-    logger.info("Starting cleanup of old uploads...")
-    # print("Current working dir:", os.getcwd())
-    # print("BASE_DIR:", BASE_DIR)
-    # print("UPLOAD_FOLDER:", UPLOAD_FOLDER)
-    # print("RMS_ANALYSIS_FOLDER:", RMS_ANALYSIS_FOLDER)
-    now = time.time()
-    db = SessionLocal()
+
+def track_expiry(now: datetime = None) -> datetime:
+    """
+        Compute the expiry timestamp for a track uploaded now.
+
+        Args:
+            now (datetime, optional): Upload time; defaults to the current UTC time.
+
+        Returns:
+            datetime: Timezone-aware UTC time after which the upload is cleaned up.
+        """
+    now = now or datetime.now(timezone.utc)
+    return now + timedelta(seconds=MAX_FILE_AGE_SECONDS)
+
+
+def _unlink(path: Path, label: str) -> bool:
     try:
-        # Delete old audio files tracked in DB and remove their DB records
-        old_tracks = db.query(Track).all()
-        # print(f"Found {len(old_tracks)} tracks in DB")
-        for track in old_tracks:
-            file_path_str = track.file_path
-            if not file_path_str:
-                # print("Track has no file_path, skipping")
+        path.unlink()
+        logger.info(f"Deleted {label}: {path}")
+        storage.forget(path)
+        return True
+    except FileNotFoundError:
+        storage.forget(path)
+        return False
+    except Exception as e:
+        logger.error(f"Error deleting {label} {path}: {e}")
+        return False
+
+
+def _expire_tracks(db, now: datetime, stats: dict):
+    """Process due tracks batch by batch; each batch is its own transaction."""
+    while True:
+        batch = (
+            db.query(Track.id, Track.file_path)
+            .filter(Track.expires_at <= now, Track.file_path.isnot(None))
+            .order_by(Track.expires_at)
+            .limit(CLEANUP_BATCH_SIZE)
+            .all()
+        )
+        if not batch:
+            break
+
+        track_ids = [track_id for track_id, _ in batch]
+        stats["analysis_deleted"] += (
+            db.query(AnalysisResult)
+            .filter(AnalysisResult.track_id.in_(track_ids))
+            .delete(synchronize_session=False)
+        )
+        db.query(Track).filter(Track.id.in_(track_ids)).update(
+            {Track.file_path: None}, synchronize_session=False
+        )
+        db.commit()
+        stats["tracks_expired"] += len(batch)
+
+        # Files are removed after commit so a failed batch never orphans rows
+        for _, file_path in batch:
+            if _unlink(Path(file_path), "old track file"):
+                stats["files_deleted"] += 1
+            if _unlink(rms_path_for(file_path), "RMS file"):
+                stats["files_deleted"] += 1
+
+        if len(batch) < CLEANUP_BATCH_SIZE:
+            break
+
+
+def _sweep_orphans(folder: Path, referenced: set, cutoff: float, suffix: str, label: str) -> int:
+    """Delete old files in `folder` that no track references."""
+    deleted = 0
+    try:
+        entries = os.scandir(folder)
+    except FileNotFoundError:
+        return 0
+    with entries:
+        for entry in entries:
+            if not entry.is_file() or not entry.name.endswith(suffix) or entry.name in referenced:
+                continue
+            try:
+                if entry.stat().st_mtime >= cutoff:
+                    continue
+            except FileNotFoundError:
                 continue
+            if _unlink(Path(entry.path), label):
+                deleted += 1
+    return deleted
+
 
-            file_path = Path(file_path_str)
-            # print(f"Checking track file path: {file_path}")
-
-            if file_path.exists():
-                file_age = now - file_path.stat().st_mtime
-                # print(f"File age (seconds): {file_age}")
-                if file_age > MAX_FILE_AGE_SECONDS:
-                    try:
-                        file_path.unlink()
-                        logger.info(f"Deleted old track file: {file_path}")
-
-                        # Also delete associated RMS file if exists
-                        rms_filename = f"{file_path.name}_rms.json"
-                        rms_file_path = RMS_ANALYSIS_FOLDER / rms_filename
-                        if rms_file_path.exists():
-                            try:
-                                rms_file_path.unlink()
-                                logger.info(f"Deleted RMS file: {rms_file_path}")
-                            except Exception as e:
-                                logger.error(f"Error deleting RMS file {rms_file_path}: {e}")
-
-                        # Delete related analysis_results
-                        deleted_count = db.query(AnalysisResult).filter(AnalysisResult.track_id == track.id).delete()
-                        logger.info(f"Deleted {deleted_count} analysis results for track {track.id}")
-
-                        # Instead of deleting Track, just clear the file_path
-                        track.file_path = None
-                        db.add(track)  # mark for update
-
-                    except Exception as e:
-                        logger.error(f"Error deleting files or DB record for {file_path}: {e}")
-            #     else:
-            #         print(f"File not old enough to delete: {file_path}")
-            # else:
-            #     print(f"File path does not exist: {file_path}")
-
-        db.commit()  # Commit deletions after all done
-
-        # Delete all old orphan files in the UPLOAD_FOLDER (files not tracked in DB)
-        # print("Checking for orphan files in upload folder...")
-        for file_path in UPLOAD_FOLDER.iterdir():
-            if file_path.is_file():
-                file_age = now - file_path.stat().st_mtime
-                # print(f"Orphan file {file_path}, age: {file_age}")
-                if file_age > MAX_FILE_AGE_SECONDS:
-                    try:
-                        file_path.unlink()
-                        logger.info(f"Deleted orphan upload file: {file_path}")
-                    except Exception as e:
-                        logger.error(f"Error deleting orphan upload file {file_path}: {e}")
-
-        # Delete all old RMS JSON files in the RMS_ANALYSIS_FOLDER (cleanup orphan RMS files)
-        # print("Checking for orphan RMS JSON files...")
-        for rms_file in RMS_ANALYSIS_FOLDER.glob("*.json"):
-            file_age = now - rms_file.stat().st_mtime
-            # print(f"RMS file {rms_file}, age: {file_age}")
-            if file_age > MAX_FILE_AGE_SECONDS:
-                try:
-                    rms_file.unlink()
-                    logger.info(f"Deleted orphan RMS JSON file: {rms_file}")
-                except Exception as e:
-                    logger.error(f"Error deleting orphan RMS file {rms_file}: {e}")
+def cleanup_old_uploads() -> dict:
+    """
+        Remove expired uploads and orphaned files.
 
+        Returns:
+            dict: Counts (tracks_expired, analysis_deleted, files_deleted,
+                  orphans_deleted, rag_conversations_expired) and durations in seconds (expire_s, sweep_s, total_s).
+        """
+    logger.info("Starting cleanup of old uploads...")
+    started = time.perf_counter()
+    stats = {"tracks_expired": 0, "analysis_deleted": 0, "files_deleted": 0, "orphans_deleted": 0,
+             "rag_conversations_expired": 0}
+
+    db = SessionLocal()
+    try:
+        now = datetime.now(timezone.utc)
+        _expire_tracks(db, now, stats)
+        stats["rag_conversations_expired"] = purge_expired(db, now)
+        stats["expire_s"] = round(time.perf_counter() - started, 3)
+
+        # Names of files still owned by a track; anything else old enough is an orphan
+        sweep_started = time.perf_counter()
+        live_files = {
+            Path(file_path).name
+            for (file_path,) in db.query(Track.file_path).filter(Track.file_path.isnot(None))
+        }
+    except Exception:
+        db.rollback()
+        raise
     finally:
         db.close()
-    logger.info("Cleanup finished.")
+
+    cutoff = time.time() - MAX_FILE_AGE_SECONDS
+    stats["orphans_deleted"] += _sweep_orphans(UPLOAD_FOLDER, live_files, cutoff, "", "orphan upload file")
+    stats["orphans_deleted"] += _sweep_orphans(
+        RMS_ANALYSIS_FOLDER, {f"{name}_rms.json" for name in live_files}, cutoff, ".json", "orphan RMS JSON file"
+    )
+    stats["sweep_s"] = round(time.perf_counter() - sweep_started, 3)
+    stats["total_s"] = round(time.perf_counter() - started, 3)
+
+    logger.info(
+        "Cleanup finished: %(tracks_expired)d tracks expired, %(analysis_deleted)d analysis rows, "
+        "%(files_deleted)d files, %(orphans_deleted)d orphans, %(rag_conversations_expired)d RAG conversations "
+        "in %(total_s).3fs "
+        "(expire %(expire_s).3fs, sweep %(sweep_s).3fs)", stats
+    )
+    return stats
@@ -1,17 +1,212 @@
-from sqlalchemy import create_engine
+"""
+Database configuration for ZoundZcope.
+
+This module creates the SQLAlchemy engines, session factories and the shared
+FastAPI dependencies used by every router. The backend is selected by
+DATABASE_URL: SQLite (default, single file) or PostgreSQL (pooled).
+
+Engines:
+    - engine        : Synchronous engine for write paths and background jobs.
+    - async_engine  : Async engine (aiosqlite for SQLite, asyncpg for PostgreSQL)
+                      used by read-heavy `async def` endpoints so they don't
+                      occupy threadpool slots.
+    Both are built by `create_engines(url)`, which the test suite also uses to
+    point the session factories at a per-test SQLite or PostgreSQL database.
+
+Configuration:
+    DATABASE_URL            : Sync database URL (default: sqlite:///./zoundzcope.db).
+                              'postgres://' URLs are accepted and normalized.
+    ASYNC_DATABASE_URL      : Optional explicit async URL. When unset it is derived
+                              from DATABASE_URL by swapping in the async driver.
+    DB_POOL_SIZE            : Persistent connections per engine (PostgreSQL only, default 5).
+    DB_MAX_OVERFLOW         : Extra connections allowed under burst load (default 10).
+    DB_POOL_TIMEOUT         : Seconds to wait for a free connection (default 30).
+    DB_POOL_RECYCLE         : Seconds before a connection is recycled (default 1800).
+    DB_STATEMENT_TIMEOUT_MS : Server-side statement timeout in ms (default 15000, 0 disables).
+
+    Pools are per process, so each uvicorn worker holds up to
+    DB_POOL_SIZE + DB_MAX_OVERFLOW connections per engine.
+
+Dependencies:
+    get_db()       : Yields a synchronous Session.
+    get_async_db() : Yields an AsyncSession.
+"""
+import os
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import sessionmaker, declarative_base
 
-DATABASE_URL = "sqlite:///./zoundzcope.db"
 
-engine = create_engine(
-    DATABASE_URL, connect_args={"check_same_thread": False}
-)
+def _normalize_url(url: str) -> str:
+    """
+        Normalize provider-style 'postgres://' URLs to SQLAlchemy's 'postgresql://'.
+
+        Args:
+            url (str): Database URL as configured in the environment.
+
+        Returns:
+            str: URL accepted by SQLAlchemy.
+        """
+    if url.startswith("postgres://"):
+        return "postgresql://" + url[len("postgres://"):]
+    return url
+
+
+DATABASE_URL = _normalize_url(os.getenv("DATABASE_URL", "sqlite:///./zoundzcope.db"))
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "15000"))
+
+
+def _to_async_url(url: str) -> str:
+    """
+        Derive the async driver URL from a sync database URL.
+
+        Args:
+            url (str): Sync SQLAlchemy URL (e.g. 'sqlite:///./x.db', 'postgresql://...').
+
+        Returns:
+            str: URL using aiosqlite/asyncpg, or the input unchanged if already async.
+        """
+    if url.startswith("sqlite:"):
+        return "sqlite+aiosqlite:" + url[len("sqlite:"):]
+    for prefix in ("postgresql+psycopg2:", "postgresql+psycopg:", "postgresql:", "postgres:"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg:" + url[len(prefix):]
+    return url
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or _to_async_url(DATABASE_URL)
+
+
+def _engine_options(url: str, is_async: bool = False) -> dict:
+    """
+        Build create_engine keyword arguments for a database URL.
+
+        SQLite keeps SQLAlchemy's default file pool. PostgreSQL gets a bounded
+        QueuePool with pre-ping (drops dead connections after failovers or idle
+        timeouts) and a server-side statement timeout so a runaway query can't
+        hold a pooled connection forever.
+
+        Args:
+            url (str): Database URL the engine is created for.
+            is_async (bool): True for the asyncpg engine, False for psycopg2/psycopg.
+
+        Returns:
+            dict: Keyword arguments for create_engine / create_async_engine.
+        """
+    if url.startswith("sqlite"):
+        return {} if is_async else {"connect_args": {"check_same_thread": False}}
+
+    connect_args = {}
+    if DB_STATEMENT_TIMEOUT_MS > 0:
+        if is_async:
+            connect_args["server_settings"] = {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}
+        else:
+            connect_args["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+        "connect_args": connect_args,
+    }
+
+
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    """SQLite ignores foreign keys (and ON DELETE CASCADE) unless enabled per connection."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+def create_engines(url: str, async_url: str = None):
+    """
+        Create the sync and async engines for a database.
+
+        Args:
+            url (str): Sync database URL.
+            async_url (str, optional): Async URL; derived from `url` when omitted.
+
+        Returns:
+            tuple[Engine, AsyncEngine]: Engines configured for the backend.
+        """
+    url = _normalize_url(url)
+    async_url = async_url or _to_async_url(url)
+    sync_engine = create_engine(url, **_engine_options(url))
+    async_db_engine = create_async_engine(async_url, **_engine_options(async_url, is_async=True))
+    if url.startswith("sqlite"):
+        event.listen(sync_engine, "connect", _enable_sqlite_foreign_keys)
+    if async_url.startswith("sqlite"):
+        event.listen(async_db_engine.sync_engine, "connect", _enable_sqlite_foreign_keys)
+    return sync_engine, async_db_engine
+
+
+engine, async_engine = create_engines(DATABASE_URL, ASYNC_DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
 Base = declarative_base()
 
+DEFAULT_USER_ID = 1
+
+
+def init_db():
+    """
+        Create missing tables and seed the default user.
+
+        Uploads create sessions owned by user id 1. SQLite never enforced that
+        foreign key, but PostgreSQL does, so the user row must exist.
+        Schema changes on existing databases are applied with
+        `alembic upgrade head`.
+        """
+    from app.models import User
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        if db.get(User, DEFAULT_USER_ID) is None:
+            db.add(User(
+                id=DEFAULT_USER_ID,
+                username="default",
+                email="default@zoundzcope.local",
+                hashed_password="",
+            ))
+            db.commit()
+    finally:
+        db.close()
+
+
 def get_db():
+    """
+        Provide a synchronous SQLAlchemy session for dependency injection.
+
+        Yields:
+            Session: Active SQLAlchemy session, closed after the request.
+        """
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+async def get_async_db():
+    """
+        Provide an async SQLAlchemy session for dependency injection.
+
+        Used by read-heavy `async def` endpoints so database I/O runs on the
+        event loop instead of holding a threadpool worker.
+
+        Yields:
+            AsyncSession: Active async session, closed after the request.
+        """
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,205 @@
+"""
+Bulk deletion helpers for ZoundZcope.
+
+This module removes sessions and tracks together with everything that hangs
+off them, in a single database transaction, and hands the on-disk artifacts
+(uploaded audio and RMS JSON) to a background deletion queue so the request
+doesn't wait on filesystem I/O.
+
+Database side:
+    - delete_tracks()  : Bulk-deletes chats, comparison groups that include
+                         the tracks, analysis results and the tracks.
+    - delete_session() : Same for every track in a session, plus the session's
+                         remaining chats and the session itself.
+    Both only stage the deletes; the caller commits once. The explicit child
+    deletes keep this correct on SQLite databases created before the
+    ON DELETE CASCADE foreign keys existed.
+
+Filesystem side:
+    - enqueue_artifact_removal() : Queue paths for removal by a daemon thread.
+    - pending_deletions()        : Current queue depth.
+"""
+from pathlib import Path
+import logging
+import queue
+import threading
+from typing import Iterable, List, Optional
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from app.models import Track, AnalysisResult, ChatMessage, Session as UserSession
+from app.storage import RMS_ANALYSIS_FOLDER, storage
+
+logger = logging.getLogger("deletion")
+
+# SQLite caps the number of expressions per statement; comparison lookups are chunked.
+_LIKE_BATCH = 100
+
+_deletion_queue: "queue.Queue[Path]" = queue.Queue()
+_worker: Optional[threading.Thread] = None
+_worker_lock = threading.Lock()
+
+
+def rms_path_for(file_path: str) -> Path:
+    """
+        Return the RMS JSON path written for an uploaded audio file.
+
+        Args:
+            file_path (str): Path of the uploaded audio file.
+
+        Returns:
+            Path: `<analysis folder>/<audio filename>_rms.json`.
+        """
+    return RMS_ANALYSIS_FOLDER / f"{Path(file_path).name}_rms.json"
+
+
+def track_artifacts(file_paths: Iterable[Optional[str]]) -> List[Path]:
+    """
+        List the on-disk artifacts (audio + RMS JSON) for the given audio paths.
+
+        Args:
+            file_paths (Iterable[str | None]): Track file paths; empty values are skipped.
+
+        Returns:
+            list[Path]: Audio and RMS paths to remove.
+        """
+    artifacts = []
+    for file_path in file_paths:
+        if file_path:
+            artifacts.append(Path(file_path))
+            artifacts.append(rms_path_for(file_path))
+    return artifacts
+
+
+def _comparison_groups_for(db: Session, track_ids: List[str]) -> List[str]:
+    """Find comparison groups whose compared_track_ids mention any of the tracks."""
+    groups = set()
+    for start in range(0, len(track_ids), _LIKE_BATCH):
+        batch = track_ids[start:start + _LIKE_BATCH]
+        rows = (
+            db.query(ChatMessage.comparison_group_id)
+            .filter(
+                ChatMessage.comparison_group_id.isnot(None),
+                or_(*[ChatMessage.compared_track_ids.contains(tid) for tid in batch]),
+            )
+            .distinct()
+            .all()
+        )
+        groups.update(group_id for (group_id,) in rows)
+    return list(groups)
+
+
+def delete_tracks(db: Session, track_ids: List[str]) -> dict:
+    """
+        Stage bulk deletes for tracks and all of their dependent rows.
+
+        Removes, with one statement per table:
+            - Chat messages attached to the tracks.
+            - Comparison groups (all their messages) that include any of the tracks.
+            - Analysis results of the tracks.
+            - The tracks themselves.
+
+        Args:
+            db (Session): Active session; the caller commits.
+            track_ids (list[str]): IDs of the tracks to delete.
+
+        Returns:
+            dict: Deleted row counts and the artifact paths to remove from disk.
+        """
+    track_ids = list(track_ids)
+    if not track_ids:
+        return {"chats": 0, "analysis": 0, "tracks": 0, "artifacts": []}
+
+    file_paths = [path for (path,) in db.query(Track.file_path).filter(Track.id.in_(track_ids)).all()]
+    group_ids = _comparison_groups_for(db, track_ids)
+
+    chat_filter = ChatMessage.track_id.in_(track_ids)
+    if group_ids:
+        chat_filter = or_(chat_filter, ChatMessage.comparison_group_id.in_(group_ids))
+
+    deleted_chats = db.query(ChatMessage).filter(chat_filter).delete(synchronize_session=False)
+    deleted_analysis = db.query(AnalysisResult).filter(AnalysisResult.track_id.in_(track_ids)).delete(synchronize_session=False)
+    deleted_tracks = db.query(Track).filter(Track.id.in_(track_ids)).delete(synchronize_session=False)
+
+    return {
+        "chats": deleted_chats,
+        "analysis": deleted_analysis,
+        "tracks": deleted_tracks,
+        "comparison_groups": len(group_ids),
+        "artifacts": track_artifacts(file_paths),
+    }
+
+
+def delete_session(db: Session, session_id: str) -> dict:
+    """
+        Stage bulk deletes for a session, its tracks and all dependent rows.
+
+        Args:
+            db (Session): Active session; the caller commits.
+            session_id (str): ID of the session to delete.
+
+        Returns:
+            dict: Deleted row counts and the artifact paths to remove from disk.
+        """
+    track_ids = [tid for (tid,) in db.query(Track.id).filter(Track.session_id == session_id).all()]
+    result = delete_tracks(db, track_ids)
+
+    # Remaining session-level messages (e.g. comparisons saved under this session)
+    result["chats"] += db.query(ChatMessage).filter(ChatMessage.session_id == session_id).delete(synchronize_session=False)
+    result["sessions"] = db.query(UserSession).filter(UserSession.id == session_id).delete(synchronize_session=False)
+    return result
+
+
+def _deletion_worker():
+    """Remove queued paths one by one; missing files are ignored."""
+    while True:
+        path = _deletion_queue.get()
+        try:
+            path.unlink(missing_ok=True)
+            storage.forget(path)
+            logger.info(f"Deleted artifact: {path}")
+        except Exception as e:
+            logger.error(f"Error deleting artifact {path}: {e}")
+        finally:
+            _deletion_queue.task_done()
+
+
+def _ensure_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_deletion_worker, name="artifact-deletion", daemon=True)
+            _worker.start()
+
+
+def enqueue_artifact_removal(paths: Iterable[Path]) -> int:
+    """
+        Queue files for asynchronous removal.
+
+        Call this only after the database transaction has committed, so a
+        rollback never leaves rows pointing at deleted files.
+
+        Args:
+            paths (Iterable[Path]): Files to delete.
+
+        Returns:
+            int: Number of paths queued.
+        """
+    count = 0
+    for path in paths:
+        _deletion_queue.put(Path(path))
+        count += 1
+    if count:
+        _ensure_worker()
+    return count
+
+
+def pending_deletions() -> int:
+    """
+        Return the number of artifacts waiting to be deleted.
+
+        Returns:
+            int: Current deletion queue depth.
+        """
+    return _deletion_queue.qsize()
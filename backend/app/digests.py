@@ -0,0 +1,160 @@
+"""
+Per-track comparison digests for ZoundZcope.
+
+A digest is the part of a track that multi-track comparisons need: the key
+analysis numbers and a condensed feedback thread (initial feedback, stored
+follow-up summaries, latest messages; see app.prompt_budget). It is rebuilt
+whenever feedback for the track is stored (`refresh_digest`), so a
+comparison reads one small row per track, whatever the thread length:
+
+    load_digests(db, track_ids)
+        -> one query: tracks + analysis + digest + live chat message count
+        -> digests that are missing or stale (count changed since they were
+           built) are rebuilt in one more batched query and stored
+
+Configuration:
+    DIGEST_FEEDBACK_TOKENS : Size cap of a stored feedback digest (default 600).
+    COMPARISON_MAX_TRACKS  : Most tracks accepted by one comparison (default 8).
+"""
+from collections import defaultdict
+import logging
+import os
+from typing import List
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, joinedload
+
+from app.models import ChatMessage, Track, TrackDigest
+from app.prompt_budget import compact_chat_history, truncate_to_tokens
+
+logger = logging.getLogger("digests")
+
+DIGEST_FEEDBACK_TOKENS = int(os.getenv("DIGEST_FEEDBACK_TOKENS", "600"))
+COMPARISON_MAX_TRACKS = int(os.getenv("COMPARISON_MAX_TRACKS", "8"))
+
+
+def analysis_summary(analysis) -> str:
+    """Render the analysis numbers used by comparison prompts."""
+    return f"""
+LUFS: {analysis.lufs}
+Width: {analysis.stereo_width}
+Key: {analysis.key}
+Peak: {analysis.peak_db}
+Issues: {analysis.issues or 'None'}
+Spectral balance: {analysis.spectral_balance_description or 'n/a'}
+""".strip()
+
+
+def _build(track: Track, messages: List[ChatMessage]) -> TrackDigest:
+    """Build (not store) the digest of a track from its messages in chronological order."""
+    summaries = [m.message for m in messages if m.feedback_profile == "summary"]
+    history = compact_chat_history([m for m in messages if m.feedback_profile != "summary"], summaries)
+    return TrackDigest(
+        track_id=track.id,
+        analysis_summary=analysis_summary(track.analysis),
+        feedback_digest=truncate_to_tokens(history, DIGEST_FEEDBACK_TOKENS),
+        message_count=len(messages),
+    )
+
+
+def _messages_by_track(db: Session, track_ids: List[str]) -> dict:
+    rows = db.scalars(
+        select(ChatMessage)
+        .where(ChatMessage.track_id.in_(track_ids))
+        .order_by(ChatMessage.timestamp.asc(), ChatMessage.id.asc())
+    ).all()
+    grouped = defaultdict(list)
+    for m in rows:
+        grouped[m.track_id].append(m)
+    return grouped
+
+
+def refresh_digest(db: Session, track_id: str):
+    """
+        Rebuild and store the digest of one track after its feedback changed.
+
+        Failures are logged and swallowed: the digest is derived data, and
+        `load_digests` rebuilds stale ones on demand.
+
+        Args:
+            db (Session): Database session (committed on success).
+            track_id (str): Track whose chat history was just written.
+        """
+    try:
+        track = db.get(Track, track_id)
+        if track is None or track.analysis is None:
+            return
+        db.merge(_build(track, _messages_by_track(db, [track_id])[track_id]))
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Digest refresh failed for track {track_id}: {e}")
+
+
+def load_digests(db: Session, track_ids: List[str]) -> List[dict]:
+    """
+        Fetch comparison digests for several tracks with batched queries.
+
+        Tracks without analysis are skipped. Missing or stale digests are
+        rebuilt from one query over all affected tracks' messages and stored.
+
+        Args:
+            db (Session): Database session.
+            track_ids (list[str]): Tracks to compare, in the desired order.
+
+        Returns:
+            list[dict]: In `track_ids` order, each with 'track_id', 'track_name',
+                        'session_id', 'analysis_summary' and 'chat_history'.
+        """
+    live_count = (
+        select(func.count(ChatMessage.id))
+        .where(ChatMessage.track_id == Track.id)
+        .correlate(Track)
+        .scalar_subquery()
+    )
+    rows = db.execute(
+        select(Track, TrackDigest, live_count)
+        .options(joinedload(Track.analysis))
+        .outerjoin(TrackDigest, TrackDigest.track_id == Track.id)
+        .where(Track.id.in_(track_ids))
+    ).unique().all()
+
+    digests = {}
+    stale = []
+    for track, digest, count in rows:
+        if track.analysis is None:
+            continue
+        digests[track.id] = (track, digest)
+        if digest is None or digest.message_count != count:
+            stale.append(track.id)
+
+    if stale:
+        messages = _messages_by_track(db, stale)
+        for tid in stale:
+            track, digest = digests[tid]
+            fresh = _build(track, messages[tid])
+            if digest is None:
+                db.add(fresh)
+            else:
+                # Already in the identity map from the join; update in place instead of merging
+                digest.analysis_summary = fresh.analysis_summary
+                digest.feedback_digest = fresh.feedback_digest
+                digest.message_count = fresh.message_count
+            digests[tid] = (track, fresh if digest is None else digest)
+
+    # Read everything before committing: the commit expires the loaded objects
+    entries = {
+        tid: {
+            "track_id": tid,
+            "track_name": track.track_name,
+            "session_id": track.session_id,
+            "analysis_summary": digest.analysis_summary,
+            "chat_history": digest.feedback_digest or "No chat history.",
+        }
+        for tid, (track, digest) in digests.items()
+    }
+    if stale:
+        db.commit()
+        logger.info(f"Rebuilt {len(stale)} comparison digests")
+
+    return [entries[tid] for tid in track_ids if tid in entries]
@@ -9,20 +9,31 @@ This module provides helper functions to:
     - Track token usage for monitoring model performance and cost.
 
 Dependencies:
-    - OpenAI and optional Groq API clients for AI responses.
+    - app.llm_gateway (shared async OpenAI client with concurrency, rate
+      limiting, retries and deadlines) for AI responses.
     - Token counting and usage tracking utilities.
     - Normalization helpers for genre, subgenre, type, and feedback profile.
 """
-from app.utils import normalize_type, normalize_profile, normalize_genre, ALLOWED_GENRES, normalize_subgenre, count_tokens
+from app.utils import normalize_type, normalize_profile, normalize_genre, ALLOWED_GENRES, normalize_subgenre
 import os
 from dotenv import load_dotenv
 load_dotenv()
+import asyncio
 import html
 import re
 from typing import List
-from app.token_tracker import add_token_usage
+from app.token_tracker import add_token_usage, record_usage
 import time
-from openai import OpenAI
+from app.llm_gateway import llm
+from app.llm_cache import fingerprint, get_cached, put_cached
+from app.prompt_budget import (
+    COMPARISON_PROMPT_TOKEN_BUDGET,
+    FOLLOWUP_PROMPT_TOKEN_BUDGET,
+    Section,
+    fit_even,
+    fit_sections,
+)
+from app.utils import count_tokens
 
 
 # from groq import Groq
@@ -35,7 +46,6 @@ from openai import OpenAI
 # from app.utils import count_tokens_gemini, get_gemini_client  # ⬅️ import the helpers
 
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 # client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 # client = OpenAI(
 #     base_url="https://api.together.xyz/v1",  # You can still use Together
@@ -391,13 +401,18 @@ Now return 3-4 bullet points for adjustments in the most crucial areas.
 
 
 
-def generate_feedback_response(prompt: str, max_tokens: int = 500, use_groq: bool = False) -> str:
+def generate_feedback_response(prompt: str, max_tokens: int = 500, use_groq: bool = False, cache: bool = False) -> str:
     """
     Send a feedback prompt to the AI model and return its response (or a clear error string).
 
+    With `cache=True` the response is looked up in / stored to the persistent
+    LLM response cache (app.llm_cache); use it only for prompts that are pure
+    functions of their inputs.
+
     - Uses OPENAI_MODEL env var when set, else defaults to gpt-4o-mini
     - Fails fast with readable error messages if the key/model is missing or the API call fails
-    - Adds a request timeout so the UI won’t hang forever
+    - Goes through the LLM gateway: queued behind the concurrency cap, retried
+      with backoff on 429/5xx, and bounded by a 30 s deadline so the UI won’t hang forever
     - Logs token usage when available but won’t crash if it’s not
     """
     import os, time, traceback
@@ -415,49 +430,45 @@ def generate_feedback_response(prompt: str, max_tokens: int = 500, use_groq: boo
     if use_groq:
         return "Error: Groq provider not configured on this server."
 
-    try:
-        # Give the request a sensible timeout so the UI doesn’t spin forever
-        local_client = client
-        try:
-            # OpenAI SDK v1 supports per-client options
-            local_client = client.with_options(timeout=30)
-        except Exception:
-            pass  # Fallback to global client if with_options is unavailable
+    messages = [{"role": "user", "content": prompt}]
+    cache_key = fingerprint(model, messages, max_tokens=max_tokens, temperature=0.3) if cache else None
+    if cache_key:
+        cached = get_cached(cache_key)
+        if cached is not None:
+            print(f"♻️ LLM cache hit ({cache_key[:12]}), no API call")
+            return cached
 
+    try:
         start_time = time.perf_counter()
-        resp = local_client.chat.completions.create(
+        resp = llm.complete(
+            messages,
             model=model,
-            messages=[{"role": "user", "content": prompt}],
             max_tokens=max_tokens,
             temperature=0.3,
+            deadline=30,
         )
         elapsed = time.perf_counter() - start_time
         print(f"⏱️ Feedback generation time: {elapsed:.2f}s  (model={model}, id={getattr(resp, 'id', 'n/a')})")
 
         text = (resp.choices[0].message.content or "").strip()
 
-        # --- Token accounting (best-effort; never break on errors) ---
-        try:
-            # Provider-reported usage
-            usage = getattr(resp, "usage", None)
-            if usage and getattr(usage, "prompt_tokens", None) is not None and getattr(usage, "completion_tokens", None) is not None:
-                total_provider_tokens = usage.prompt_tokens + usage.completion_tokens
-                try:
-                    add_token_usage(total_provider_tokens, model_name=model)
-                except Exception:
-                    pass
-
-            # Your local token counters (optional)
+        # --- Token accounting (provider usage; local tokenization runs in the background) ---
+        coalesced = getattr(resp, "coalesced", False)
+        if not coalesced:
             try:
-                prompt_tokens = count_tokens(prompt)
-                response_tokens = count_tokens(text)
-                print(f"🧮 Prompt tokens: {prompt_tokens} | 📦 Completion tokens: {response_tokens} | 📊 Total: {prompt_tokens + response_tokens}")
+                record_usage(getattr(resp, "usage", None), model_name=model, prompt=prompt, completion=text)
             except Exception:
                 pass
-        except Exception:
-            pass
         # -------------------------------------------------------------
 
+        # Coalesced responses were already stored by the leading call
+        usage = getattr(resp, "usage", None)
+        if cache_key and text and not coalesced:
+            put_cached(cache_key, model, text, {
+                "prompt_tokens": getattr(usage, "prompt_tokens", None),
+                "completion_tokens": getattr(usage, "completion_tokens", None),
+            })
+
         return text if text else "Error: Model returned an empty response."
 
     except Exception as e:
@@ -579,6 +590,67 @@ def generate_feedback_response(prompt: str, max_tokens: int = 500, use_groq: boo
 '''
 
 
+async def stream_feedback_response(prompt: str, max_tokens: int = 500, model: str = None, cache: bool = False):
+    """
+    Stream an AI response to `prompt` as text deltas.
+
+    Streaming counterpart of `generate_feedback_response`: same model and
+    temperature, but tokens are yielded as they arrive so the UI can render
+    them immediately. Token usage is recorded once the stream completes.
+
+    Args:
+        prompt (str): Prompt to send.
+        max_tokens (int, optional): Completion token cap.
+        model (str, optional): Model override; defaults to OPENAI_MODEL.
+        cache (bool, optional): Use the persistent LLM response cache; a hit
+            is yielded as a single delta. Shares entries with `generate_feedback_response`.
+
+    Yields:
+        str: Content deltas.
+
+    Raises:
+        ValueError: If the prompt is empty or OPENAI_API_KEY is missing.
+        Exception: Gateway/provider errors are propagated to the caller.
+    """
+    if not prompt or not prompt.strip():
+        raise ValueError("Empty prompt.")
+    if not os.getenv("OPENAI_API_KEY"):
+        raise ValueError("OPENAI_API_KEY is not set on the server.")
+
+    model = model or os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+    messages = [{"role": "user", "content": prompt}]
+    cache_key = fingerprint(model, messages, max_tokens=max_tokens, temperature=0.3) if cache else None
+    if cache_key:
+        cached = await asyncio.to_thread(get_cached, cache_key)
+        if cached is not None:
+            print(f"♻️ LLM cache hit ({cache_key[:12]}), no API call")
+            yield cached
+            return
+
+    usage = {}
+    chunks = []
+    start_time = time.perf_counter()
+    first_token_at = None
+
+    async for delta in llm.astream(
+        messages,
+        model=model,
+        max_tokens=max_tokens,
+        temperature=0.3,
+        usage=usage,
+    ):
+        if first_token_at is None:
+            first_token_at = time.perf_counter() - start_time
+        chunks.append(delta)
+        yield delta
+
+    elapsed = time.perf_counter() - start_time
+    print(f"⏱️ Streamed feedback: first token {first_token_at or 0:.2f}s, total {elapsed:.2f}s  (model={model})")
+    record_usage(usage, model_name=model, prompt=prompt, completion="".join(chunks))
+    if cache_key:
+        await asyncio.to_thread(put_cached, cache_key, model, "".join(chunks).strip(), usage)
+
+
 def generate_followup_response(analysis_text: str, feedback_text: str, user_question: str, thread_summary: str = "") -> str:
     """
     Generate an AI response to a follow-up question.
@@ -606,6 +678,7 @@ def build_followup_prompt(
     user_question: str,
     thread_summary: str = "",
     ref_analysis_data: dict = None,
+    token_budget: int = FOLLOWUP_PROMPT_TOKEN_BUDGET,
 ) -> str:
     """
     Construct a prompt for AI follow-up feedback.
@@ -617,12 +690,17 @@ def build_followup_prompt(
       - Optional summary of conversation thread.
       - Optional reference track analysis data.
 
+    The context sections are fitted to `token_budget` (see app.prompt_budget):
+    the reference block goes first, then the prior feedback and the summary
+    are cut from the end; the analysis is trimmed last and the question never.
+
     Args:
         analysis_text (str): Track analysis description.
         feedback_text (str): Previous AI feedback.
         user_question (str): Follow-up question from the user.
         thread_summary (str, optional): Summary of prior follow-up conversation.
         ref_analysis_data (dict, optional): Reference track analysis.
+        token_budget (int, optional): Prompt token budget.
 
     Returns:
         str: Formatted follow-up prompt string.
@@ -652,17 +730,18 @@ def build_followup_prompt(
     if thread_summary:
         summary_block = "### Summary of Previous Conversation\n" + thread_summary + "\n"
 
-    return f"""
+    def render(summary_block: str, analysis: str, reference: str, feedback: str) -> str:
+        return f"""
     You are a helpful and professional **audio engineer assistant**.
 
     {summary_block}
     ### Track Analysis
-    {analysis_text}
+    {analysis}
 
-    {ref_section}
+    {reference}
 
     ### Prior Feedback
-    {feedback_text}
+    {feedback}
 
     ### User's Follow-Up Question
     "{user_question}"
@@ -677,8 +756,21 @@ def build_followup_prompt(
     Respond below:
     """.strip()
 
+    fitted = fit_sections(
+        [
+            Section("summary", summary_block, priority=2, min_tokens=150),
+            Section("analysis", analysis_text, priority=3, min_tokens=300),
+            Section("reference", ref_section, priority=0),
+            Section("feedback", feedback_text, priority=1, min_tokens=200),
+        ],
+        budget=token_budget,
+        reserved_tokens=count_tokens(render("", "", "", "")),
+    )
+    return render(fitted["summary"], fitted["analysis"], fitted["reference"], fitted["feedback"])
+
 
-def generate_comparison_feedback(comparison_data: List[dict], max_tokens: int = 600) -> str:
+def generate_comparison_feedback(comparison_data: List[dict], max_tokens: int = 600,
+                                 token_budget: int = COMPARISON_PROMPT_TOKEN_BUDGET) -> str:
     """
     Generate AI feedback comparing multiple tracks.
 
@@ -687,15 +779,19 @@ def generate_comparison_feedback(comparison_data: List[dict], max_tokens: int =
       - Technical differences (LUFS, stereo width, spectral balance).
       - Strengths, weaknesses, and stylistic consistency.
 
+    Chat histories are shrunk first (evenly, from the end) when the prompt
+    exceeds `token_budget`; analysis summaries are kept whole.
+
     Args:
         comparison_data (List[dict]): List of track info with:
             'track_name', 'analysis_summary', 'chat_history'.
         max_tokens (int, optional): Maximum tokens for AI output.
+        token_budget (int, optional): Prompt token budget.
 
     Returns:
         str: AI-generated multi-track comparison feedback.
     """
-    prompt = (
+    header = (
         "You are an expert audio mastering engineer.\n"
         "Compare the following tracks in terms of:\n"
         "- Sonic cohesion across all tracks\n"
@@ -705,13 +801,7 @@ def generate_comparison_feedback(comparison_data: List[dict], max_tokens: int =
         "Prior feedback uses 'INSIGHT:' and 'SUGGESTION:' to indicate observations and recommendations.\n\n"
         "Give a detailed comparison summary and specific suggestions where appropriate.\n\n"
     )
-
-    for idx, entry in enumerate(comparison_data, 1):
-        prompt += f"🎵 Track {idx}: {entry['track_name']}\n"
-        prompt += f"📊 Analysis Summary:\n{entry['analysis_summary'].strip()}\n"
-        prompt += f"💬 Prior Feedback:\n{entry['chat_history'].strip()}\n\n"
-
-    prompt += (
+    footer = (
         "### Comparison Summary\n"
         "Plan your full response before writing so you always include the 'Conclusions' section. "
         "Write a cohesive summary of how the tracks compare. Highlight what works well, what needs attention, and whether they sound like they belong together in an album or playlist.\n"
@@ -719,33 +809,39 @@ def generate_comparison_feedback(comparison_data: List[dict], max_tokens: int =
         "Respect the word caps strictly. Do NOT end any section mid-sentence."
     )
 
-    response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        messages=[
+    # Chat histories share the budget left after the fixed text and the analysis summaries
+    fixed = header + footer + "".join(
+        f"🎵 Track {idx}: {entry['track_name']}\n📊 Analysis Summary:\n{entry['analysis_summary'].strip()}\n💬 Prior Feedback:\n\n\n"
+        for idx, entry in enumerate(comparison_data, 1)
+    )
+    histories = fit_even(
+        [entry["chat_history"].strip() for entry in comparison_data],
+        budget=token_budget - count_tokens(fixed),
+    )
+
+    prompt = header
+    for idx, (entry, history) in enumerate(zip(comparison_data, histories), 1):
+        prompt += f"🎵 Track {idx}: {entry['track_name']}\n"
+        prompt += f"📊 Analysis Summary:\n{entry['analysis_summary'].strip()}\n"
+        prompt += f"💬 Prior Feedback:\n{history}\n\n"
+    prompt += footer
+
+    response = llm.complete(
+        [
             {"role": "system", "content": "You are an experienced audio mastering engineer evaluating track cohesion and quality."},
             {"role": "user", "content": prompt}
         ],
+        model="gpt-4o-mini",
         max_tokens=max_tokens,
         temperature=0.4
     )
 
-    # 🔢 Count tokens in the prompt
-    prompt_tokens = count_tokens(prompt)
-    print(f"🧮 Comparison Prompt token count: {prompt_tokens}")
-
-    # 🔢 Count tokens in the response
     response_text = response.choices[0].message.content
-    response_tokens = count_tokens(response_text)
-    print(f"📦 Comparison Response token count: {response_tokens}")
-
-    # 📊 Total token count
-    total = prompt_tokens + response_tokens
-    print(f"📊 Total tokens used: {total}")
 
-    # Add this after response
-    prompt_tokens_count = response.usage.prompt_tokens
-    completion_tokens = response.usage.completion_tokens
-    total_tokens = prompt_tokens_count + completion_tokens
-    add_token_usage(total_tokens, model_name="gpt-4o-mini")
+    # 📊 Token accounting: provider usage, or local counting in the background
+    if not getattr(response, "coalesced", False):
+        if response.usage is not None:
+            print(f"📊 Comparison tokens: prompt {response.usage.prompt_tokens}, completion {response.usage.completion_tokens}")
+        record_usage(response.usage, model_name="gpt-4o-mini", prompt=prompt, completion=response_text)
 
     return response_text.strip()
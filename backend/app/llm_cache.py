@@ -0,0 +1,143 @@
+"""
+Persistent LLM response cache for ZoundZcope.
+
+Some prompts are pure functions of their inputs: initial feedback depends only
+on genre, subgenre, type, profile and the analysis numbers, and export
+content/presets only on the feedback text. Their completions are stored in the
+`llm_response_cache` table, keyed by a fingerprint of
+
+    model + normalized messages + sampling params (max_tokens, temperature, ...)
+
+so a re-upload of the same file or a repeated PDF export is served from the
+database instead of paying for another call. Normalization strips per-line
+indentation and collapses blank lines, so prompts that differ only in how an
+f-string was indented share an entry.
+
+Caching is opt-in per call (`cache=True` on the gpt_utils helpers) and can be
+switched off globally.
+
+Configuration:
+    LLM_CACHE_ENABLED      : "false" disables reads and writes (default true).
+    LLM_CACHE_TTL_SECONDS  : Entry lifetime (default 7 days).
+    LLM_CACHE_MAX_ENTRIES  : Size bound; least-recently-used entries are evicted (default 5000).
+"""
+from datetime import datetime, timedelta, timezone
+import logging
+import os
+from typing import Optional
+
+from app.database import SessionLocal
+from app.llm_gateway import fingerprint, normalize_prompt  # re-exported for callers
+from app.models import LLMResponseCache
+
+logger = logging.getLogger("llm_cache")
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 60 * 60)))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+
+# Size checks run every N writes rather than on each one
+_EVICT_EVERY = 50
+_writes = 0
+
+
+def get_cached(fp: str) -> Optional[str]:
+    """
+        Look up a cached response and record the hit.
+
+        Args:
+            fp (str): Fingerprint from `fingerprint()`.
+
+        Returns:
+            str | None: Cached text, or None when missing, expired or caching is disabled.
+        """
+    if not LLM_CACHE_ENABLED:
+        return None
+    now = datetime.now(timezone.utc)
+    db = SessionLocal()
+    try:
+        entry = db.get(LLMResponseCache, fp)
+        if entry is None:
+            return None
+        expires_at = entry.expires_at
+        if expires_at.tzinfo is None:  # SQLite returns naive UTC
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        if expires_at <= now:
+            return None
+        entry.hits = (entry.hits or 0) + 1
+        entry.last_hit_at = now
+        response = entry.response
+        db.commit()
+        return response
+    except Exception as e:
+        db.rollback()
+        logger.error(f"LLM cache read failed: {e}")
+        return None
+    finally:
+        db.close()
+
+
+def put_cached(fp: str, model: str, response: str, usage: Optional[dict] = None):
+    """
+        Store (or refresh) a response.
+
+        Error strings from the gpt_utils helpers ("Error: ...") are never cached.
+
+        Args:
+            fp (str): Fingerprint from `fingerprint()`.
+            model (str): Model that produced the response.
+            response (str): Completion text.
+            usage (dict, optional): 'prompt_tokens' / 'completion_tokens' of the original call.
+        """
+    global _writes
+    if not LLM_CACHE_ENABLED or not response or response.startswith("Error:"):
+        return
+    usage = usage or {}
+    now = datetime.now(timezone.utc)
+    db = SessionLocal()
+    try:
+        db.merge(LLMResponseCache(
+            fingerprint=fp,
+            model=model,
+            response=response,
+            prompt_tokens=usage.get("prompt_tokens"),
+            completion_tokens=usage.get("completion_tokens"),
+            expires_at=now + timedelta(seconds=LLM_CACHE_TTL_SECONDS),
+            last_hit_at=now,
+            hits=0,
+        ))
+        db.commit()
+        _writes += 1
+        if _writes % _EVICT_EVERY == 0:
+            _evict(db, now)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"LLM cache write failed: {e}")
+    finally:
+        db.close()
+
+
+def _evict(db, now: datetime):
+    """Drop expired entries, then the least-recently-used ones above the size bound."""
+    expired = (
+        db.query(LLMResponseCache)
+        .filter(LLMResponseCache.expires_at <= now)
+        .delete(synchronize_session=False)
+    )
+    excess = db.query(LLMResponseCache).count() - LLM_CACHE_MAX_ENTRIES
+    evicted = 0
+    if excess > 0:
+        oldest = (
+            db.query(LLMResponseCache.fingerprint)
+            .order_by(LLMResponseCache.last_hit_at)
+            .limit(excess)
+            .subquery()
+        )
+        evicted = (
+            db.query(LLMResponseCache)
+            .filter(LLMResponseCache.fingerprint.in_(oldest.select()))
+            .delete(synchronize_session=False)
+        )
+    db.commit()
+    if expired or evicted:
+        logger.info(f"LLM cache evicted {expired} expired and {evicted} LRU entries")
@@ -0,0 +1,469 @@
+"""
+Shared LLM gateway for ZoundZcope.
+
+Every chat-completion call in the app goes through this module instead of
+creating its own OpenAI client. It owns a single `AsyncOpenAI` client running
+on a dedicated event-loop thread and applies, per call:
+
+    - A global concurrency cap (semaphore), so bursts queue instead of piling
+      onto the provider.
+    - Per-model token-bucket rate limiting on requests/minute and
+      tokens/minute (prompt estimate + max_tokens).
+    - Jittered exponential backoff on 429, 5xx, timeouts and connection
+      errors; `Retry-After` is honored when the provider sends it.
+    - A deadline covering queueing, rate-limit waits and all retries.
+    - Single-flight coalescing: concurrent identical requests (same model,
+      normalized messages and sampling params) share one upstream call.
+      Followers get the leader's response with `usage` cleared and
+      `coalesced=True`, so tokens are only accounted once.
+
+Sync code (routers running in the threadpool) calls `complete()`; async code
+awaits `acomplete()`, or iterates `astream()` for token-by-token output. All of
+them run the request on the gateway loop, so the semaphore and buckets are
+shared no matter which thread or loop calls in. Streams are only retried
+before the first token arrives and are never coalesced.
+
+Each upstream call's end-to-end latency (queueing and retries included) and
+outcome are recorded in app.token_tracker's per-minute buckets.
+
+Configuration:
+    OPENAI_API_KEY        : API key (required for real calls).
+    OPENAI_BASE_URL       : Optional OpenAI-compatible endpoint.
+    OPENAI_MODEL          : Default model (default gpt-4o-mini).
+    LLM_MAX_CONCURRENCY   : In-flight requests across the process (default 8).
+    LLM_RPM               : Requests per minute per model (default 500).
+    LLM_TPM               : Tokens per minute per model (default 200000).
+    LLM_MAX_RETRIES       : Retries after the first attempt (default 4).
+    LLM_BACKOFF_BASE      : First backoff step in seconds (default 0.5).
+    LLM_BACKOFF_MAX       : Backoff ceiling in seconds (default 8).
+    LLM_DEADLINE_SECONDS  : Default per-call deadline (default 30).
+    LLM_STREAM_DEADLINE_SECONDS : Default deadline for a whole stream (default 120).
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from typing import AsyncIterator, Callable, List, Optional
+
+import openai
+from dotenv import load_dotenv
+from httpx import Timeout
+from openai import AsyncOpenAI
+
+from app.metrics import LLM_COALESCED
+from app.token_tracker import record_llm_call
+
+load_dotenv()
+
+logger = logging.getLogger("llm_gateway")
+
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_RPM = float(os.getenv("LLM_RPM", "500"))
+LLM_TPM = float(os.getenv("LLM_TPM", "200000"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "8"))
+LLM_DEADLINE_SECONDS = float(os.getenv("LLM_DEADLINE_SECONDS", "30"))
+LLM_STREAM_DEADLINE_SECONDS = float(os.getenv("LLM_STREAM_DEADLINE_SECONDS", "120"))
+
+_STREAM_END = object()
+_BLANK_LINES = re.compile(r"\n{3,}")
+
+
+class LLMDeadlineExceeded(TimeoutError):
+    """Raised when a call can't complete (including queueing and retries) before its deadline."""
+
+
+class TokenBucket:
+    """
+        Async token bucket refilled continuously at `rate_per_minute`.
+
+        Amounts larger than the capacity are clamped, so a single oversized
+        request waits for a full bucket instead of blocking forever.
+        """
+
+    def __init__(self, rate_per_minute: float):
+        self.capacity = max(rate_per_minute, 1.0)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float, deadline: float):
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+                if time.monotonic() + wait > deadline:
+                    raise LLMDeadlineExceeded("Rate limit wait would exceed the deadline")
+                await asyncio.sleep(wait)
+
+
+def _is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    if isinstance(exc, openai.APIStatusError):
+        return exc.status_code >= 500
+    return False
+
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    response = getattr(exc, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def normalize_prompt(text: str) -> str:
+    """
+        Canonical form of a prompt for fingerprinting.
+
+        Args:
+            text (str): Prompt text.
+
+        Returns:
+            str: Text with per-line whitespace stripped and runs of blank lines collapsed.
+        """
+    lines = [line.strip() for line in (text or "").strip().splitlines()]
+    return _BLANK_LINES.sub("\n\n", "\n".join(lines))
+
+
+def fingerprint(model: str, messages: List[dict], **params) -> str:
+    """
+        Hash a request into a stable key (used for coalescing and the response cache).
+
+        Args:
+            model (str): Model name.
+            messages (list[dict]): Chat messages ('role', 'content').
+            **params: Sampling parameters that affect the output (max_tokens, temperature, ...).
+
+        Returns:
+            str: Hex SHA-256 fingerprint.
+        """
+    payload = {
+        "model": model,
+        "messages": [{"role": m["role"], "content": normalize_prompt(m["content"])} for m in messages],
+        "params": params,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _estimate_tokens(messages: List[dict], max_tokens: int) -> int:
+    # ~4 characters per token is close enough for rate shaping
+    chars = sum(len(m.get("content") or "") for m in messages)
+    return chars // 4 + max_tokens
+
+
+class LLMGateway:
+    """
+        Process-wide LLM client with concurrency, rate and retry control.
+        """
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._client: Optional[AsyncOpenAI] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._buckets = {}
+        self._inflight = {}
+        self._coalesced = 0
+
+    # ---- loop management ----
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._start_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=loop.run_forever, name="llm-gateway", daemon=True)
+                thread.start()
+                self._loop, self._thread = loop, thread
+        return self._loop
+
+    def _get_client(self) -> AsyncOpenAI:
+        if self._client is None:
+            # Retries are handled here, not by the SDK, so the deadline covers them
+            self._client = AsyncOpenAI(
+                api_key=OPENAI_API_KEY,
+                base_url=OPENAI_BASE_URL,
+                timeout=Timeout(LLM_DEADLINE_SECONDS, connect=5.0),
+                max_retries=0,
+            )
+            self._semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+        return self._client
+
+    def _buckets_for(self, model: str):
+        if model not in self._buckets:
+            self._buckets[model] = (TokenBucket(LLM_RPM), TokenBucket(LLM_TPM))
+        return self._buckets[model]
+
+    # ---- request execution (runs on the gateway loop) ----
+
+    async def _run(self, messages: List[dict], model: str, max_tokens: int,
+                   temperature: float, deadline_s: float, extra: dict,
+                   emit: Optional[Callable[[str], None]] = None, usage: Optional[dict] = None):
+        """
+            Execute one completion with queueing, rate limiting, retries and a deadline.
+
+            With `emit`, the request is streamed: each content delta is passed to
+            `emit` and provider usage (if reported) is written into `usage`.
+            """
+        deadline = time.monotonic() + deadline_s
+        client = self._get_client()
+        request_bucket, token_bucket = self._buckets_for(model)
+
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise LLMDeadlineExceeded(f"LLM call to {model} exceeded {deadline_s:.0f}s deadline")
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=remaining)
+            except asyncio.TimeoutError:
+                raise LLMDeadlineExceeded("Timed out waiting for an LLM slot")
+            streamed = False
+            try:
+                await request_bucket.acquire(1, deadline)
+                await token_bucket.acquire(_estimate_tokens(messages, max_tokens), deadline)
+                remaining = deadline - time.monotonic()
+                params = dict(
+                    model=model,
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    timeout=max(remaining, 0.1),
+                    **extra,
+                )
+                if emit is None:
+                    return await client.chat.completions.create(**params)
+
+                stream = await client.chat.completions.create(
+                    stream=True, stream_options={"include_usage": True}, **params
+                )
+                async with asyncio.timeout_at(asyncio.get_running_loop().time() + remaining):
+                    async for chunk in stream:
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            streamed = True
+                            emit(chunk.choices[0].delta.content)
+                        if getattr(chunk, "usage", None) and usage is not None:
+                            usage["prompt_tokens"] = chunk.usage.prompt_tokens
+                            usage["completion_tokens"] = chunk.usage.completion_tokens
+                return None
+            except TimeoutError as e:
+                if isinstance(e, LLMDeadlineExceeded):
+                    raise
+                raise LLMDeadlineExceeded(f"LLM stream from {model} exceeded {deadline_s:.0f}s deadline")
+            except Exception as e:
+                # Once tokens reached the caller a retry would duplicate output
+                if streamed or not _is_retryable(e) or attempt >= LLM_MAX_RETRIES:
+                    raise
+                backoff = random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * (2 ** attempt)))
+                delay = max(backoff, _retry_after(e) or 0)
+                if time.monotonic() + delay >= deadline:
+                    raise
+                attempt += 1
+                logger.warning(f"LLM call failed ({e.__class__.__name__}); retry {attempt}/{LLM_MAX_RETRIES} in {delay:.2f}s")
+            finally:
+                self._semaphore.release()
+            await asyncio.sleep(delay)
+
+    async def _run_single_flight(self, key: str, messages: List[dict], model: str, max_tokens: int,
+                                 temperature: float, deadline_s: float, extra: dict):
+        """
+            Run `_run` once per key; concurrent callers with the same key await the leader.
+
+            The shared future is shielded so a follower giving up (deadline,
+            disconnect) doesn't cancel the call for everyone else.
+            """
+        shared = self._inflight.get(key)
+        if shared is not None:
+            self._coalesced += 1
+            LLM_COALESCED.inc()
+            logger.info(f"Coalesced duplicate LLM call to {model} ({self._coalesced} total)")
+            try:
+                async with asyncio.timeout(deadline_s):
+                    response = await asyncio.shield(shared)
+            except TimeoutError:
+                raise LLMDeadlineExceeded(f"LLM call to {model} exceeded {deadline_s:.0f}s deadline")
+            # The leader accounts the tokens; followers must not count them again
+            return response.model_copy(update={"usage": None, "coalesced": True})
+
+        shared = asyncio.get_running_loop().create_future()
+        # Mark the exception as retrieved even when nobody else was waiting
+        shared.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = shared
+        try:
+            response = await self._run(messages, model, max_tokens, temperature, deadline_s, extra)
+            shared.set_result(response)
+            return response
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                shared.cancel()
+            else:
+                shared.set_exception(e)
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def _submit(self, messages: List[dict], model: Optional[str], max_tokens: int,
+                temperature: float, deadline: Optional[float], coalesce: bool, extra: dict):
+        model = model or OPENAI_MODEL
+        deadline = deadline or LLM_DEADLINE_SECONDS
+        if coalesce:
+            key = fingerprint(model, messages, max_tokens=max_tokens, temperature=temperature, **extra)
+            coro = self._run_single_flight(key, messages, model, max_tokens, temperature, deadline, extra)
+        else:
+            coro = self._run(messages, model, max_tokens, temperature, deadline, extra)
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    @staticmethod
+    def _observe(model: Optional[str], started: float, response):
+        # Coalesced followers didn't make an upstream call of their own
+        if not getattr(response, "coalesced", False):
+            record_llm_call(model or OPENAI_MODEL, time.perf_counter() - started)
+
+    def stats(self) -> dict:
+        """
+            Report coalescing and concurrency state.
+
+            Returns:
+                dict: Distinct requests currently in flight ('inflight'), duplicate
+                      calls served by another caller's request since startup
+                      ('coalesced') and concurrency slots in use ('slots_in_use').
+            """
+        semaphore = self._semaphore
+        slots_in_use = LLM_MAX_CONCURRENCY - semaphore._value if semaphore is not None else 0
+        return {"inflight": len(self._inflight), "coalesced": self._coalesced, "slots_in_use": slots_in_use}
+
+    # ---- public API ----
+
+    async def acomplete(self, messages: List[dict], model: Optional[str] = None, max_tokens: int = 500,
+                        temperature: float = 0.3, deadline: Optional[float] = None,
+                        coalesce: bool = True, **extra):
+        """
+            Run a chat completion through the gateway from async code.
+
+            Args:
+                messages (list[dict]): Chat messages.
+                model (str, optional): Model name; defaults to OPENAI_MODEL.
+                max_tokens (int): Completion token cap.
+                temperature (float): Sampling temperature.
+                deadline (float, optional): Seconds for the whole call; defaults to LLM_DEADLINE_SECONDS.
+                coalesce (bool): Share the upstream call with identical requests
+                    already in flight (default True).
+                **extra: Additional Chat Completions parameters.
+
+            Returns:
+                ChatCompletion: The provider response. When the result was shared
+                    from another caller's request, `usage` is None and `coalesced` is True.
+
+            Raises:
+                LLMDeadlineExceeded: If the deadline passes while queued, rate limited or retrying.
+                openai.OpenAIError: Non-retryable errors, or the last error once retries run out.
+            """
+        started = time.perf_counter()
+        future = self._submit(messages, model, max_tokens, temperature, deadline, coalesce, extra)
+        try:
+            response = await asyncio.wrap_future(future)
+        except Exception:
+            record_llm_call(model or OPENAI_MODEL, time.perf_counter() - started, error=True)
+            raise
+        self._observe(model, started, response)
+        return response
+
+    def complete(self, messages: List[dict], model: Optional[str] = None, max_tokens: int = 500,
+                 temperature: float = 0.3, deadline: Optional[float] = None,
+                 coalesce: bool = True, **extra):
+        """
+            Blocking variant of `acomplete` for sync code in the threadpool.
+
+            Must not be called from a running event loop; use `acomplete` there.
+            """
+        started = time.perf_counter()
+        future = self._submit(messages, model, max_tokens, temperature, deadline, coalesce, extra)
+        try:
+            response = future.result()
+        except Exception:
+            record_llm_call(model or OPENAI_MODEL, time.perf_counter() - started, error=True)
+            raise
+        self._observe(model, started, response)
+        return response
+
+    async def astream(self, messages: List[dict], model: Optional[str] = None, max_tokens: int = 500,
+                      temperature: float = 0.3, deadline: Optional[float] = None,
+                      usage: Optional[dict] = None, **extra) -> AsyncIterator[str]:
+        """
+            Stream a chat completion as text deltas.
+
+            The request runs on the gateway loop; deltas are handed to the
+            caller's loop through a queue. Closing the iterator early (e.g. the
+            client disconnected) cancels the upstream request.
+
+            Args:
+                messages (list[dict]): Chat messages.
+                model (str, optional): Model name; defaults to OPENAI_MODEL.
+                max_tokens (int): Completion token cap.
+                temperature (float): Sampling temperature.
+                deadline (float, optional): Seconds for the whole stream;
+                    defaults to LLM_STREAM_DEADLINE_SECONDS.
+                usage (dict, optional): Filled with 'prompt_tokens' and
+                    'completion_tokens' when the provider reports them.
+                **extra: Additional Chat Completions parameters.
+
+            Yields:
+                str: Content deltas in order.
+
+            Raises:
+                LLMDeadlineExceeded / openai.OpenAIError: As for `acomplete`.
+            """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+
+        def emit(item):
+            loop.call_soon_threadsafe(queue.put_nowait, item)
+
+        future = asyncio.run_coroutine_threadsafe(
+            self._run(messages, model or OPENAI_MODEL, max_tokens, temperature,
+                      deadline or LLM_STREAM_DEADLINE_SECONDS, extra, emit=emit, usage=usage),
+            self._ensure_loop(),
+        )
+        future.add_done_callback(lambda _: emit(_STREAM_END))
+        started = time.perf_counter()
+        failed = True
+        try:
+            while True:
+                item = await queue.get()
+                if item is _STREAM_END:
+                    break
+                yield item
+            future.result()
+            failed = False
+        finally:
+            if not future.done():
+                future.cancel()
+            # Streams abandoned by the client count as errors too
+            record_llm_call(model or OPENAI_MODEL, time.perf_counter() - started, error=failed)
+
+
+llm = LLMGateway()
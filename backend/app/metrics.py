@@ -0,0 +1,279 @@
+"""
+Prometheus metrics for ZoundZcope.
+
+Collects metrics for the whole request pipeline and exposes them at
+GET /metrics (see app.routers.metrics):
+
+    - zz_http_request_duration_seconds  : Per route template, method and status.
+    - zz_http_requests_in_progress      : Requests currently being served.
+    - zz_db_queries_per_request         : SQL statements executed while serving a request.
+    - zz_stage_duration_seconds         : Upload and analysis stage timings (`StageClock`).
+    - zz_llm_request_duration_seconds   : Upstream LLM calls by model and outcome.
+    - zz_llm_tokens_total               : Prompt/completion tokens by model.
+    - zz_llm_coalesced_total            : Duplicate LLM calls served by single-flight.
+    - zz_rag_cache_total, zz_rag_cache_entries : RAG embedding/retrieval cache
+      lookups by outcome (hit/miss) and current size (app.rag_cache).
+    - zz_threadpool_*, zz_queue_depth, zz_llm_slots_in_use, zz_storage_bytes :
+      Runtime gauges sampled every METRICS_SAMPLE_SECONDS by `sample_threadpool()`
+      (on the event loop) and `sample_runtime()` (in a worker thread).
+
+Multiple workers:
+    prometheus_client keeps per-process values. When PROMETHEUS_MULTIPROC_DIR
+    points at an empty, writable directory before the workers start, each
+    process writes its samples to its own mmap'd files (no cross-process
+    locking) and /metrics aggregates all of them. Without it, /metrics reports
+    the worker that happened to serve the scrape.
+
+prometheus_client is optional: when it isn't installed every metric is a no-op
+and /metrics returns 503.
+
+Configuration:
+    PROMETHEUS_MULTIPROC_DIR : Enables multi-process collection (see above).
+    METRICS_SAMPLE_SECONDS   : Runtime gauge sampling interval (default 5).
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+import os
+import sys
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST,
+        CollectorRegistry,
+        Counter,
+        Gauge,
+        Histogram,
+        generate_latest,
+        multiprocess,
+    )
+    _HAS_PROMETHEUS = True
+except Exception:
+    _HAS_PROMETHEUS = False
+    Counter = Gauge = Histogram = None
+    CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+METRICS_SAMPLE_SECONDS = float(os.getenv("METRICS_SAMPLE_SECONDS", "5"))
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+_QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+
+class _NoopMetric:
+    """Stand-in used when prometheus_client is missing."""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def dec(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def observe(self, value):
+        pass
+
+
+def _metric(kind, name, documentation, labelnames=(), **kwargs):
+    if not _HAS_PROMETHEUS:
+        return _NoopMetric()
+    return kind(name, documentation, labelnames, **kwargs)
+
+
+def _gauge(name, documentation, labelnames=(), mode="livesum"):
+    if not _HAS_PROMETHEUS:
+        return _NoopMetric()
+    return Gauge(name, documentation, labelnames, multiprocess_mode=mode)
+
+
+HTTP_LATENCY = _metric(
+    Histogram, "zz_http_request_duration_seconds",
+    "HTTP request latency by route template", ("method", "route", "status"), buckets=_LATENCY_BUCKETS,
+)
+HTTP_IN_PROGRESS = _gauge("zz_http_requests_in_progress", "HTTP requests currently being served")
+DB_QUERIES = _metric(
+    Histogram, "zz_db_queries_per_request",
+    "SQL statements executed per HTTP request", ("route",), buckets=_QUERY_BUCKETS,
+)
+STAGE_LATENCY = _metric(
+    Histogram, "zz_stage_duration_seconds",
+    "Duration of pipeline stages (upload, analysis, rms)", ("pipeline", "stage"), buckets=_LATENCY_BUCKETS,
+)
+LLM_LATENCY = _metric(
+    Histogram, "zz_llm_request_duration_seconds",
+    "End-to-end LLM call latency including queueing and retries", ("model", "outcome"),
+    buckets=_LATENCY_BUCKETS,
+)
+LLM_TOKENS = _metric(Counter, "zz_llm_tokens", "LLM tokens", ("model", "kind"))
+LLM_COALESCED = _metric(
+    Counter, "zz_llm_coalesced", "LLM calls served by an identical in-flight call",
+)
+RAG_CACHE = _metric(Counter, "zz_rag_cache", "RAG cache lookups", ("cache", "outcome"))
+RAG_CACHE_ENTRIES = _gauge("zz_rag_cache_entries", "Entries in the RAG caches", ("cache",))
+THREADPOOL_BUSY = _gauge("zz_threadpool_busy_threads", "Threadpool workers running sync endpoints/tasks")
+THREADPOOL_LIMIT = _gauge("zz_threadpool_limit", "Threadpool capacity")
+QUEUE_DEPTH = _gauge("zz_queue_depth", "Items waiting in background queues", ("queue",))
+LLM_SLOTS_IN_USE = _gauge("zz_llm_slots_in_use", "LLM gateway concurrency slots in use")
+STORAGE_BYTES = _gauge("zz_storage_bytes", "Bytes used by stored artifacts", ("category",), mode="max")
+
+# Per-request SQL statement counter; a one-element list so threadpool copies of the context share it
+_query_counter: ContextVar = ContextVar("db_query_counter", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    counter = _query_counter.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+class StageClock:
+    """
+        Times consecutive stages of one pipeline run.
+
+        Each `lap(stage)` records the time since the previous lap (or creation)
+        under that stage name, so instrumenting a function is one line per stage.
+        """
+
+    def __init__(self, pipeline: str):
+        self.pipeline = pipeline
+        self._last = time.perf_counter()
+
+    def lap(self, stage: str) -> float:
+        now = time.perf_counter()
+        elapsed = now - self._last
+        self._last = now
+        STAGE_LATENCY.labels(self.pipeline, stage).observe(elapsed)
+        return elapsed
+
+
+@contextmanager
+def stage_timer(pipeline: str, stage: str):
+    """Time a single block as `stage` of `pipeline`."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.labels(pipeline, stage).observe(time.perf_counter() - started)
+
+
+def observe_llm_call(model: str, seconds: float, error: bool = False):
+    LLM_LATENCY.labels(model, "error" if error else "ok").observe(seconds)
+
+
+def observe_llm_tokens(model: str, prompt_tokens: int, completion_tokens: int):
+    if prompt_tokens:
+        LLM_TOKENS.labels(model, "prompt").inc(prompt_tokens)
+    if completion_tokens:
+        LLM_TOKENS.labels(model, "completion").inc(completion_tokens)
+
+
+class MetricsMiddleware:
+    """
+        Pure ASGI middleware recording latency, status and SQL statement count per request.
+
+        Routes are labelled by their template (e.g. /tracks/{track_id}) once
+        routing has run; unmatched paths share the label "unmatched" so
+        random URLs can't blow up label cardinality. /metrics itself is not recorded.
+        """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] == "/metrics":
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        counter = [0]
+        token = _query_counter.set(counter)
+        HTTP_IN_PROGRESS.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            HTTP_IN_PROGRESS.dec()
+            _query_counter.reset(token)
+            route = getattr(scope.get("route"), "path", None)
+            if route is None:
+                route = "/static" if scope["path"].startswith(("/static/", "/uploads/")) else "unmatched"
+            HTTP_LATENCY.labels(scope["method"], route, str(status[0])).observe(elapsed)
+            DB_QUERIES.labels(route).observe(counter[0])
+
+
+def sample_threadpool():
+    """
+        Refresh the threadpool gauges.
+
+        Must run on the event loop (the threadpool limiter is loop-bound).
+        """
+    import anyio.to_thread
+
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    THREADPOOL_BUSY.set(limiter.borrowed_tokens)
+    THREADPOOL_LIMIT.set(limiter.total_tokens)
+
+
+def sample_runtime():
+    """
+        Refresh runtime gauges: background queues, LLM slots, storage.
+
+        May block (the first storage.usage() scans the upload folders), so
+        callers on the event loop run it with `asyncio.to_thread`.
+        """
+    from app.deletion import pending_deletions
+    from app.llm_gateway import llm
+    from app.storage import storage
+    from app import token_tracker
+
+    QUEUE_DEPTH.labels("artifact_deletion").set(pending_deletions())
+    QUEUE_DEPTH.labels("token_accounting").set(token_tracker._accounting_pool._work_queue.qsize())
+    rag = sys.modules.get("app.routers.rag")  # only imported when RAG is enabled
+    if rag is not None:
+        QUEUE_DEPTH.labels("rag_cpu").set(rag.rag_pool_queue_depth())
+    gateway = llm.stats()
+    QUEUE_DEPTH.labels("llm_inflight_keys").set(gateway["inflight"])
+    LLM_SLOTS_IN_USE.set(gateway["slots_in_use"])
+    for category, used in storage.usage()["categories"].items():
+        STORAGE_BYTES.labels(category).set(used)
+
+
+def render_metrics() -> bytes:
+    """
+        Serialize all metrics in the Prometheus text format.
+
+        Returns:
+            bytes: Exposition payload (aggregated across workers in multiprocess mode).
+
+        Raises:
+            RuntimeError: If prometheus_client is not installed.
+        """
+    if not _HAS_PROMETHEUS:
+        raise RuntimeError("prometheus_client is not installed")
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest()
+
+
+def mark_process_dead():
+    """Drop this worker's live gauges from the multiprocess directory on shutdown."""
+    if _HAS_PROMETHEUS and MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
@@ -12,14 +12,26 @@ Tables:
     - tracks           : Represents individual uploaded audio files with metadata.
     - analysis_results : Stores technical analysis metrics for a single track.
     - chat_history     : Holds AI feedback messages, follow-up Q&A, and comparison results.
+    - llm_response_cache : Persistent cache of deterministic LLM completions (see app.llm_cache).
+    - token_usage_buckets : Per-minute token, cost and LLM latency counters (see app.token_tracker).
+    - track_digests    : Precomputed per-track comparison digests (see app.digests).
+    - rag_conversations : RAG assistant rolling summaries and recent pairs (see app.rag_conversations).
 
 Relationships:
     - User → Session (one-to-many)
     - Session → Track (one-to-many)
     - Session → ChatMessage (one-to-many)
     - Track → AnalysisResult (one-to-one)
+    - Track → TrackDigest (one-to-one)
     - Track → Session (many-to-one)
     - ChatMessage → Session (many-to-one)
+
+Deletes:
+    Child foreign keys use ON DELETE CASCADE (Session → Track/ChatMessage,
+    Track → AnalysisResult/ChatMessage), and the ORM relationships use
+    passive_deletes so the database removes children instead of SQLAlchemy
+    loading them first. SQLite enforces this only with PRAGMA foreign_keys=ON,
+    which app.database enables on every connection.
 """
 from sqlalchemy import Column, Integer, String, Float, Boolean, Text, ForeignKey, DateTime
 from sqlalchemy.orm import relationship
@@ -73,8 +85,8 @@ class Session(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     user = relationship("User", back_populates="sessions")
-    tracks = relationship("Track", back_populates="session")
-    chats = relationship("ChatMessage", back_populates="session")
+    tracks = relationship("Track", back_populates="session", cascade="all, delete-orphan", passive_deletes=True)
+    chats = relationship("ChatMessage", back_populates="session", cascade="all, delete-orphan", passive_deletes=True)
 
 
 class Track(Base):
@@ -90,23 +102,29 @@ class Track(Base):
             genre (str, optional): Genre classification.
             uploaded_at (datetime): Timestamp of upload.
             upload_group_id (str): Group identifier for related uploads.
+            expires_at (datetime, optional): When the uploaded file and its analysis
+                become eligible for cleanup (indexed; see app.cleanup).
 
         Relationships:
             session (Session): The parent session.
             analysis (AnalysisResult): The technical analysis result (one-to-one).
+            digest (TrackDigest): Precomputed comparison digest (one-to-one).
         """
     __tablename__ = 'tracks'
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
-    session_id = Column(String, ForeignKey('sessions.id'))
+    session_id = Column(String, ForeignKey('sessions.id', ondelete='CASCADE'))
     track_name = Column(String)
     file_path = Column(String)
     type = Column(String)
     genre = Column(String, nullable=True)
     uploaded_at = Column(DateTime(timezone=True), server_default=func.now())
     upload_group_id = Column(String, nullable=False, default=lambda: str(uuid.uuid4()))
+    expires_at = Column(DateTime(timezone=True), nullable=True, index=True)
 
     session = relationship("Session", back_populates="tracks")
-    analysis = relationship("AnalysisResult", back_populates="track", uselist=False)
+    analysis = relationship("AnalysisResult", back_populates="track", uselist=False,
+                            cascade="all, delete-orphan", passive_deletes=True)
+    digest = relationship("TrackDigest", uselist=False, cascade="all, delete-orphan", passive_deletes=True)
 
 
 class AnalysisResult(Base):
@@ -147,7 +165,7 @@ class AnalysisResult(Base):
         """
     __tablename__ = 'analysis_results'
     id = Column(Integer, primary_key=True)
-    track_id = Column(String, ForeignKey('tracks.id'))
+    track_id = Column(String, ForeignKey('tracks.id', ondelete='CASCADE'))
 
     peak_db = Column(Float)
     rms_db_avg = Column(Float)  # average RMS
@@ -199,8 +217,8 @@ class ChatMessage(Base):
         """
     __tablename__ = 'chat_history'
     id = Column(Integer, primary_key=True)
-    session_id = Column(String, ForeignKey('sessions.id'))
-    track_id = Column(String, ForeignKey('tracks.id'), nullable=True)
+    session_id = Column(String, ForeignKey('sessions.id', ondelete='CASCADE'))
+    track_id = Column(String, ForeignKey('tracks.id', ondelete='CASCADE'), nullable=True, index=True)
     sender = Column(String)
     message = Column(Text)
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
@@ -212,3 +230,129 @@ class ChatMessage(Base):
     compared_track_names = Column(Text, nullable=True)
 
     session = relationship("Session", back_populates="chats")
+
+
+class TrackDigest(Base):
+    """
+        Compact, precomputed context for multi-track comparisons.
+
+        Written whenever feedback for the track is stored, so comparisons read
+        one small row per track instead of the whole chat thread.
+
+        Fields:
+            track_id (str): Primary key; foreign key referencing Track.id.
+            analysis_summary (str): Key analysis numbers as prompt-ready text.
+            feedback_digest (str): Initial feedback, follow-up summaries and the
+                latest messages, capped at DIGEST_FEEDBACK_TOKENS.
+            message_count (int): Chat messages of the track covered by the digest;
+                a different live count marks the digest as stale.
+            updated_at (datetime): When the digest was last rebuilt.
+        """
+    __tablename__ = 'track_digests'
+    track_id = Column(String, ForeignKey('tracks.id', ondelete='CASCADE'), primary_key=True)
+    analysis_summary = Column(Text, nullable=False)
+    feedback_digest = Column(Text, nullable=False, default="")
+    message_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class LLMResponseCache(Base):
+    """
+        Cached LLM completion for a deterministic prompt.
+
+        Fields:
+            fingerprint (str): Primary key; SHA-256 of model + normalized messages + sampling params.
+            model (str): Model that produced the response.
+            response (str): Completion text.
+            prompt_tokens (int, optional): Provider-reported prompt tokens of the original call.
+            completion_tokens (int, optional): Provider-reported completion tokens of the original call.
+            created_at (datetime): When the entry was stored.
+            expires_at (datetime): When the entry stops being served (indexed for purging).
+            last_hit_at (datetime): Last read or write (indexed for LRU eviction).
+            hits (int): Number of times the entry was served.
+        """
+    __tablename__ = 'llm_response_cache'
+    fingerprint = Column(String(64), primary_key=True)
+    model = Column(String, nullable=False)
+    response = Column(Text, nullable=False)
+    prompt_tokens = Column(Integer, nullable=True)
+    completion_tokens = Column(Integer, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    last_hit_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    hits = Column(Integer, nullable=False, default=0)
+
+
+class TokenUsageBucket(Base):
+    """
+        Token usage and LLM latency for one minute, model and endpoint.
+
+        Rows are only ever incremented (additive upserts from every worker),
+        so all counters can be summed across any range or grouping.
+
+        Fields:
+            bucket_start (datetime): Start of the UTC minute (primary key part).
+            model (str): Model name (primary key part).
+            endpoint (str): Normalized request path that triggered the call,
+                or "background" (primary key part).
+            requests (int): Upstream LLM calls (coalesced duplicates excluded).
+            errors (int): Calls that failed after retries.
+            prompt_tokens (int): Prompt tokens.
+            completion_tokens (int): Completion tokens.
+            total_tokens (int): All tokens, including usage recorded without a split.
+            cost (float): Estimated USD cost.
+            latency_count (int): Calls with a recorded latency.
+            latency_sum_ms (float): Sum of latencies in milliseconds.
+            latency_le_*ms / latency_gt_32000ms (int): Latency histogram counts
+                (bounds in app.token_tracker.LATENCY_BUCKETS_MS).
+        """
+    __tablename__ = 'token_usage_buckets'
+    bucket_start = Column(DateTime(timezone=True), primary_key=True)
+    model = Column(String(64), primary_key=True)
+    endpoint = Column(String(128), primary_key=True)
+    requests = Column(Integer, nullable=False, default=0)
+    errors = Column(Integer, nullable=False, default=0)
+    prompt_tokens = Column(Integer, nullable=False, default=0)
+    completion_tokens = Column(Integer, nullable=False, default=0)
+    total_tokens = Column(Integer, nullable=False, default=0)
+    cost = Column(Float, nullable=False, default=0.0)
+    latency_count = Column(Integer, nullable=False, default=0)
+    latency_sum_ms = Column(Float, nullable=False, default=0.0)
+    latency_le_250ms = Column(Integer, nullable=False, default=0)
+    latency_le_500ms = Column(Integer, nullable=False, default=0)
+    latency_le_1000ms = Column(Integer, nullable=False, default=0)
+    latency_le_2000ms = Column(Integer, nullable=False, default=0)
+    latency_le_4000ms = Column(Integer, nullable=False, default=0)
+    latency_le_8000ms = Column(Integer, nullable=False, default=0)
+    latency_le_16000ms = Column(Integer, nullable=False, default=0)
+    latency_le_32000ms = Column(Integer, nullable=False, default=0)
+    latency_gt_32000ms = Column(Integer, nullable=False, default=0)
+
+
+class RagConversation(Base):
+    """
+        Server-side state of one RAG assistant conversation.
+
+        Holds the rolling summary and only the question/answer pairs not yet
+        folded into it, so a client sends its conversation id instead of the
+        whole history (see app.rag_conversations).
+
+        Fields:
+            id (str): Primary key (UUID handed to the client).
+            corpus (str): Assistant the conversation belongs to ("docs" or "tut").
+            summary (str): Rolling summary of the older pairs, or None.
+            tail (str): JSON list of {"question", "answer"} pairs after the summary.
+            summarized_pairs (int): Pairs folded into the summary so far.
+            created_at (datetime): When the conversation started.
+            updated_at (datetime): Last answer or summary update.
+            expires_at (datetime): Eviction time, pushed back on every answer.
+        """
+    __tablename__ = 'rag_conversations'
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    corpus = Column(String(16), nullable=False)
+    summary = Column(Text, nullable=True)
+    tail = Column(Text, nullable=False, default="[]")
+    summarized_pairs = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
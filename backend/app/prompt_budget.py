@@ -0,0 +1,197 @@
+"""
+Prompt token budgeting for ZoundZcope.
+
+Comparison and follow-up prompts are assembled from sections whose size is
+outside our control (analysis text, prior feedback, whole chat threads).
+`compact_chat_history` first replaces older follow-ups with the stored group
+summaries (feedback_profile="summary"). `fit_sections` then measures each
+section with the memoized tiktoken encoders from app.utils and shrinks the
+least important ones until the prompt fits a token budget:
+
+    - Sections are shrunk in ascending `priority`; on ties the later section
+      in the prompt goes first.
+    - Each is truncated down to its `min_tokens`, keeping the head or the tail
+      of the text (`keep`); sections with min_tokens=0 may vanish.
+
+Sections that cannot shrink any further are left as they are, so a prompt made
+only of required content may still exceed the budget. `fit_even` splits one
+budget between parallel texts (e.g. per-track chat histories in a comparison).
+
+Configuration:
+    FOLLOWUP_PROMPT_TOKEN_BUDGET   : Budget for follow-up prompts (default 1800).
+    COMPARISON_PROMPT_TOKEN_BUDGET : Budget for multi-track comparison prompts (default 3500).
+    COMPARISON_RECENT_MESSAGES     : Latest chat messages kept verbatim per compared track (default 4).
+"""
+import logging
+import os
+from typing import Dict, List
+
+from app.utils import count_tokens, get_encoder
+
+logger = logging.getLogger("prompt_budget")
+
+FOLLOWUP_PROMPT_TOKEN_BUDGET = int(os.getenv("FOLLOWUP_PROMPT_TOKEN_BUDGET", "1800"))
+COMPARISON_PROMPT_TOKEN_BUDGET = int(os.getenv("COMPARISON_PROMPT_TOKEN_BUDGET", "3500"))
+COMPARISON_RECENT_MESSAGES = int(os.getenv("COMPARISON_RECENT_MESSAGES", "4"))
+
+TRUNCATION_MARKER = " [...]"
+
+
+class Section:
+    """
+        One named part of a prompt.
+
+        Args:
+            name (str): Key under which `fit_sections` returns the final text.
+            text (str): Full text of the section.
+            priority (int): Higher is kept longer.
+            min_tokens (int): Never truncate below this; 0 lets the section be dropped.
+            keep (str): "head" keeps the beginning when truncating, "tail" the end.
+        """
+
+    def __init__(self, name: str, text: str, priority: int = 0, min_tokens: int = 0,
+                 keep: str = "head"):
+        self.name = name
+        self.text = text or ""
+        self.priority = priority
+        self.min_tokens = min_tokens
+        self.keep = keep
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str = "gpt-4o", keep: str = "head") -> str:
+    """
+        Cut text down to at most `max_tokens` tokens.
+
+        Args:
+            text (str): Text to shorten.
+            max_tokens (int): Token limit; 0 or less returns "".
+            model (str, optional): Model whose encoder measures the text.
+            keep (str, optional): "head" keeps the beginning, "tail" the end.
+
+        Returns:
+            str: The text unchanged if it fits, otherwise the kept part with a
+                 truncation marker on the cut side.
+        """
+    if max_tokens <= 0 or not text:
+        return ""
+    encoder = get_encoder(model)
+    if encoder is None:
+        if len(text) // 4 <= max_tokens:
+            return text
+        limit = max(max_tokens - len(TRUNCATION_MARKER) // 4, 0) * 4
+        return text[:limit] + TRUNCATION_MARKER if keep == "head" else TRUNCATION_MARKER + text[-limit:]
+    tokens = encoder.encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    # Leave room for the marker so the result stays within max_tokens
+    max_tokens = max(max_tokens - len(encoder.encode(TRUNCATION_MARKER)), 0)
+    if keep == "head":
+        return encoder.decode(tokens[:max_tokens]) + TRUNCATION_MARKER
+    return TRUNCATION_MARKER + encoder.decode(tokens[-max_tokens:])
+
+
+def fit_sections(sections: List[Section], budget: int, model: str = "gpt-4o",
+                 reserved_tokens: int = 0) -> Dict[str, str]:
+    """
+        Shrink prompt sections until their total token count fits the budget.
+
+        Args:
+            sections (list[Section]): Sections in prompt order.
+            budget (int): Token budget for the whole prompt.
+            model (str, optional): Model whose encoder measures the text.
+            reserved_tokens (int, optional): Tokens used by fixed prompt text
+                (instructions, headings) that isn't part of any section.
+
+        Returns:
+            dict[str, str]: Section name -> text to put in the prompt.
+        """
+    texts = {s.name: s.text for s in sections}
+    sizes = {s.name: count_tokens(s.text, model) for s in sections}
+    before = reserved_tokens + sum(sizes.values())
+    overflow = before - budget
+    if overflow <= 0:
+        return texts
+
+    order = sorted(enumerate(sections), key=lambda item: (item[1].priority, -item[0]))
+    for _, section in order:
+        if overflow <= 0:
+            break
+        name = section.name
+        target = max(section.min_tokens, sizes[name] - overflow)
+        if target >= sizes[name]:
+            continue
+        texts[name] = truncate_to_tokens(texts[name], target, model, section.keep)
+        new_size = count_tokens(texts[name], model)
+        overflow -= sizes[name] - new_size
+        sizes[name] = new_size
+
+    after = reserved_tokens + sum(sizes.values())
+    logger.info(f"Prompt compacted from {before} to {after} tokens (budget {budget})")
+    return texts
+
+
+def fit_even(texts: List[str], budget: int, model: str = "gpt-4o", keep: str = "head") -> List[str]:
+    """
+        Share a token budget evenly between parallel texts (one per compared track).
+
+        Texts smaller than their share keep their full size and the rest of
+        their share goes to the longer ones, so only the longest texts are cut.
+
+        Args:
+            texts (list[str]): Texts competing for the same budget.
+            budget (int): Total tokens available to all of them.
+            model (str, optional): Model whose encoder measures the text.
+            keep (str, optional): "head" or "tail", as in `truncate_to_tokens`.
+
+        Returns:
+            list[str]: Texts in the same order, truncated where needed.
+        """
+    sizes = [count_tokens(t, model) for t in texts]
+    if sum(sizes) <= budget:
+        return list(texts)
+
+    allowances = [0] * len(texts)
+    remaining = max(budget, 0)
+    by_size = sorted(range(len(texts)), key=lambda i: sizes[i])
+    for position, i in enumerate(by_size):
+        allowances[i] = min(sizes[i], remaining // (len(texts) - position))
+        remaining -= allowances[i]
+
+    logger.info(f"Compacted {len(texts)} texts from {sum(sizes)} to {sum(allowances)} tokens (budget {budget})")
+    return [
+        text if allowance >= size else truncate_to_tokens(text, allowance, model, keep)
+        for text, size, allowance in zip(texts, sizes, allowances)
+    ]
+
+
+def compact_chat_history(messages, summaries: List[str], recent: int = COMPARISON_RECENT_MESSAGES) -> str:
+    """
+        Condense a track's chat thread for use inside a larger prompt.
+
+        Keeps the initial feedback (first assistant message), the stored
+        follow-up group summaries, and the last `recent` messages verbatim;
+        older follow-ups in between are left out and counted.
+
+        Args:
+            messages (list[ChatMessage]): Thread in chronological order, summaries excluded.
+            summaries (list[str]): Stored follow-up summaries, oldest first.
+            recent (int, optional): Number of trailing messages to keep.
+
+        Returns:
+            str: Condensed history ("" when there are no messages or summaries).
+        """
+    if not messages and not summaries:
+        return ""
+    first_feedback = next((m for m in messages if m.sender != "user"), None)
+    tail = messages[-recent:] if recent > 0 else []
+    middle = [m for m in messages if m is not first_feedback and m not in tail]
+
+    parts = []
+    if first_feedback is not None and first_feedback not in tail:
+        parts.append(f"{first_feedback.sender}: {first_feedback.message}")
+    for summary in summaries:
+        parts.append(f"Summary of earlier follow-ups: {summary}")
+    if middle:
+        parts.append(f"({len(middle)} older follow-up messages omitted)")
+    parts.extend(f"{m.sender}: {m.message}" for m in tail)
+    return "\n".join(parts)
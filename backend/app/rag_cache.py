@@ -0,0 +1,172 @@
+"""
+In-process caches for the RAG retrieval step.
+
+The RAG assistants get the same FAQ-style questions over and over. Each one
+used to cost a transformer forward pass (`embed_query`) plus a FAISS search
+before the LLM was even called. Two bounded LRU caches take both off the hot
+path for repeat questions:
+
+    normalized question (case, whitespace, surrounding punctuation)
+              -> embedding            (query embedding cache)
+    (index, embedding, top_k) -> ids  (retrieval cache)
+
+Embeddings depend only on the model, so they survive index reloads.
+Retrieval results are dropped by `invalidate_retrievals()`, which
+app.routers.rag calls whenever it (re)loads an index after a rebuild.
+
+Hits and misses are counted per cache (`stats()`, and zz_rag_cache_total in
+app.metrics). Caches are per worker process.
+
+Configuration:
+    RAG_EMBED_CACHE_SIZE     : Query embeddings kept (default 1024; 0 disables).
+    RAG_RETRIEVAL_CACHE_SIZE : Retrieval results kept (default 2048; 0 disables).
+"""
+from collections import OrderedDict
+import hashlib
+import os
+import re
+import threading
+import unicodedata
+
+from rag.rag_utils import embed_query, search_index
+
+from app.metrics import RAG_CACHE, RAG_CACHE_ENTRIES
+
+RAG_EMBED_CACHE_SIZE = int(os.getenv("RAG_EMBED_CACHE_SIZE", "1024"))
+RAG_RETRIEVAL_CACHE_SIZE = int(os.getenv("RAG_RETRIEVAL_CACHE_SIZE", "2048"))
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+        Thread-safe size-bounded mapping that evicts the least recently used entry.
+
+        Args:
+            name (str): Label for stats and metrics.
+            maxsize (int): Most entries kept; 0 or less disables the cache.
+        """
+
+    def __init__(self, name: str, maxsize: int):
+        self.name = name
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._data.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._data.move_to_end(key)
+        RAG_CACHE.labels(self.name, "miss" if value is _MISSING else "hit").inc()
+        return default if value is _MISSING else value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+            size = len(self._data)
+        RAG_CACHE_ENTRIES.labels(self.name).set(size)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+        RAG_CACHE_ENTRIES.labels(self.name).set(0)
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+query_embeddings = LRUCache("embedding", RAG_EMBED_CACHE_SIZE)
+retrievals = LRUCache("retrieval", RAG_RETRIEVAL_CACHE_SIZE)
+
+
+def normalize_question(question: str) -> str:
+    """
+        Canonical form of a question, used only as the cache key.
+
+        Applies NFKC, lowercases, collapses whitespace and strips surrounding
+        punctuation, so "How is LUFS measured?" and "how is lufs measured"
+        share an entry. The text that gets embedded is never normalized.
+        """
+    text = unicodedata.normalize("NFKC", question).lower()
+    text = re.sub(r"\s+", " ", text)
+    return text.strip(" \t\n?!.,;:")
+
+
+def cached_embed_query(question: str):
+    """
+        Embed a question, reusing the embedding of an earlier equivalent one.
+
+        A miss embeds the question exactly as received. Questions that differ
+        from it only in case, whitespace or surrounding punctuation are served
+        that same embedding, so their retrieval may differ slightly from what
+        an uncached embedding would give.
+
+        Args:
+            question (str): User question as received.
+
+        Returns:
+            numpy.ndarray: Read-only unit-length float32 embedding of the
+                first variant of the question seen since it was cached.
+        """
+    key = normalize_question(question) or question
+    embedding = query_embeddings.get(key)
+    if embedding is None:
+        embedding = embed_query(question)
+        embedding.setflags(write=False)
+        query_embeddings.put(key, embedding)
+    return embedding
+
+
+def cached_search(index, query_embedding, top_k: int):
+    """
+        `search_index` with results cached per index, embedding and top_k.
+
+        Args:
+            index (faiss.Index): Loaded index; entries are keyed by its identity,
+                so `invalidate_retrievals()` must run when it is replaced.
+            query_embedding (numpy.ndarray): Embedding from `cached_embed_query`.
+            top_k (int): Number of neighbours.
+
+        Returns:
+            tuple[int, ...]: Matching FAISS ids (-1 for empty slots).
+        """
+    key = (id(index), hashlib.sha1(query_embedding.tobytes()).digest(), top_k)
+    entry = retrievals.get(key)
+    # The entry keeps its index alive, so an id() can't be reused by a reloaded index while cached
+    if entry is not None and entry[0] is index:
+        return entry[1]
+    indices, _ = search_index(index, query_embedding, top_k=top_k)
+    ids = tuple(int(i) for i in indices)
+    retrievals.put(key, (index, ids))
+    return ids
+
+
+def invalidate_retrievals():
+    """Drop cached retrieval results (call after an index is rebuilt or reloaded)."""
+    retrievals.clear()
+
+
+def stats() -> dict:
+    """Per-cache size and hit-rate counters of this worker."""
+    return {cache.name: cache.stats() for cache in (query_embeddings, retrievals)}
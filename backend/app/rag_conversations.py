@@ -0,0 +1,275 @@
+"""
+Server-side RAG assistant conversations for ZoundZcope.
+
+The RAG endpoints used to get the whole chat history from the client on every
+question, and tracked summarization progress in a module global shared by all
+users. Conversations now live in the `rag_conversations` table, keyed by an id
+the client sends back:
+
+    open_conversation()  -> load (or start) the conversation; the prompt gets
+                            its rolling summary + the unsummarized tail
+    record_answer()      -> append the new question/answer pair to the tail
+    (background)         -> once the tail holds RAG_SUMMARY_EVERY pairs, the
+                            oldest ones are folded into the summary by the LLM,
+                            after the answer has been returned
+
+Writes are compare-and-swap on the stored tail, so concurrent requests (or
+workers) on one conversation never lose a pair, and a summary computed from
+pairs that were already folded in by someone else is discarded.
+
+A request without a conversation id (older clients) starts a new conversation
+seeded from the history it sent; its id is returned with the answer.
+Conversations expire RAG_CONVERSATION_TTL_SECONDS after their last answer;
+expired rows are ignored on load and deleted by app.cleanup.
+
+Configuration:
+    RAG_CONVERSATION_TTL_SECONDS : Idle lifetime of a conversation (default 24h).
+    RAG_SUMMARY_EVERY            : Tail pairs that trigger a summary (default 4).
+"""
+import asyncio
+from datetime import datetime, timedelta, timezone
+import json
+import logging
+import os
+from typing import List, Optional, Tuple
+
+from sqlalchemy import update
+
+from app.database import AsyncSessionLocal
+from app.llm_gateway import llm, OPENAI_API_KEY, OPENAI_MODEL
+from app.models import RagConversation
+from app.token_tracker import record_usage
+
+logger = logging.getLogger("rag_conversations")
+
+RAG_CONVERSATION_TTL_SECONDS = int(os.getenv("RAG_CONVERSATION_TTL_SECONDS", str(24 * 60 * 60)))
+RAG_SUMMARY_EVERY = int(os.getenv("RAG_SUMMARY_EVERY", "4"))
+RAG_SUMMARY_DEADLINE = 20.0  # seconds, including queueing and retries
+_CAS_ATTEMPTS = 5
+
+SUMMARY_MARKER = "__summary__"
+
+# Strong references to running summary tasks, and the conversations they cover
+_background = set()
+_summarizing = set()
+
+
+def _expiry(now: datetime = None) -> datetime:
+    now = now or datetime.now(timezone.utc)
+    return now + timedelta(seconds=RAG_CONVERSATION_TTL_SECONDS)
+
+
+def _is_expired(conv: RagConversation, now: datetime) -> bool:
+    expires_at = conv.expires_at
+    if expires_at.tzinfo is None:  # SQLite returns naive UTC
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    return expires_at <= now
+
+
+def prompt_history(summary: Optional[str], pairs: List[dict]) -> List[dict]:
+    """History in the shape the prompt builders expect: summary item first, then pairs."""
+    history = [{"question": SUMMARY_MARKER, "answer": summary}] if summary else []
+    return history + pairs
+
+
+def _seed(history: List[dict]) -> Tuple[Optional[str], List[dict]]:
+    """Split client-sent history into its latest summary and the pairs after it."""
+    summary = None
+    pairs = []
+    for item in history or []:
+        question, answer = item.get("question"), item.get("answer")
+        if question is None or answer is None:
+            continue
+        if question == SUMMARY_MARKER:
+            summary, pairs = answer, []
+        else:
+            pairs.append({"question": question, "answer": answer})
+    return summary, pairs
+
+
+async def open_conversation(conversation_id: Optional[str], corpus: str,
+                            history: List[dict] = None) -> Tuple[str, List[dict]]:
+    """
+        Load a conversation, or start one when the id is missing, unknown or expired.
+
+        Args:
+            conversation_id (str | None): Id from the client's previous answer.
+            corpus (str): "docs" or "tut"; an id from the other assistant starts
+                a new conversation.
+            history (list[dict], optional): Client-sent history, used only to
+                seed a new conversation.
+
+        Returns:
+            tuple[str, list[dict]]: Conversation id and the history to put in
+                the prompt (summary item + unsummarized pairs).
+        """
+    now = datetime.now(timezone.utc)
+    async with AsyncSessionLocal() as db:
+        conv = await db.get(RagConversation, conversation_id) if conversation_id else None
+        if conv is not None and conv.corpus == corpus and not _is_expired(conv, now):
+            return conv.id, prompt_history(conv.summary, json.loads(conv.tail))
+
+        summary, pairs = _seed(history)
+        conv = RagConversation(corpus=corpus, summary=summary, tail=json.dumps(pairs), expires_at=_expiry(now))
+        db.add(conv)
+        await db.commit()
+        return conv.id, prompt_history(summary, pairs)
+
+
+async def _swap_tail(db, conversation_id: str, old_tail: str, **values) -> bool:
+    """Write `values` only if the stored tail is still `old_tail`."""
+    result = await db.execute(
+        update(RagConversation)
+        .where(RagConversation.id == conversation_id, RagConversation.tail == old_tail)
+        .values(**values)
+    )
+    await db.commit()
+    return result.rowcount == 1
+
+
+async def record_answer(conversation_id: str, question: str, answer: str, context_note: str = ""):
+    """
+        Append a question/answer pair and schedule summarization when due.
+
+        Error answers ("Error: ...") are not stored. Failures are logged and
+        swallowed: the answer has already been produced.
+
+        Args:
+            conversation_id (str): Conversation from `open_conversation`.
+            question (str): The user's question.
+            answer (str): The generated answer.
+            context_note (str): Guides the summary (docs vs. tutorial context).
+        """
+    if not answer or answer.startswith("Error:"):
+        return
+    try:
+        async with AsyncSessionLocal() as db:
+            for _ in range(_CAS_ATTEMPTS):
+                conv = await db.get(RagConversation, conversation_id, populate_existing=True)
+                if conv is None:
+                    return
+                old_tail = conv.tail
+                pairs = json.loads(old_tail) + [{"question": question, "answer": answer}]
+                if await _swap_tail(db, conversation_id, old_tail, tail=json.dumps(pairs), expires_at=_expiry()):
+                    break
+            else:
+                logger.warning(f"RAG conversation {conversation_id}: pair dropped after concurrent updates")
+                return
+    except Exception as e:
+        logger.error(f"Storing RAG answer for conversation {conversation_id} failed: {e}")
+        return
+
+    if len(pairs) >= RAG_SUMMARY_EVERY:
+        schedule_summary(conversation_id, context_note)
+
+
+def schedule_summary(conversation_id: str, context_note: str = ""):
+    """Run `summarize_conversation` in the background (at most one per conversation and worker)."""
+    if conversation_id in _summarizing:
+        return
+    _summarizing.add(conversation_id)
+    task = asyncio.create_task(summarize_conversation(conversation_id, context_note))
+    _background.add(task)
+
+    def _done(t):
+        _background.discard(t)
+        _summarizing.discard(conversation_id)
+
+    task.add_done_callback(_done)
+
+
+async def _summarize(previous: Optional[str], pairs: List[dict], context_note: str) -> Optional[str]:
+    """Ask the LLM for a new rolling summary; None if it isn't available or fails."""
+    if not OPENAI_API_KEY:
+        return None
+    summary_prompt = (
+        f"You're an assistant summarizing a technical chat session.\n"
+        f"{context_note}\n"
+        "Summarize the following conversation concisely while preserving all relevant technical details:\n\n"
+    )
+    if previous:
+        summary_prompt += f"Previous Summary:\n{previous}\n\n"
+    for pair in pairs:
+        summary_prompt += f"User: {pair['question']}\nAI: {pair['answer']}\n\n"
+
+    try:
+        response = await llm.acomplete(
+            [
+                {"role": "system", "content": "You are summarizing a technical Q&A exchange."},
+                {"role": "user", "content": summary_prompt}
+            ],
+            model=OPENAI_MODEL,
+            max_tokens=300,
+            temperature=0.3,
+            deadline=RAG_SUMMARY_DEADLINE,
+        )
+        summary = response.choices[0].message.content
+    except Exception:
+        logger.exception("OpenAI chat error (RAG conversation summary)")
+        return None
+
+    # Coalesced duplicates were already counted
+    if not getattr(response, "coalesced", False):
+        record_usage(response.usage, model_name=OPENAI_MODEL, prompt=summary_prompt, completion=summary)
+    return summary
+
+
+async def summarize_conversation(conversation_id: str, context_note: str = ""):
+    """
+        Fold the oldest tail pairs into the rolling summary, RAG_SUMMARY_EVERY at a time.
+
+        Repeats while the tail is still long enough (e.g. a conversation seeded
+        from a long client history). A summary is only stored if the pairs it
+        covers are still at the head of the tail.
+
+        Args:
+            conversation_id (str): Conversation to summarize.
+            context_note (str): Guides the summary (docs vs. tutorial context).
+        """
+    try:
+        async with AsyncSessionLocal() as db:
+            while True:
+                conv = await db.get(RagConversation, conversation_id, populate_existing=True)
+                if conv is None or len(json.loads(conv.tail)) < RAG_SUMMARY_EVERY:
+                    return
+                batch = json.loads(conv.tail)[:RAG_SUMMARY_EVERY]
+                summary = await _summarize(conv.summary, batch, context_note)
+                if summary is None:
+                    return
+
+                for _ in range(_CAS_ATTEMPTS):
+                    conv = await db.get(RagConversation, conversation_id, populate_existing=True)
+                    if conv is None:
+                        return
+                    pairs = json.loads(conv.tail)
+                    if pairs[:RAG_SUMMARY_EVERY] != batch:
+                        return  # folded in elsewhere meanwhile
+                    if await _swap_tail(
+                        db, conversation_id, conv.tail,
+                        summary=summary,
+                        tail=json.dumps(pairs[RAG_SUMMARY_EVERY:]),
+                        summarized_pairs=RagConversation.summarized_pairs + len(batch),
+                    ):
+                        break
+                else:
+                    return
+                logger.info(f"RAG conversation {conversation_id}: summarized {len(batch)} more pairs")
+    except Exception as e:
+        logger.error(f"RAG conversation {conversation_id} summary failed: {e}")
+
+
+def purge_expired(db, now: datetime = None) -> int:
+    """
+        Delete expired conversations.
+
+        Args:
+            db (Session): Sync database session (committed here).
+            now (datetime, optional): Reference time; defaults to now (UTC).
+
+        Returns:
+            int: Number of conversations deleted.
+        """
+    now = now or datetime.now(timezone.utc)
+    deleted = db.query(RagConversation).filter(RagConversation.expires_at <= now).delete(synchronize_session=False)
+    db.commit()
+    return deleted
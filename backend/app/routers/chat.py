@@ -17,25 +17,35 @@ Workflow:
 Endpoints:
     POST /chat/feedback
         Generate initial AI feedback for a specific track.
+    POST /chat/feedback/stream
+        Stream initial AI feedback for an uploaded track as Server-Sent Events.
     POST /chat/followup
         Generate follow-up answers using conversation context.
+    POST /chat/ask-followup/stream
+        Streaming (SSE) variant of the follow-up endpoint.
     POST /chat/comparison
         Provide AI-driven comparative feedback across multiple tracks.
 
 Dependencies:
-    - SQLAlchemy for ORM-based database queries.
+    - SQLAlchemy for ORM-based database queries (shared `get_db` for writes,
+      `get_async_db` for the read-only history endpoints).
     - Pydantic for request body validation.
     - OpenAI GPT utilities for dynamic feedback generation.
     - JSON handling for structured data exchange.
 """
 from fastapi import APIRouter, Form, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.database import SessionLocal
+from app.database import get_db, get_async_db, SessionLocal
 from app.models import Track, AnalysisResult, ChatMessage
 from app.gpt_utils import generate_feedback_prompt, generate_feedback_response, build_followup_prompt
-from app.utils import normalize_type, normalize_genre, normalize_profile, sanitize_user_question
-from app.gpt_utils import generate_comparison_feedback
+from app.utils import normalize_type, normalize_genre, normalize_profile, normalize_subgenre, sanitize_user_question
+from app.gpt_utils import generate_comparison_feedback, stream_feedback_response
+from app.digests import COMPARISON_MAX_TRACKS, load_digests, refresh_digest
+from app.sse import format_sse, sse_response
 from pydantic import BaseModel
 from typing import Optional, Dict, Any
 import json
@@ -45,21 +55,48 @@ import uuid
 
 router = APIRouter()
 
-def get_db():
-    """
-        Dependency function that provides a SQLAlchemy database session.
 
-        Yields:
-            Session: SQLAlchemy session object.
-        Ensures:
-            The session is properly closed after use.
-        """
+def _with_db(fn, *args):
+    """Run `fn(db, *args)` with a short-lived session (streams outlive request dependencies)."""
     db = SessionLocal()
     try:
-        yield db
+        return fn(db, *args)
     finally:
         db.close()
 
+
+async def _stream_and_persist(prompt: str, persist, cache: bool = False):
+    """
+        Stream an AI answer as SSE events and persist it once complete.
+
+        Args:
+            prompt (str): Prompt to send to the model.
+            persist (Callable[[str], dict]): Blocking function that stores the
+                final text and returns the `done` payload; run in the threadpool.
+            cache (bool): Serve/store the answer via the LLM response cache.
+
+        Yields:
+            str: Encoded `delta` events, then one `done` or `error` event.
+        """
+    chunks = []
+    try:
+        async for delta in stream_feedback_response(prompt, cache=cache):
+            chunks.append(delta)
+            yield format_sse({"delta": delta})
+    except Exception as e:
+        print("❌ Streaming GPT call failed:", e.__class__.__name__, e)
+        yield format_sse({"detail": f"AI request failed ({e.__class__.__name__})."}, event="error")
+        return
+
+    text = "".join(chunks).strip() or "Error: Model returned an empty response."
+    try:
+        payload = await run_in_threadpool(persist, text)
+    except Exception as e:
+        print("❌ Failed to save streamed response:", repr(e))
+        yield format_sse({"detail": "Response generated but could not be saved."}, event="error")
+        return
+    yield format_sse(payload, event="done")
+
 @router.get("/generate_feedback")
 def get_feedback(
     track_id: str = Form(...),
@@ -122,10 +159,108 @@ def get_feedback(
     )
     db.add(chat)
     db.commit()
+    refresh_digest(db, track.id)
 
     return {"feedback": feedback}
 
 
+class FeedbackStreamRequest(BaseModel):
+    track_id: str
+    session_id: str
+    type: str
+    genre: str
+    subgenre: Optional[str] = None
+    feedback_profile: str
+
+
+def _prepare_feedback(db: Session, req: FeedbackStreamRequest) -> str:
+    """
+        Build the initial feedback prompt for a stored track.
+
+        Uses the stored AnalysisResult of the track and, when the upload
+        included one, of its reference track.
+
+        Args:
+            db (Session): Database session.
+            req (FeedbackStreamRequest): Track and prompt settings.
+
+        Raises:
+            HTTPException: 404 if the track or its analysis is missing,
+                400 if type/genre/profile are invalid.
+
+        Returns:
+            str: The feedback prompt.
+        """
+    track = db.query(Track).filter(Track.id == req.track_id).first()
+    if not track or not track.analysis:
+        raise HTTPException(status_code=404, detail="Track analysis not found")
+
+    ref_track = (
+        db.query(Track)
+        .filter(Track.upload_group_id == track.upload_group_id, Track.type == "reference")
+        .order_by(Track.uploaded_at.desc())
+        .first()
+    )
+
+    def as_dict(result):
+        return {c.name: getattr(result, c.name) for c in AnalysisResult.__table__.columns}
+
+    try:
+        return generate_feedback_prompt(
+            genre=normalize_genre(req.genre),
+            subgenre=normalize_subgenre(req.subgenre) if req.subgenre else "",
+            type=normalize_type(req.type),
+            analysis_data=as_dict(track.analysis),
+            feedback_profile=normalize_profile(req.feedback_profile),
+            ref_analysis_data=as_dict(ref_track.analysis) if ref_track and ref_track.analysis else None,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _save_feedback(db: Session, req: FeedbackStreamRequest, feedback: str) -> dict:
+    """Store streamed initial feedback and return the `done` payload."""
+    chat = ChatMessage(
+        session_id=req.session_id,
+        track_id=req.track_id,
+        sender="assistant",
+        message=feedback,
+        feedback_profile=normalize_profile(req.feedback_profile),
+    )
+    db.add(chat)
+    db.commit()
+    message_id = chat.id
+    refresh_digest(db, req.track_id)
+    return {"feedback": feedback, "message_id": message_id}
+
+
+@router.post("/feedback/stream")
+async def stream_feedback(req: FeedbackStreamRequest):
+    """
+        Stream initial AI feedback for an uploaded track as Server-Sent Events.
+
+        Pairs with `POST /upload/` called with `defer_feedback=true`: the upload
+        returns as soon as analysis is stored, and the client opens this stream
+        to render feedback token by token. The complete feedback is saved as a
+        ChatMessage when the stream finishes.
+
+        Parameters:
+            req (FeedbackStreamRequest): Track ID, session ID and prompt settings.
+
+        Raises:
+            HTTPException: If the track/analysis is missing (404) or settings are invalid (400).
+
+        Returns:
+            StreamingResponse: `text/event-stream` of delta/done/error events.
+        """
+    prompt = await run_in_threadpool(_with_db, _prepare_feedback, req)
+
+    def persist(feedback: str) -> dict:
+        return _with_db(_save_feedback, req, feedback)
+
+    return sse_response(_stream_and_persist(prompt, persist, cache=True))
+
+
 class FollowUpRequest(BaseModel):
     analysis_text: str
     feedback_text: str
@@ -137,23 +272,23 @@ class FollowUpRequest(BaseModel):
     ref_analysis_data: Optional[Dict[str, Any]] = None
 
 
-@router.post("/ask-followup")
-def ask_followup(req: FollowUpRequest, db: Session = Depends(get_db)):
+def _prepare_followup(db: Session, req: FollowUpRequest):
     """
+        Load the context for a follow-up question and build its prompt.
+
         Fetches the main track and optional reference track analysis from the database.
         Retrieves the previous follow-up summary if available to provide context for the AI prompt.
 
-        Parameters:
-            req (FollowUpRequest): The follow-up request containing session, track, and follow-up group info.
+        Args:
             db (Session): Database session for querying data.
+            req (FollowUpRequest): The follow-up request containing session, track, and follow-up group info.
+
+        Raises:
+            HTTPException: If the main track does not exist (404).
 
         Returns:
-            tuple: (main_track, ref_analysis, summary_text)
-                main_track: The primary Track object or None if not found.
-                ref_analysis: Dict of reference track analysis data or None.
-                summary_text: Previous follow-up summary string or empty string.
+            tuple: (profile, user_question, prompt)
         """
-
     profile = normalize_profile(req.feedback_profile)
     user_question = sanitize_user_question(req.user_question)
 
@@ -215,13 +350,26 @@ def ask_followup(req: FollowUpRequest, db: Session = Depends(get_db)):
         ref_analysis_data=req.ref_analysis_data
     )
 
-    try:
-        ai_response = generate_feedback_response(prompt)
-        print("GPT response:", ai_response)
-    except Exception as e:
-        print("❌ GPT call failed:", e)
-        raise HTTPException(status_code=500, detail="AI follow-up failed")
+    return profile, user_question, prompt
+
+
+def _save_followup(db: Session, req: FollowUpRequest, profile: str, user_question: str, ai_response: str) -> dict:
+    """
+        Persist a follow-up exchange and create the group summary when due.
 
+        Saves the user question and assistant answer, and after four user
+        follow-ups in a group generates and stores a summary message.
+
+        Args:
+            db (Session): Database session.
+            req (FollowUpRequest): The original follow-up request.
+            profile (str): Normalized feedback profile.
+            user_question (str): Sanitized user question.
+            ai_response (str): Assistant answer to store.
+
+        Returns:
+            dict: {"answer": ...} plus "summary_created" when a summary was written.
+        """
     # Save user message
     user_msg = ChatMessage(
         session_id=req.session_id,
@@ -316,11 +464,65 @@ Summarize this follow-up thread (up to 4 user questions and assistant responses)
 
         response_data["summary_created"] = True
 
+    refresh_digest(db, req.track_id)
     return response_data
 
 
+@router.post("/ask-followup")
+def ask_followup(req: FollowUpRequest, db: Session = Depends(get_db)):
+    """
+        Answer a follow-up question about a track's feedback.
+
+        Fetches the main track and optional reference track analysis from the database.
+        Retrieves the previous follow-up summary if available to provide context for the AI prompt.
+
+        Parameters:
+            req (FollowUpRequest): The follow-up request containing session, track, and follow-up group info.
+            db (Session): Database session for querying data.
+
+        Returns:
+            dict: {"answer": ...} plus "summary_created" when a group summary was written.
+        """
+    profile, user_question, prompt = _prepare_followup(db, req)
+
+    try:
+        ai_response = generate_feedback_response(prompt)
+        print("GPT response:", ai_response)
+    except Exception as e:
+        print("❌ GPT call failed:", e)
+        raise HTTPException(status_code=500, detail="AI follow-up failed")
+
+    return _save_followup(db, req, profile, user_question, ai_response)
+
+
+@router.post("/ask-followup/stream")
+async def ask_followup_stream(req: FollowUpRequest):
+    """
+        Streaming variant of `/chat/ask-followup` using Server-Sent Events.
+
+        Emits `data: {"delta": ...}` events while the answer is generated, then
+        stores the exchange exactly like `/chat/ask-followup` and emits a final
+        `done` event with the same payload that endpoint returns.
+
+        Parameters:
+            req (FollowUpRequest): The follow-up request.
+
+        Raises:
+            HTTPException: If the main track does not exist (404).
+
+        Returns:
+            StreamingResponse: `text/event-stream` of delta/done/error events.
+        """
+    profile, user_question, prompt = await run_in_threadpool(_with_db, _prepare_followup, req)
+
+    def persist(ai_response: str) -> dict:
+        return _with_db(_save_followup, req, profile, user_question, ai_response)
+
+    return sse_response(_stream_and_persist(prompt, persist))
+
+
 @router.get("/tracks/{track_id}/messages")
-def get_messages_for_track(track_id: str, db: Session = Depends(get_db)):
+async def get_messages_for_track(track_id: str, db: AsyncSession = Depends(get_async_db)):
     """
         Retrieve all chat messages associated with a specific track.
 
@@ -330,23 +532,22 @@ def get_messages_for_track(track_id: str, db: Session = Depends(get_db)):
 
         Parameters:
             track_id (str): The unique identifier of the track whose messages are to be retrieved.
-            db (Session): Database session for querying track and chat messages.
+            db (AsyncSession): Async database session for querying track and chat messages.
 
         Returns:
             list: A list of dictionaries, each containing details about a chat message (sender,
                   message content, feedback profile, track name).
             HTTPException: Raises a 404 error if the track is not found in the database.
         """
-    track = db.query(Track).filter_by(id=track_id).first()
+    track = await db.scalar(select(Track).filter_by(id=track_id))
     if not track:
         raise HTTPException(status_code=404, detail="Track not found")
 
-    messages = (
-        db.query(ChatMessage)
-        .filter(ChatMessage.track_id == track_id)
+    messages = (await db.scalars(
+        select(ChatMessage)
+        .where(ChatMessage.track_id == track_id)
         .order_by(ChatMessage.timestamp.asc())
-        .all()
-    )
+    )).all()
 
     print(f"DEBUG: Found {len(messages)} messages for track_id={track_id}")
     for msg in messages:
@@ -436,10 +637,19 @@ def compare_tracks(data: CompareTracksRequest, db: Session = Depends(get_db)):
         chat history, and generates a comparison of the tracks. The feedback is
         generated by AI and saved in the database as a new chat message.
 
+        Tracks are read from their precomputed comparison digests (analysis
+        numbers plus condensed feedback, see app.digests) with batched queries,
+        so the cost doesn't grow with the length of each track's chat history.
+        The prompt is kept under COMPARISON_PROMPT_TOKEN_BUDGET.
+
         Parameters:
             data (CompareTracksRequest): Contains the list of track IDs to compare.
             db (Session): Database session for querying track and chat data.
 
+        Raises:
+            HTTPException: 400 for fewer than two or more than COMPARISON_MAX_TRACKS
+                tracks, 404 if none of them has analysis data.
+
         Returns:
             dict: JSON response with AI-generated comparison feedback, comparison group ID,
                   and track names.
@@ -448,35 +658,15 @@ def compare_tracks(data: CompareTracksRequest, db: Session = Depends(get_db)):
 
     if not track_ids or len(track_ids) < 2:
         raise HTTPException(status_code=400, detail="At least two tracks must be selected.")
+    if len(track_ids) > COMPARISON_MAX_TRACKS:
+        raise HTTPException(
+            status_code=400, detail=f"At most {COMPARISON_MAX_TRACKS} tracks can be compared at once."
+        )
 
-    comparison_data = []
-    track_names = []
-
-    for track_id in track_ids:
-        track = db.query(Track).filter_by(id=track_id).first()
-        if not track or not track.analysis:
-            continue
-
-        messages = db.query(ChatMessage).filter_by(track_id=track_id).order_by(ChatMessage.timestamp.asc()).all()
-        chat_history = "\n".join(f"{m.sender}: {m.message}" for m in messages)
-
-        comparison_data.append({
-            "track_name": track.track_name,
-            "analysis_summary": f"""
-LUFS: {track.analysis.lufs}
-Width: {track.analysis.stereo_width}
-Key: {track.analysis.key}
-Peak: {track.analysis.peak_db}
-Issues: {track.analysis.issues or 'None'}
-Spectral balance: {track.analysis.spectral_balance_description or 'n/a'}
-""",
-            "chat_history": chat_history or "No chat history."
-        })
-
-        track_names.append(track.track_name)
-
+    comparison_data = load_digests(db, track_ids)
     if not comparison_data:
         raise HTTPException(status_code=404, detail="No analysis or chat data found.")
+    track_names = [entry["track_name"] for entry in comparison_data]
 
     # Get AI response using helper
     feedback = generate_comparison_feedback(comparison_data, max_tokens=500)
@@ -486,7 +676,7 @@ Spectral balance: {track.analysis.spectral_balance_description or 'n/a'}
     db.add(ChatMessage(
         sender="ai",
         message=feedback,
-        session_id=track.session_id if track else None,
+        session_id=comparison_data[-1]["session_id"],
         comparison_group_id=group_id,
         compared_track_ids=",".join(track_ids),
         compared_track_names=",".join(track_names)
@@ -501,7 +691,7 @@ Spectral balance: {track.analysis.spectral_balance_description or 'n/a'}
 
 
 @router.get("/comparisons")
-def get_comparison_history(db: Session = Depends(get_db)):
+async def get_comparison_history(db: AsyncSession = Depends(get_async_db)):
     """
         Retrieve the history of track comparisons stored in the database.
 
@@ -509,21 +699,25 @@ def get_comparison_history(db: Session = Depends(get_db)):
         returns the list of comparisons with their associated track names and IDs.
 
         Parameters:
-            db (Session): Database session for querying comparison data.
+            db (AsyncSession): Async database session for querying comparison data.
 
         Returns:
             JSONResponse: A list of comparison history, including group ID, track IDs,
                           and track names.
         """
-    results = db.query(ChatMessage.comparison_group_id)\
-        .filter(ChatMessage.comparison_group_id.isnot(None))\
-        .distinct().all()
+    results = (await db.execute(
+        select(ChatMessage.comparison_group_id)
+        .where(ChatMessage.comparison_group_id.isnot(None))
+        .distinct()
+    )).all()
 
     history = []
     for (group_id,) in results:
-        messages = db.query(ChatMessage)\
-            .filter(ChatMessage.comparison_group_id == group_id)\
-            .order_by(ChatMessage.timestamp.asc()).all()
+        messages = (await db.scalars(
+            select(ChatMessage)
+            .where(ChatMessage.comparison_group_id == group_id)
+            .order_by(ChatMessage.timestamp.asc())
+        )).all()
 
         if not messages:
             continue
@@ -537,7 +731,7 @@ def get_comparison_history(db: Session = Depends(get_db)):
         raw_ids = first_msg.compared_track_ids.split(",")
         track_ids = [tid.strip() for tid in raw_ids if tid.strip()]
 
-        tracks = db.query(Track).filter(Track.id.in_(track_ids)).all()
+        tracks = (await db.scalars(select(Track).where(Track.id.in_(track_ids)))).all()
         track_names = [t.track_name for t in tracks]
 
         history.append({
@@ -550,7 +744,7 @@ def get_comparison_history(db: Session = Depends(get_db)):
 
 
 @router.get("/comparisons/{group_id}")
-def get_comparison_by_group(group_id: str, db: Session = Depends(get_db)):
+async def get_comparison_by_group(group_id: str, db: AsyncSession = Depends(get_async_db)):
     """
         Retrieve a specific track comparison by its group ID.
 
@@ -559,14 +753,16 @@ def get_comparison_by_group(group_id: str, db: Session = Depends(get_db)):
 
         Parameters:
             group_id (str): The ID of the comparison group.
-            db (Session): Database session for querying comparison messages.
+            db (AsyncSession): Async database session for querying comparison messages.
 
         Returns:
             dict: JSON response containing feedback and track names for the specified group.
         """
-    messages = db.query(ChatMessage) \
-        .filter(ChatMessage.comparison_group_id == group_id) \
-        .order_by(ChatMessage.timestamp.asc()).all()
+    messages = (await db.scalars(
+        select(ChatMessage)
+        .where(ChatMessage.comparison_group_id == group_id)
+        .order_by(ChatMessage.timestamp.asc())
+    )).all()
 
     if not messages:
         return JSONResponse(content={"error": "No comparison found."}, status_code=404)
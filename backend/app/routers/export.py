@@ -22,7 +22,7 @@ Dependencies:
 """
 from fastapi import APIRouter, Query, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
-from app.database import SessionLocal
+from app.database import get_db
 from app.models import Track, ChatMessage
 from app.gpt_utils import generate_feedback_response
 from reportlab.lib.pagesizes import letter
@@ -38,21 +38,6 @@ import re
 
 router = APIRouter()
 
-def get_db():
-    """
-        Dependency function that provides a SQLAlchemy database session.
-
-        Yields:
-            Session: SQLAlchemy session object.
-        Ensures:
-            The session is properly closed after use.
-        """
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 def get_feedback_text(session_id: str, track_id: str, db: Session) -> str:
     def get_feedback_text(session_id: str, track_id: str, db: Session) -> str:
         """
@@ -163,7 +148,7 @@ Notes:
 
 Generate the content now:
 """
-    return generate_feedback_response(prompt)
+    return generate_feedback_response(prompt, cache=True)
 
 
 def draw_wrapped_text(p, text, x, y, max_width, line_height=14):
@@ -641,7 +626,7 @@ Rules:
 - DO NOT add commentary, explanation, or headings outside of the preset section.
 - ONLY output plain text in the format above, starting directly with 'Recommended Ableton Preset Parameters:'.
 """
-    return generate_feedback_response(prompt)
+    return generate_feedback_response(prompt, cache=True)
 
 
 @router.get("/export-comparison")
@@ -0,0 +1,41 @@
+"""
+Prometheus metrics endpoint for ZoundZcope.
+
+Endpoints:
+    GET /metrics
+        Metrics in the Prometheus text exposition format (aggregated across
+        workers when PROMETHEUS_MULTIPROC_DIR is set). Returns 503 if
+        prometheus_client isn't installed.
+
+Dependencies:
+    - app.metrics (metric definitions, runtime sampling and rendering).
+"""
+import asyncio
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse, Response
+
+from app.metrics import CONTENT_TYPE_LATEST, render_metrics, sample_runtime, sample_threadpool
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+        Expose all metrics for scraping.
+
+        Runtime gauges are refreshed first so this worker's values are current.
+        Sampling and rendering (which reads every worker's files in
+        multiprocess mode) run in a thread to keep the event loop free.
+
+        Returns:
+            Response: Prometheus text format, or 503 when metrics are unavailable.
+        """
+    sample_threadpool()
+    await asyncio.to_thread(sample_runtime)
+    try:
+        payload = await asyncio.to_thread(render_metrics)
+    except RuntimeError as e:
+        return PlainTextResponse(str(e), status_code=503)
+    return Response(payload, media_type=CONTENT_TYPE_LATEST)
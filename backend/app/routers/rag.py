@@ -6,8 +6,25 @@ generation (RAG) over two corpora:
 - Documentation corpus (/rag_docs)
 - Tutorial/implementation corpus (/rag_tut)
 
-It builds prompts from retrieved chunks, optionally summarizes long chat
-history, calls the LLM, and tracks token usage.
+It builds prompts from retrieved chunks and the conversation so far, calls
+the LLM, and tracks token usage.
+
+Conversations:
+    Chat state is kept server-side (app.rag_conversations): a request sends
+    `conversation_id` from the previous answer, and the prompt gets the
+    stored rolling summary plus the pairs not yet summarized. Every answer
+    returns the id; summarization runs in the background after the answer.
+    Requests without an id start a conversation seeded from `history`.
+
+Concurrency:
+    Nothing blocking runs on the event loop. Index loading, query embedding
+    and FAISS search run on a dedicated "rag-cpu" thread pool
+    (RAG_CPU_WORKERS), so they neither stall other requests nor take
+    threads from the shared FastAPI threadpool. LLM calls (answers and
+    history summaries) await the gateway. Each corpus admits at most
+    RAG_MAX_CONCURRENCY questions at a time (streaming and non-streaming
+    together); a question that waits longer than RAG_QUEUE_TIMEOUT_SECONDS
+    for a slot gets 503 with Retry-After.
 
 Endpoints:
     POST /rag_docs
@@ -19,29 +36,70 @@ Endpoints:
         concepts, usage, and code paths, with the same behavior for code
         extraction and full-function returns.
 
+    POST /rag_docs/stream, POST /rag_tut/stream
+        Same as above, streamed as Server-Sent Events (delta/done/error).
+
+Loading:
+    `warm_up()` runs from the app lifespan: both FAISS indexes are
+    memory-mapped, metadata is loaded and the embedding model is loaded and
+    exercised once. `is_ready()` backs GET /readyz. Endpoints still call
+    `_ensure_indices()` so a request that beats the warm-up loads them itself,
+    and to pick up rebuilt indexes: when an index or metadata file changed on
+    disk since it was loaded, both corpora are reloaded and cached retrieval
+    results are dropped.
+
+Retrieval:
+    Hybrid: the RAG_CANDIDATES nearest chunks by embedding and the
+    RAG_CANDIDATES best BM25 matches (rag.lexical_index, built next to each
+    FAISS index) are merged by reciprocal-rank fusion, and the top RAG_TOP_K
+    go into the prompt. BM25 catches exact identifiers (function and constant
+    names) that the embedding model blurs. A corpus without a lexical index
+    file gets one built from its metadata at load.
+
+Caching:
+    Query embeddings and retrieved chunk ids are kept in the LRU caches of
+    app.rag_cache, so a repeated question skips the embedding model and the
+    FAISS search.
+
 Dependencies:
-    - FAISS utils: load_faiss_index, load_metadata, embed_query, search_index
-    - Token counting/tracking: count_tokens, add_token_usage
-    - OpenAI Chat Completions API (model: gpt-4o-mini)
+    - FAISS utils: load_faiss_index, load_metadata, embed_query
+    - BM25 index and rank fusion: rag.lexical_index
+    - Retrieval caches: app.rag_cache (cached_embed_query, cached_search)
+    - Token tracking: record_usage (provider usage; local counting off the request path)
+    - OpenAI Chat Completions API via app.llm_gateway (model: OPENAI_MODEL)
     - FastAPI for routing and request models
+
+Configuration:
+    RAG_ENABLED               : "false" makes the endpoints return 503 (default true).
+    RAG_CPU_WORKERS           : Threads for embedding/search (default 2).
+    RAG_MAX_CONCURRENCY       : Questions in progress per corpus (default 4).
+    RAG_QUEUE_TIMEOUT_SECONDS : Longest wait for a slot before 503 (default 10).
+    RAG_TOP_K                 : Chunks put into a prompt (default 4).
+    RAG_CANDIDATES            : Candidates per retriever before fusion (default 20).
+    RAG_HYBRID_SEARCH         : "false" uses embedding search only (default true).
 """
 
 from rag.rag_utils import (
+    get_embedding_model,
     load_faiss_index,
     load_metadata,
     embed_query,
-    search_index,
 )
+from rag.lexical_index import LexicalIndex, lexical_path, reciprocal_rank_fusion
 
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 
-from app.utils import count_tokens
-from app.token_tracker import add_token_usage
+from app import rag_cache, rag_conversations
+from app.token_tracker import record_usage
 
-import os, re, logging
-from httpx import Timeout
-from openai import OpenAI
+import asyncio, os, re, logging, threading, time
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+from app.llm_gateway import llm, OPENAI_API_KEY, OPENAI_MODEL
+from app.sse import format_sse, sse_response
 
 # Logging
 logger = logging.getLogger(__name__)
@@ -52,20 +110,12 @@ print("Current working directory:", os.getcwd())
 router = APIRouter()
 
 
-# ----- OpenAI client (with timeouts + optional base_url/model from env) -----
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")  # optional (e.g. school proxy)
-OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+# ----- LLM access goes through the shared gateway (OPENAI_BASE_URL/OPENAI_MODEL honored there) -----
+RAG_LLM_DEADLINE = 20.0  # seconds, including queueing and retries
 
 if not OPENAI_API_KEY:
     logger.error("OPENAI_API_KEY is not set! RAG endpoints will return an error.")
 
-client = OpenAI(
-    api_key=OPENAI_API_KEY,
-    base_url=OPENAI_BASE_URL if OPENAI_BASE_URL else None,
-    timeout=Timeout(20.0, connect=5.0)  # 5s connect, 20s total
-)
-
 
 
 
@@ -78,28 +128,146 @@ RAG_DOCS_METADATA_PATH = os.path.join(BASE_DIR, "rag", "rag_docs", "combined_met
 RAG_TUT_INDEX_PATH = os.path.join(BASE_DIR, "rag", "rag_tut", "rag_tut_faiss.index")
 RAG_TUT_METADATA_PATH = os.path.join(BASE_DIR, "rag", "rag_tut", "rag_tut_metadata.json")
 
+RAG_DOCS_LEXICAL_PATH = lexical_path(RAG_DOCS_METADATA_PATH)
+RAG_TUT_LEXICAL_PATH = lexical_path(RAG_TUT_METADATA_PATH)
+
 
 RAG_ENABLED = os.getenv("RAG_ENABLED", "true").lower() == "true"
+RAG_CPU_WORKERS = int(os.getenv("RAG_CPU_WORKERS", "2"))
+RAG_MAX_CONCURRENCY = int(os.getenv("RAG_MAX_CONCURRENCY", "4"))
+RAG_QUEUE_TIMEOUT_SECONDS = float(os.getenv("RAG_QUEUE_TIMEOUT_SECONDS", "10"))
+RAG_TOP_K = int(os.getenv("RAG_TOP_K", "4"))
+RAG_CANDIDATES = int(os.getenv("RAG_CANDIDATES", "20"))
+RAG_HYBRID_SEARCH = os.getenv("RAG_HYBRID_SEARCH", "true").lower() == "true"
+
+DOCS_CONTEXT_NOTE = "The assistant is helping the user understand code from documentation."
+TUT_CONTEXT_NOTE = "The assistant is helping the user understand the implementation and logic of an AI-based audio assistant project."
 
-docs_index = docs_metadata = tut_index = tut_metadata = None
+# Embedding and FAISS search; kept apart from the default threadpool used by sync endpoints
+_rag_pool = ThreadPoolExecutor(max_workers=RAG_CPU_WORKERS, thread_name_prefix="rag-cpu")
+_corpus_slots = {"docs": asyncio.Semaphore(RAG_MAX_CONCURRENCY), "tut": asyncio.Semaphore(RAG_MAX_CONCURRENCY)}
+
+docs_index = docs_metadata = docs_lexical = tut_index = tut_metadata = tut_lexical = None
 _indices_loaded = False
+_indices_version = None
+_model_warm = False
+_load_lock = threading.Lock()
+
+def _files_version():
+    """Modification times of the index, metadata and lexical files (None for a missing file)."""
+    paths = (RAG_DOCS_INDEX_PATH, RAG_DOCS_METADATA_PATH, RAG_DOCS_LEXICAL_PATH,
+             RAG_TUT_INDEX_PATH, RAG_TUT_METADATA_PATH, RAG_TUT_LEXICAL_PATH)
+    return tuple(os.stat(p).st_mtime_ns if os.path.exists(p) else None for p in paths)
+
+
+def _load_lexical(lexical_file, metadata_file, metadata):
+    """
+        Load a corpus' BM25 index, or build it from the metadata.
+
+        Builds in memory when the file is missing or was built from other
+        metadata (e.g. after a rebuild with indexing.py), so ids always match
+        `metadata`.
+        """
+    if os.path.exists(lexical_file):
+        lexical = LexicalIndex.load(lexical_file)
+        if lexical.is_current_for(metadata_file):
+            return lexical
+    logger.warning(f"No current lexical index at {lexical_file}; building it from {metadata_file}")
+    return LexicalIndex.from_metadata(metadata)
+
 
 def _ensure_indices():
-    global _indices_loaded, docs_index, docs_metadata, tut_index, tut_metadata
-    if _indices_loaded:
+    """
+        Load both FAISS indexes (memory-mapped), their metadata and BM25 indexes.
+
+        Called by `warm_up()` at startup and, as a fallback, by every RAG
+        endpoint before it searches. Once loaded, a call only compares file
+        modification times; after a rebuild the indexes are reloaded and the
+        retrieval cache is invalidated. Thread-safe.
+        """
+    global _indices_loaded, _indices_version, docs_index, docs_metadata, docs_lexical, \
+        tut_index, tut_metadata, tut_lexical
+    version = _files_version()
+    if _indices_loaded and version == _indices_version:
         return
-    # (existing paths here)
-    # Load lazily so we don’t allocate RAM at import time
-    docs_index = load_faiss_index(RAG_DOCS_INDEX_PATH)
-    docs_metadata = load_metadata(RAG_DOCS_METADATA_PATH)
-    tut_index = load_faiss_index(RAG_TUT_INDEX_PATH)
-    tut_metadata = load_metadata(RAG_TUT_METADATA_PATH)
-    _indices_loaded = True
+    with _load_lock:
+        version = _files_version()
+        if _indices_loaded and version == _indices_version:
+            return
+        reload = _indices_loaded
+        # Load lazily so we don’t allocate RAM at import time
+        docs_index = load_faiss_index(RAG_DOCS_INDEX_PATH, mmap=True)
+        docs_metadata = load_metadata(RAG_DOCS_METADATA_PATH)
+        docs_lexical = _load_lexical(RAG_DOCS_LEXICAL_PATH, RAG_DOCS_METADATA_PATH, docs_metadata)
+        tut_index = load_faiss_index(RAG_TUT_INDEX_PATH, mmap=True)
+        tut_metadata = load_metadata(RAG_TUT_METADATA_PATH)
+        tut_lexical = _load_lexical(RAG_TUT_LEXICAL_PATH, RAG_TUT_METADATA_PATH, tut_metadata)
+        rag_cache.invalidate_retrievals()
+        _indices_version = version
+        _indices_loaded = True
+        if reload:
+            logger.info(f"RAG indexes changed on disk; reloaded ({docs_index.ntotal} docs / "
+                        f"{tut_index.ntotal} tutorial vectors), retrieval cache cleared")
+
+
+def warm_up():
+    """
+        Load the indexes and the embedding model ahead of the first request.
+
+        Run from the app lifespan in a worker thread. Encoding one query
+        forces the model download/load and the first forward pass, so neither
+        lands on a user request. `is_ready()` turns true once this finishes.
+        """
+    global _model_warm
+    started = time.perf_counter()
+    _ensure_indices()
+    get_embedding_model()
+    embed_query("warm-up")
+    _model_warm = True
+    logger.info(f"RAG warm-up finished in {time.perf_counter() - started:.1f}s "
+                f"({docs_index.ntotal} docs / {tut_index.ntotal} tutorial vectors)")
+
+
+def is_ready() -> bool:
+    """True once indexes, metadata and the embedding model are loaded."""
+    return _indices_loaded and _model_warm
+
 
-print(f"Loading FAISS docs index from: {RAG_DOCS_INDEX_PATH}")
+async def run_rag_cpu(fn, *args, **kwargs):
+    """Run blocking retrieval work (model inference, FAISS) on the RAG thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_rag_pool, partial(fn, *args, **kwargs))
+
+
+def rag_pool_queue_depth() -> int:
+    """Retrieval jobs waiting for a rag-cpu thread."""
+    return _rag_pool._work_queue.qsize()
+
+
+async def _acquire_slot(corpus: str):
+    """
+        Wait for one of the corpus' RAG_MAX_CONCURRENCY slots.
+
+        Raises:
+            HTTPException: 503 with Retry-After if no slot frees up within
+                RAG_QUEUE_TIMEOUT_SECONDS.
+        """
+    try:
+        await asyncio.wait_for(_corpus_slots[corpus].acquire(), RAG_QUEUE_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        logger.warning(f"RAG {corpus} assistant busy; rejected a question after {RAG_QUEUE_TIMEOUT_SECONDS}s")
+        raise HTTPException(status_code=503, detail="RAG assistant busy, please retry shortly",
+                            headers={"Retry-After": "5"})
 
 
-print(f"Loading FAISS index from: {RAG_DOCS_INDEX_PATH}")
+@asynccontextmanager
+async def _corpus_slot(corpus: str):
+    """Hold a concurrency slot of `corpus` for the duration of the block."""
+    await _acquire_slot(corpus)
+    try:
+        yield
+    finally:
+        _corpus_slots[corpus].release()
 
 
 
@@ -109,11 +277,14 @@ class Question(BaseModel):
 
         Attributes:
             question (str): The user's natural-language question.
-            history (list[dict]): Optional list of previous Q&A items where each
-                item has 'question' and 'answer' keys. May also include a rolling
-                summary with 'question' == "__summary__".
+            conversation_id (str, optional): Id returned with the previous
+                answer; the server supplies the conversation history.
+            history (list[dict]): Only read when starting a conversation (no or
+                unknown id): previous Q&A items with 'question' and 'answer'
+                keys, optionally led by a summary item ('question' == "__summary__").
         """
     question: str
+    conversation_id: Optional[str] = None
     history: list[dict] = []
 
 
@@ -225,7 +396,7 @@ def build_prompt_tut(query, retrieved_chunks, history):
 
 
 
-def generate_answer(prompt: str):
+async def generate_answer(prompt: str):
     """
     Generate an answer from the LLM and track token usage, with robust error handling.
     Returns a string. On error, returns a user-facing "Error: ..." string.
@@ -234,14 +405,15 @@ def generate_answer(prompt: str):
         return "Error: OPENAI_API_KEY is not set on the server."
 
     try:
-        resp = client.chat.completions.create(
-            model=OPENAI_MODEL,
-            messages=[
+        resp = await llm.acomplete(
+            [
                 {"role": "system", "content": "You explain code and implementation clearly."},
                 {"role": "user", "content": prompt}
             ],
+            model=OPENAI_MODEL,
             max_tokens=500,
             temperature=0.3,
+            deadline=RAG_LLM_DEADLINE,
         )
     except Exception as e:
         # Anything from auth errors to timeouts ends up here
@@ -256,18 +428,11 @@ def generate_answer(prompt: str):
 
     # token accounting (best-effort; don’t crash UI if missing)
     try:
-        from app.utils import count_tokens
-        prompt_tokens = count_tokens(prompt)
-        response_tokens = count_tokens(response_text)
-        total = prompt_tokens + response_tokens
-        logger.info(f"RAG tokens — prompt:{prompt_tokens} resp:{response_tokens} total:{total}")
-
-        # provider usage (if present)
         usage = getattr(resp, "usage", None)
-        if usage and getattr(usage, "prompt_tokens", None) is not None:
-            total_reported = usage.prompt_tokens + usage.completion_tokens
-            from app.token_tracker import add_token_usage
-            add_token_usage(total_reported, model_name=OPENAI_MODEL)
+        if usage is not None:
+            logger.info(f"RAG tokens — prompt:{usage.prompt_tokens} resp:{usage.completion_tokens}")
+        if not getattr(resp, "coalesced", False):
+            record_usage(usage, model_name=OPENAI_MODEL, prompt=prompt, completion=response_text)
     except Exception:
         # Don’t let metrics kill the response
         logger.debug("Token accounting failed; continuing.")
@@ -322,38 +487,121 @@ def generate_answer(prompt: str):
     return response.choices[0].message.content
 '''
 
-def search_and_answer(index, metadata, question, history, build_prompt_fn, context_note=""):
+async def search_and_answer(index, metadata, question, history, build_prompt_fn, lexical=None):
     """
         Retrieve relevant chunks, build a prompt, and generate an answer.
 
-        Applies rolling summarization when the history grows, embeds the
-        query, searches the FAISS index, constructs a prompt from the
-        retrieved chunks and history, and calls the LLM.
+        Embeds the query, searches the FAISS (and BM25) index, constructs a
+        prompt from the retrieved chunks and history, and calls the LLM.
 
         Args:
             index: The FAISS index to search.
-            metadata (list[dict]): Metadata aligned with the index entries.
+            metadata (dict[int, dict]): Chunk metadata keyed by FAISS id.
             question (str): The user's question.
-            history (list[dict]): Conversation history and optional summary.
+            history (list[dict]): Conversation summary and recent pairs
+                (from `rag_conversations.open_conversation`).
             build_prompt_fn (Callable): Function that constructs the LLM prompt
                 (e.g., `build_prompt_docs` or `build_prompt_tut`).
-            context_note (str): Additional context passed to summarization.
+            lexical (LexicalIndex, optional): The corpus' BM25 index.
 
         Returns:
             str: The generated answer text.
         """
-    # Auto-summarize if too many QA pairs
-    if len(history) >= 4:
-        history = summarize_history(history, context_note)
-
-    query_emb = embed_query(question)
-    indices, _ = search_index(index, query_emb, top_k=5)
-    retrieved = [metadata[i] for i in indices]
-    prompt = build_prompt_fn(question, retrieved, history)
-    answer = generate_answer(prompt)
+    prompt = await build_rag_prompt(index, metadata, question, history, build_prompt_fn, lexical)
+    answer = await generate_answer(prompt)
     return answer
 
 
+def retrieve_chunks(index, metadata, question, top_k=None, lexical=None):
+    """
+        Return the metadata of the chunks most relevant to the question.
+
+        Takes RAG_CANDIDATES nearest chunks by embedding and, with a lexical
+        index, RAG_CANDIDATES best BM25 matches, fuses both rankings (RRF) and
+        keeps the top `top_k`. Without one (or with RAG_HYBRID_SEARCH off) it
+        is plain embedding search. Blocking (model inference and FAISS
+        search); run it through `run_rag_cpu`. Embedding and FAISS search go
+        through the app.rag_cache LRU caches.
+
+        Args:
+            index: The FAISS index to search.
+            metadata (dict[int, dict]): Chunk metadata keyed by FAISS id.
+            question (str): The user's question.
+            top_k (int, optional): Number of chunks to return (default RAG_TOP_K).
+            lexical (LexicalIndex, optional): BM25 index over the same chunks.
+
+        Returns:
+            list[dict]: Retrieved chunk metadata, most relevant first.
+        """
+    top_k = top_k or RAG_TOP_K
+    query_emb = rag_cache.cached_embed_query(question)
+    if lexical is None or not RAG_HYBRID_SEARCH:
+        indices = rag_cache.cached_search(index, query_emb, top_k=top_k)
+    else:
+        candidates = max(RAG_CANDIDATES, top_k)
+        indices = reciprocal_rank_fusion(
+            [rag_cache.cached_search(index, query_emb, top_k=candidates), lexical.search(question, candidates)],
+            top_k,
+        )
+    return [metadata[i] for i in indices if i in metadata]
+
+
+async def build_rag_prompt(index, metadata, question, history, build_prompt_fn, lexical=None):
+    """
+        Retrieve chunks and build the LLM prompt.
+
+        Args:
+            index: The FAISS index to search.
+            metadata (dict[int, dict]): Chunk metadata keyed by FAISS id.
+            question (str): The user's question.
+            history (list[dict]): Conversation summary and recent pairs.
+            build_prompt_fn (Callable): Prompt builder for the corpus.
+            lexical (LexicalIndex, optional): The corpus' BM25 index.
+
+        Returns:
+            str: The prompt to send to the LLM.
+        """
+    retrieved = await run_rag_cpu(retrieve_chunks, index, metadata, question, lexical=lexical)
+    return build_prompt_fn(question, retrieved, history)
+
+
+async def _stream_answer(prompt: str, conversation_id: str, question: str, context_note: str):
+    """
+        Stream a RAG answer as SSE delta events followed by `done` (or `error`).
+
+        The finished answer is stored in the conversation before `done`, which
+        carries the answer and the conversation id.
+        """
+    if not OPENAI_API_KEY:
+        yield format_sse({"detail": "OPENAI_API_KEY is not set on the server."}, event="error")
+        return
+
+    chunks = []
+    usage = {}
+    try:
+        async for delta in llm.astream(
+            [
+                {"role": "system", "content": "You explain code and implementation clearly."},
+                {"role": "user", "content": prompt}
+            ],
+            model=OPENAI_MODEL,
+            max_tokens=500,
+            temperature=0.3,
+            usage=usage,
+        ):
+            chunks.append(delta)
+            yield format_sse({"delta": delta})
+    except Exception as e:
+        logger.exception("OpenAI chat error (RAG stream)")
+        yield format_sse({"detail": f"OPENAI_API_ERROR: {e.__class__.__name__}"}, event="error")
+        return
+
+    answer = "".join(chunks)
+    record_usage(usage, model_name=OPENAI_MODEL, prompt=prompt, completion=answer)
+    await rag_conversations.record_answer(conversation_id, question, answer, context_note)
+    yield format_sse({"answer": answer, "conversation_id": conversation_id}, event="done")
+
+
 @router.post("/rag_docs")
 async def rag_docs(question: Question):
     """
@@ -363,14 +611,16 @@ async def rag_docs(question: Question):
         a prompt from the docs and history, and returns the generated answer.
 
         Args:
-            question (Question): Request body with 'question' text and optional
-                'history' of previous Q&A pairs.
+            question (Question): Request body with 'question' text and the
+                'conversation_id' of an ongoing conversation (or 'history').
 
         Returns:
-            dict: A JSON object with the generated 'answer'.
+            dict: The generated 'answer' and the 'conversation_id' to send
+                with the next question.
 
         Raises:
-            HTTPException: If 'question' is empty or whitespace.
+            HTTPException: If 'question' is empty or whitespace (400), or RAG
+                is disabled or busy (503).
         """
 
     if not RAG_ENABLED:
@@ -378,15 +628,22 @@ async def rag_docs(question: Question):
 
     if not question.question.strip():
         raise HTTPException(status_code=400, detail="Question cannot be empty")
-    answer = search_and_answer(
-        docs_index,
-        docs_metadata,
-        question.question,
-        question.history,
-        build_prompt_docs,
-        context_note="The assistant is helping the user understand code from documentation."
-    )
-    return {"answer": answer}
+    async with _corpus_slot("docs"):
+        # Only a file-time check once the lifespan warm-up has run
+        await run_rag_cpu(_ensure_indices)
+        conversation_id, history = await rag_conversations.open_conversation(
+            question.conversation_id, "docs", question.history
+        )
+        answer = await search_and_answer(
+            docs_index,
+            docs_metadata,
+            question.question,
+            history,
+            build_prompt_docs,
+            docs_lexical,
+        )
+    await rag_conversations.record_answer(conversation_id, question.question, answer, DOCS_CONTEXT_NOTE)
+    return {"answer": answer, "conversation_id": conversation_id}
 
 
 @router.post("/rag_tut")
@@ -399,14 +656,16 @@ async def rag_tut(question: Question):
         generated answer.
 
         Args:
-            question (Question): Request body with 'question' text and optional
-                'history' of previous Q&A pairs.
+            question (Question): Request body with 'question' text and the
+                'conversation_id' of an ongoing conversation (or 'history').
 
         Returns:
-            dict: A JSON object with the generated 'answer'.
+            dict: The generated 'answer' and the 'conversation_id' to send
+                with the next question.
 
         Raises:
-            HTTPException: If 'question' is empty or whitespace.
+            HTTPException: If 'question' is empty or whitespace (400), or RAG
+                is disabled or busy (503).
         """
 
     if not RAG_ENABLED:
@@ -414,105 +673,109 @@ async def rag_tut(question: Question):
 
     if not question.question.strip():
         raise HTTPException(status_code=400, detail="Question cannot be empty")
-    answer = search_and_answer(
-        tut_index,
-        tut_metadata,
-        question.question,
-        question.history,
-        build_prompt_tut,
-        context_note="The assistant is helping the user understand the implementation and logic of an AI-based audio assistant project."
-    )
-    return {"answer": answer}
-
-
+    async with _corpus_slot("tut"):
+        # Only a file-time check once the lifespan warm-up has run
+        await run_rag_cpu(_ensure_indices)
+        conversation_id, history = await rag_conversations.open_conversation(
+            question.conversation_id, "tut", question.history
+        )
+        answer = await search_and_answer(
+            tut_index,
+            tut_metadata,
+            question.question,
+            history,
+            build_prompt_tut,
+            tut_lexical,
+        )
+    await rag_conversations.record_answer(conversation_id, question.question, answer, TUT_CONTEXT_NOTE)
+    return {"answer": answer, "conversation_id": conversation_id}
 
-_last_summary_length = 0  # Tracks how many Q&A pairs existed at last summary
 
-def summarize_history(history, context_note=""):
+@router.post("/rag_docs/stream")
+async def rag_docs_stream(question: Question):
     """
-        Summarize recent conversation history to keep context compact.
+        Streaming (SSE) variant of `/rag_docs`.
 
-        Produces a rolling summary with the LLM if at least four new Q&A
-        pairs have been added since the last summary. The updated history
-        starts with a summary item (where 'question' == "__summary__")
-        followed by the remaining unsummarized Q&A items.
+        Retrieval runs on the RAG thread pool; the answer is forwarded
+        token by token and finished with a `done` event carrying the full
+        answer. The corpus slot is held until the stream ends.
 
         Args:
-            history (list[dict]): The full conversation history. Summary items
-                are marked with 'question' == "__summary__".
-            context_note (str): Optional note to guide the summarization style
-                or focus (e.g., docs vs. tutorial context).
+            question (Question): Request body with 'question' and 'conversation_id' (or 'history').
 
         Returns:
-            list[dict]: The updated history with a new summary when triggered.
-        """
-    global _last_summary_length
-
-
-
-    # Count how many Q&A pairs since the last summary
-    non_summary_history = [p for p in history if p["question"] != "__summary__"]
-
-    if len(non_summary_history) - _last_summary_length < 4:
-        print("⏩ Not enough new Q&As for summarization")
-        return history
+            StreamingResponse: `text/event-stream` of delta/done/error events.
 
-    print("🧠 Rolling summarization triggered...")
+        Raises:
+            HTTPException: If RAG is disabled or busy (503) or 'question' is empty (400).
+        """
+    if not RAG_ENABLED:
+        raise HTTPException(status_code=503, detail="RAG temporarily disabled")
 
-    # Build the prompt: include latest summary (if any) + next 4 Q&As
-    summary_prompt = (
-        f"You're an assistant summarizing a technical chat session.\n"
-        f"{context_note}\n"
-        "Summarize the following conversation concisely while preserving all relevant technical details:\n\n"
+    if not question.question.strip():
+        raise HTTPException(status_code=400, detail="Question cannot be empty")
+    # The slot is released by the response once it is done (see `sse_response`)
+    await _acquire_slot("docs")
+    try:
+        await run_rag_cpu(_ensure_indices)
+        conversation_id, history = await rag_conversations.open_conversation(
+            question.conversation_id, "docs", question.history
+        )
+        prompt = await build_rag_prompt(
+            docs_index,
+            docs_metadata,
+            question.question,
+            history,
+            build_prompt_docs,
+            docs_lexical,
+        )
+    except BaseException:
+        _corpus_slots["docs"].release()
+        raise
+    return sse_response(
+        _stream_answer(prompt, conversation_id, question.question, DOCS_CONTEXT_NOTE),
+        on_close=_corpus_slots["docs"].release,
     )
 
-    # Find last summary (if any)
-    last_summary = next((p for p in history if p["question"] == "__summary__"), None)
-    if last_summary:
-        summary_prompt += f"Previous Summary:\n{last_summary['answer']}\n\n"
-
-    # Get the next 4 Q&A pairs after the last summary
-    new_pairs = non_summary_history[_last_summary_length:_last_summary_length + 4]
-    for pair in new_pairs:
-        summary_prompt += f"User: {pair['question']}\nAI: {pair['answer']}\n\n"
-
-        # Call LLM to generate summary (robust)
-        if not OPENAI_API_KEY:
-            # Skip summarization gracefully if key missing
-            return history
-
-        try:
-            response = client.chat.completions.create(
-                model=OPENAI_MODEL,
-                messages=[
-                    {"role": "system", "content": "You are summarizing a technical Q&A exchange."},
-                    {"role": "user", "content": summary_prompt}
-                ],
-                max_tokens=300,
-                temperature=0.3,
-            )
-            summary = response.choices[0].message.content
-        except Exception as e:
-            logger.exception("OpenAI chat error (RAG summarize_history)")
-            # Don’t break the chat if summarization fails
-            return history
-
-    # Add this after response
-    prompt_tokens = response.usage.prompt_tokens
-    completion_tokens = response.usage.completion_tokens
-    total_tokens = prompt_tokens + completion_tokens
-    add_token_usage(total_tokens, model_name="gpt-4o-mini")
-
 
+@router.post("/rag_tut/stream")
+async def rag_tut_stream(question: Question):
+    """
+        Streaming (SSE) variant of `/rag_tut`.
 
-    summary = response.choices[0].message.content
-    print("✅ Summary generated:\n", summary)
+        Args:
+            question (Question): Request body with 'question' and 'conversation_id' (or 'history').
 
-    # Update state: we’ve now summarized up to this point
-    _last_summary_length += 4
+        Returns:
+            StreamingResponse: `text/event-stream` of delta/done/error events.
 
-    # New history starts with the new summary + rest of Q&As
-    new_history = [{"question": "__summary__", "answer": summary}]
-    new_history += non_summary_history[_last_summary_length:]
+        Raises:
+            HTTPException: If RAG is disabled or busy (503) or 'question' is empty (400).
+        """
+    if not RAG_ENABLED:
+        raise HTTPException(status_code=503, detail="RAG temporarily disabled")
 
-    return new_history
+    if not question.question.strip():
+        raise HTTPException(status_code=400, detail="Question cannot be empty")
+    # The slot is released by the response once it is done (see `sse_response`)
+    await _acquire_slot("tut")
+    try:
+        await run_rag_cpu(_ensure_indices)
+        conversation_id, history = await rag_conversations.open_conversation(
+            question.conversation_id, "tut", question.history
+        )
+        prompt = await build_rag_prompt(
+            tut_index,
+            tut_metadata,
+            question.question,
+            history,
+            build_prompt_tut,
+            tut_lexical,
+        )
+    except BaseException:
+        _corpus_slots["tut"].release()
+        raise
+    return sse_response(
+        _stream_answer(prompt, conversation_id, question.question, TUT_CONTEXT_NOTE),
+        on_close=_corpus_slots["tut"].release,
+    )
@@ -17,12 +17,16 @@ Endpoints:
     POST   /sessions/create    - Create a new session via form submission.
 
 Dependencies:
-    - SQLAlchemy SessionLocal for database access.
+    - Shared `get_db` / `get_async_db` dependencies from app.database.
+      Read-only endpoints are `async def` and use the async session.
     - Models: UserSession, Track, ChatMessage, AnalysisResult.
 """
 from fastapi import APIRouter, Body, Depends, HTTPException, Form
-from sqlalchemy.orm import Session, joinedload
-from app.database import SessionLocal
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload, selectinload
+from app.database import get_db, get_async_db
+from app.deletion import delete_session as delete_session_rows, enqueue_artifact_removal
 from app.models import ChatMessage, Session as UserSession, Track
 from app.models import Track, AnalysisResult
 from fastapi import Query
@@ -31,20 +35,6 @@ import uuid
 
 router = APIRouter(prefix="/sessions", redirect_slashes=False)
 
-
-def get_db():
-    """
-        Provide a SQLAlchemy database session for dependency injection.
-
-        Yields:
-            Session: Active SQLAlchemy session for database operations.
-        """
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.post("/")
 def create_or_get_session(
     session_name: str = Body(...),
@@ -77,28 +67,28 @@ def create_or_get_session(
 
 # GET /sessions → list all sessions
 @router.get("/")
-def list_sessions(db: Session = Depends(get_db)):
+async def list_sessions(db: AsyncSession = Depends(get_async_db)):
     """
         List all available sessions.
 
         Args:
-            db (Session): Database session dependency.
+            db (AsyncSession): Async database session dependency.
 
         Returns:
             list[dict]: List of sessions with their IDs and names.
         """
-    sessions = db.query(UserSession).all()
+    sessions = (await db.scalars(select(UserSession))).all()
     return [{"id": s.id, "session_name": s.session_name} for s in sessions]
 
 
 @router.get("/{id}")
-def get_session(id: str, db: Session = Depends(get_db)):
+async def get_session(id: str, db: AsyncSession = Depends(get_async_db)):
     """
         Retrieve a specific session by ID.
 
         Args:
             id (str): The UUID of the session.
-            db (Session): Database session dependency.
+            db (AsyncSession): Async database session dependency.
 
         Raises:
             HTTPException: If the session does not exist.
@@ -106,7 +96,7 @@ def get_session(id: str, db: Session = Depends(get_db)):
         Returns:
             UserSession: The matching session object.
         """
-    session = db.query(UserSession).filter(UserSession.id == id).first()
+    session = await db.scalar(select(UserSession).where(UserSession.id == id))
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     return session
@@ -114,13 +104,13 @@ def get_session(id: str, db: Session = Depends(get_db)):
 
 # GET /sessions/{id}/tracks — list all tracks in a session
 @router.get("/{id}/tracks")
-def get_tracks_for_session(
+async def get_tracks_for_session(
     id: str,
     type: str = Query(default=None, description="Filter by track type"),
     track_name: str = Query(default=None, description="Filter by partial name match"),
     sort_by: str = Query(default="uploaded_at", enum=["uploaded_at", "track_name"]),
     sort_order: str = Query(default="desc", enum=["asc", "desc"]),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
         Retrieve all tracks for a specific session, with optional filtering and sorting.
@@ -131,7 +121,7 @@ def get_tracks_for_session(
             track_name (str, optional): Filter tracks by partial name match.
             sort_by (str): Sorting field ('uploaded_at' or 'track_name').
             sort_order (str): Sort order ('asc' or 'desc').
-            db (Session): Database session dependency.
+            db (AsyncSession): Async database session dependency.
 
         Raises:
             HTTPException: If the session does not exist.
@@ -142,37 +132,37 @@ def get_tracks_for_session(
         """
     try:
         print(f"🟡 Looking up session ID: {id}")
-        session = db.query(UserSession).filter(UserSession.id == id).first()
+        session = await db.scalar(select(UserSession).where(UserSession.id == id))
         if not session:
             print("⚠️ No session found for that ID.")
             raise HTTPException(status_code=404, detail="Session not found")
 
 
         # ✅ FIX: Use correct ID for feedback query
-        feedback_lookup = {
-            msg.track_id: msg.message
-            for msg in db.query(ChatMessage)
-            .filter(ChatMessage.session_id == id, ChatMessage.sender == "assistant", ChatMessage.track_id != None)
+        feedback_msgs = await db.scalars(
+            select(ChatMessage)
+            .where(ChatMessage.session_id == id, ChatMessage.sender == "assistant", ChatMessage.track_id != None)
             .order_by(ChatMessage.timestamp.desc())
-            .all()
-        }
+        )
+        feedback_lookup = {msg.track_id: msg.message for msg in feedback_msgs}
 
-        query = db.query(Track).filter(Track.session_id == id)
+        # Analysis is eager-loaded: lazy loads are not allowed on an AsyncSession
+        query = select(Track).options(selectinload(Track.analysis)).where(Track.session_id == id)
 
         # Exclude reference tracks by name
-        query = query.filter(~Track.track_name.ilike('%(Reference)%'))
+        query = query.where(~Track.track_name.ilike('%(Reference)%'))
 
         if type:
-            query = query.filter(Track.type.ilike(type))
+            query = query.where(Track.type.ilike(type))
         if track_name:
-            query = query.filter(Track.track_name.ilike(f"%{track_name}%"))
+            query = query.where(Track.track_name.ilike(f"%{track_name}%"))
 
         if sort_by == "uploaded_at":
             query = query.order_by(Track.uploaded_at.desc() if sort_order == "desc" else Track.uploaded_at.asc())
         else:
             query = query.order_by(Track.track_name.desc() if sort_order == "desc" else Track.track_name.asc())
 
-        tracks = query.all()
+        tracks = (await db.scalars(query)).all()
 
         result = []
         for track in tracks:
@@ -217,6 +207,8 @@ def get_tracks_for_session(
 
         return result
 
+    except HTTPException:
+        raise
     except Exception as e:
         print("❌ INTERNAL ERROR in /sessions/{id}/tracks:", e)
         raise HTTPException(status_code=500, detail=str(e))
@@ -255,11 +247,13 @@ def delete_session(id: str, db: Session = Depends(get_db)):
     """
         Delete a session and all related data.
 
-        This removes:
-            - Chat messages linked to the session's tracks.
+        This removes, in a single transaction:
+            - Chat messages linked to the session or its tracks.
+            - Comparison groups that include any of the session's tracks.
             - Analysis results linked to the session's tracks.
             - All tracks in the session.
             - The session itself.
+        Audio files and RMS JSON are queued for background removal after commit.
 
         Args:
             id (str): UUID of the session to delete.
@@ -271,29 +265,20 @@ def delete_session(id: str, db: Session = Depends(get_db)):
         Returns:
             dict: Confirmation message summarizing deletions.
         """
-    session = db.query(UserSession).filter(UserSession.id == id).first()
-    if not session:
+    exists = db.query(UserSession.id).filter(UserSession.id == id).first()
+    if not exists:
         raise HTTPException(status_code=404, detail="Session not found")
 
-    # Get all track IDs related to this session
-    track_ids = [t.id for t in db.query(Track.id).filter(Track.session_id == id).all()]
-
-    if track_ids:
-        # Delete chat messages related to these tracks
-        deleted_chats = db.query(ChatMessage).filter(ChatMessage.track_id.in_(track_ids)).delete(synchronize_session=False)
-        print(f"Deleted {deleted_chats} chat messages linked to session {id}")
-
-        # Delete analysis results related to these tracks
-        deleted_analysis = db.query(AnalysisResult).filter(AnalysisResult.track_id.in_(track_ids)).delete(synchronize_session=False)
-        print(f"Deleted {deleted_analysis} analysis results linked to session {id}")
-
-        # Delete tracks themselves
-        deleted_tracks = db.query(Track).filter(Track.session_id == id).delete(synchronize_session=False)
-        print(f"Deleted {deleted_tracks} tracks linked to session {id}")
-
-    # Finally delete the session itself
-    db.delete(session)
-    db.commit()
+    try:
+        result = delete_session_rows(db, id)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    print(f"Deleted session {id}: {result['tracks']} tracks, {result['analysis']} analysis results, "
+          f"{result['chats']} chat messages")
+    enqueue_artifact_removal(result["artifacts"])
 
     return {"message": f"Session and all related tracks, analysis, and chats deleted"}
 
@@ -0,0 +1,34 @@
+"""
+Storage usage endpoint for ZoundZcope.
+
+Exposes the disk quota manager's view of how much space uploads, RMS
+analysis files and caches use, relative to the configured quota and
+eviction watermarks.
+
+Endpoints:
+    GET /api/storage-usage
+        Retrieve current disk usage per category.
+
+Dependencies:
+    - app.storage.storage (StorageManager singleton).
+"""
+import asyncio
+
+from fastapi import APIRouter
+from app.storage import storage
+
+router = APIRouter()
+
+
+@router.get("/api/storage-usage")
+async def get_storage_usage():
+    """
+        Retrieve current disk usage.
+
+        Returns:
+            dict: Bytes per category (uploads, rms, cache), total, bytes
+                  reserved for in-flight uploads, quota, watermarks, file
+                  count and eviction totals.
+        """
+    # The first call may have to scan the folders; keep that off the event loop
+    return await asyncio.to_thread(storage.usage)
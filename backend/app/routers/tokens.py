@@ -7,7 +7,14 @@ interact with the token tracker utility to maintain accurate usage metrics.
 
 Endpoints:
     GET    /api/token-stats
-        Retrieve current token usage statistics.
+        Retrieve current token usage statistics. Without query parameters the
+        response keeps its original shape (total_tokens, total_cost). With any of
+        `since`, `until`, `group_by`, `model` or `endpoint` it returns per-group
+        rows with the prompt/completion split, cost, request/error counts and
+        LLM latency (avg, p50/p95/p99, histogram).
+            since / until : ISO-8601 timestamps (UTC if no offset) or relative
+                            durations such as "15m", "24h", "7d".
+            group_by      : Comma-separated: model, endpoint, minute | hour | day.
 
     POST   /api/add-token-usage
         Add token usage for a specific model.
@@ -19,15 +26,43 @@ Dependencies:
     - token_tracker utility functions:
         * add_token_usage
         * get_token_usage
+        * query_token_stats
         * reset_token_usage
     - Pydantic for request body validation (TokenInput).
 """
-from fastapi import APIRouter
+from datetime import datetime, timedelta, timezone
+import re
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel
-from app.token_tracker import add_token_usage, get_token_usage, reset_token_usage
+from app.token_tracker import add_token_usage, get_token_usage, query_token_stats, reset_token_usage
 
 router = APIRouter()
 
+_RELATIVE_TIME = re.compile(r"^(\d+)([mhd])$")
+_UNITS = {"m": "minutes", "h": "hours", "d": "days"}
+
+
+def _parse_time(value: Optional[str], name: str) -> Optional[datetime]:
+    """
+        Parse an ISO-8601 timestamp or a relative duration ("24h" = 24 hours ago).
+
+        Raises:
+            HTTPException: 400 if the value can't be parsed.
+        """
+    if not value:
+        return None
+    match = _RELATIVE_TIME.match(value.strip())
+    if match:
+        amount, unit = match.groups()
+        return datetime.now(timezone.utc) - timedelta(**{_UNITS[unit]: int(amount)})
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid '{name}': use ISO-8601 or e.g. 15m, 24h, 7d.")
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
 
 class TokenInput(BaseModel):
     """
@@ -43,14 +78,37 @@ class TokenInput(BaseModel):
 
 
 @router.get("/api/token-stats")
-def get_stats():
+def get_stats(
+    since: Optional[str] = Query(None, description="Start of range: ISO-8601 or relative (15m, 24h, 7d)."),
+    until: Optional[str] = Query(None, description="End of range (exclusive): ISO-8601 or relative."),
+    group_by: Optional[str] = Query(None, description="Comma-separated: model, endpoint, minute|hour|day."),
+    model: Optional[str] = Query(None, description="Only this model."),
+    endpoint: Optional[str] = Query(None, description="Only this endpoint (e.g. /upload/)."),
+):
     """
-        Retrieve current token usage statistics.
+        Retrieve token usage statistics.
 
         Returns:
-            dict: Token usage data, including totals per model.
+            dict: Totals (total_tokens, total_cost, prompt_tokens, completion_tokens)
+                  when called without parameters; otherwise range, grouping,
+                  per-group rows and totals from `query_token_stats`.
+
+        Raises:
+            HTTPException: 400 for unparsable times or unknown group_by values.
         """
-    return get_token_usage()
+    if not any((since, until, group_by, model, endpoint)):
+        return get_token_usage()
+    groups = [g.strip() for g in (group_by or "").split(",") if g.strip()]
+    try:
+        return query_token_stats(
+            since=_parse_time(since, "since"),
+            until=_parse_time(until, "until"),
+            group_by=groups,
+            model=model,
+            endpoint=endpoint,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.post("/api/add-token-usage")
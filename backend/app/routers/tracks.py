@@ -2,8 +2,8 @@
 Track management endpoints for ZoundZcope.
 
 This module exposes endpoints to retrieve, update, and delete individual tracks.
-Deletions cascade to related records (analysis results and chat messages) and
-optionally remove the associated audio file from disk.
+Deletions cascade to related records (analysis results and chat messages) in
+one transaction; the audio file is removed from disk by the deletion queue.
 
 Endpoints:
     GET    /tracks/{track_id}  - Retrieve a single track by ID.
@@ -11,39 +11,28 @@ Endpoints:
     DELETE /tracks/{id}        - Delete a track, its analysis, chats, and file.
 
 Dependencies:
-    - SQLAlchemy SessionLocal for database access.
+    - Shared `get_db` / `get_async_db` dependencies from app.database.
     - Models: Track, AnalysisResult, ChatMessage.
 """
 from fastapi import APIRouter, HTTPException, Depends, Form
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.database import SessionLocal
+from app.database import get_db, get_async_db
+from app.deletion import delete_tracks, enqueue_artifact_removal
 from app.models import Track, AnalysisResult, ChatMessage
-import os
 
 router = APIRouter()
 
-def get_db():
-    """
-        Provide a SQLAlchemy database session via dependency injection.
-
-        Yields:
-            Session: An active SQLAlchemy session.
-        """
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 
 @router.get("/{track_id}")
-def get_single_track(track_id: str, db: Session = Depends(get_db)):
+async def get_single_track(track_id: str, db: AsyncSession = Depends(get_async_db)):
     """
         Retrieve a single track by its ID.
 
         Args:
             track_id (str): UUID of the track to fetch.
-            db (Session): Database session (injected dependency).
+            db (AsyncSession): Async database session (injected dependency).
 
         Raises:
             HTTPException: If the track does not exist (404).
@@ -51,7 +40,7 @@ def get_single_track(track_id: str, db: Session = Depends(get_db)):
         Returns:
             dict: Basic track info (id, name, type, session_id, file_path).
         """
-    track = db.query(Track).filter(Track.id == track_id).first()
+    track = await db.scalar(select(Track).where(Track.id == track_id))
     if not track:
         raise HTTPException(status_code=404, detail="Track not found")
 
@@ -104,11 +93,12 @@ def delete_track(id: str, db: Session = Depends(get_db)):
     """
         Delete a track and all related data.
 
-        This will:
+        This will, in a single transaction:
           - Remove the track's AnalysisResult (if present).
-          - Delete ChatMessage records linked to the track.
-          - Delete the underlying audio file from disk (if path exists).
+          - Delete ChatMessage records linked to the track, including
+            comparison groups the track took part in.
           - Remove the Track record itself.
+        The audio file and RMS JSON are queued for background removal after commit.
 
         Args:
             id (str): UUID of the track to delete.
@@ -121,31 +111,18 @@ def delete_track(id: str, db: Session = Depends(get_db)):
             dict: Confirmation message summarizing deletions.
         """
     print("Deleting track:", id)
-    track = db.query(Track).filter(Track.id == id).first()
-    if not track:
+    exists = db.query(Track.id).filter(Track.id == id).first()
+    if not exists:
         raise HTTPException(status_code=404, detail="Track not found")
 
-    # Delete associated analysis result if any
-    if track.analysis:
-        db.delete(track.analysis)
-
-    # Delete related chat messages
-    deleted_chats = db.query(ChatMessage).filter(ChatMessage.track_id == track.id).delete()
-    print(f"Deleted {deleted_chats} chat messages for track {track.id}")
-
-    # Safely delete file if file_path is set and file exists
-    if track.file_path:
-        try:
-            if os.path.exists(track.file_path):
-                os.remove(track.file_path)
-                print(f"Deleted file: {track.file_path}")
-            else:
-                print(f"File path does not exist: {track.file_path}")
-        except Exception as e:
-            print(f"Warning: Failed to delete file {track.file_path}: {e}")
-
-    # Delete track from DB
-    db.delete(track)
-    db.commit()
+    try:
+        result = delete_tracks(db, [id])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    print(f"Deleted {result['chats']} chat messages for track {id}")
+    enqueue_artifact_removal(result["artifacts"])
 
     return {"message": "Track, analysis, and chat messages deleted"}
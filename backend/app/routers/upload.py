@@ -19,7 +19,9 @@ import time
 import uuid
 import traceback
 
-from app.database import SessionLocal
+from sqlalchemy import Float
+
+from app.database import SessionLocal, DEFAULT_USER_ID
 from app.models import (
     Track,
     AnalysisResult as AnalysisResultModel,
@@ -27,6 +29,10 @@ from app.models import (
     Session as UserSession,
 )
 from app.audio_analysis import analyze_audio
+from app.cleanup import track_expiry
+from app.digests import refresh_digest
+from app.storage import storage
+from app.metrics import StageClock
 from app.gpt_utils import generate_feedback_prompt, generate_feedback_response
 from app.utils import (
     normalize_session_name,
@@ -49,17 +55,43 @@ DEBUG = os.getenv("DEBUG", "false").lower() == "true"
 
 
 def _filter_analysis_for_db(analysis: dict) -> dict:
-    """Keep only fields that exist on AnalysisResult model."""
+    """Keep only fields that exist on AnalysisResult model, typed for the column.
+
+    analyze_audio formats some numbers as strings (e.g. "0.00"); SQLite stores
+    them as-is but PostgreSQL needs real floats for FLOAT columns.
+    """
     if not analysis:
         return {}
-    allowed = {c.name for c in AnalysisResultModel.__table__.columns} - {"id", "track_id"}
-    filtered = {k: v for k, v in analysis.items() if k in allowed}
+    columns = {c.name: c for c in AnalysisResultModel.__table__.columns if c.name not in {"id", "track_id"}}
+    allowed = set(columns)
+    filtered = {}
+    for k, v in analysis.items():
+        if k not in allowed:
+            continue
+        if isinstance(v, str) and isinstance(columns[k].type, Float):
+            try:
+                v = float(v)
+            except ValueError:
+                v = None
+        filtered[k] = v
     dropped = set(analysis.keys()) - allowed
     if dropped:
         print("Analysis keys not in DB (dropped):", dropped)
     return filtered
 
 
+def _storage_full_response() -> JSONResponse:
+    return JSONResponse(
+        status_code=507,
+        content={"detail": "Server storage is full right now. Please try again later."},
+    )
+
+
+def _expected_size(upload: UploadFile) -> int:
+    """Size hint for quota reservation; falls back to the upload limit."""
+    return upload.size or MAX_FILE_MB * 1024 * 1024
+
+
 def _file_too_big(path: str) -> bool:
     try:
         size_mb = os.path.getsize(path) / (1024 * 1024)
@@ -80,9 +112,14 @@ def upload_audio(
     genre: str = Form(...),
     subgenre: Optional[str] = Form(default=None),
     feedback_profile: str = Form(...),
+    defer_feedback: bool = Form(default=False),
 ):
     """
     Upload a main track and optional reference track, analyze them, and generate feedback.
+
+    With `defer_feedback=true` the response is returned right after analysis
+    with `feedback: null`; the client then streams it from
+    `POST /chat/feedback/stream` using the returned `track_id`.
     """
 
     # ---- Normalize inputs
@@ -93,6 +130,7 @@ def upload_audio(
     subgenre = normalize_subgenre(subgenre) if subgenre else ""
     feedback_profile = normalize_profile(feedback_profile)
     group_id = str(uuid.uuid4())
+    stages = StageClock("upload")
 
     print("Incoming upload:", {
         "session_id": session_id,
@@ -103,6 +141,30 @@ def upload_audio(
         "feedback_profile": feedback_profile,
     })
 
+    # ---- Make room on disk before accepting the files; the bytes stay reserved until registered
+    reserved = {"main": _expected_size(file)}
+    if ref_file and ref_file.filename:
+        reserved["ref"] = _expected_size(ref_file)
+    if not storage.reserve(sum(reserved.values())):
+        return _storage_full_response()
+
+    try:
+        return _save_and_analyze(
+            file, ref_file, session_id, session_name, track_name, type, genre, subgenre,
+            feedback_profile, defer_feedback, group_id, stages, reserved,
+        )
+    finally:
+        # Whatever storage.register() did not claim (failed or aborted writes)
+        storage.release(sum(reserved.values()))
+
+
+def _save_and_analyze(file, ref_file, session_id, session_name, track_name, type, genre, subgenre,
+                      feedback_profile, defer_feedback, group_id, stages, reserved):
+    """
+    Body of `upload_audio` once quota is reserved: save, analyze, persist and
+    generate feedback. Pops each entry of `reserved` as its file is registered.
+    """
+
     # ---- Save original track to disk
     try:
         timestamp = int(time.time())
@@ -121,6 +183,8 @@ def upload_audio(
                 status_code=400,
                 content={"detail": f"File too large. Limit is {MAX_FILE_MB} MB."},
             )
+        storage.register(file_location, reserved=reserved.pop("main"))
+        stages.lap("save")
 
     except Exception as e:
         print("Save main file error:", repr(e))
@@ -137,6 +201,8 @@ def upload_audio(
         rms_output_path.parent.mkdir(parents=True, exist_ok=True)
 
         compute_rms_chunks(file_location, json_output_path=str(rms_output_path))
+        storage.register(rms_output_path)
+        stages.lap("rms")
         print("✅ RMS saved to:", rms_output_path)
     except Exception as e:
         print("RMS error:", repr(e))
@@ -147,6 +213,7 @@ def upload_audio(
     # ---- Analyze original track
     try:
         analysis = analyze_audio(file_location, genre=genre)
+        stages.lap("analysis")
     except Exception as e:
         print("Analysis error (main):", repr(e))
         if DEBUG:
@@ -174,8 +241,10 @@ def upload_audio(
                     status_code=400,
                     content={"detail": f"The reference file is too large. Limit is {MAX_FILE_MB} MB."},
                 )
+            storage.register(ref_file_location, reserved=reserved.pop("ref"))
 
             ref_analysis = analyze_audio(ref_file_location, genre=genre)
+            stages.lap("reference")
         except Exception as e:
             print("Reference file error:", repr(e))
             if DEBUG:
@@ -194,6 +263,7 @@ def upload_audio(
             try:
                 if old_track.file_path and os.path.exists(old_track.file_path):
                     os.remove(old_track.file_path)
+                    storage.forget(old_track.file_path)
                     print(f"Deleted old main track file: {old_track.file_path}")
             except Exception as e:
                 print(f"Error deleting old main track file {old_track.file_path}: {repr(e)}")
@@ -201,7 +271,7 @@ def upload_audio(
         # Ensure session exists
         existing_session = db.query(UserSession).filter(UserSession.id == session_id).first()
         if not existing_session:
-            new_session = UserSession(id=session_id, user_id=1, session_name=session_name)
+            new_session = UserSession(id=session_id, user_id=DEFAULT_USER_ID, session_name=session_name)
             db.add(new_session)
             db.commit()
 
@@ -217,6 +287,7 @@ def upload_audio(
             file_path=file_location,
             type=type,
             upload_group_id=group_id,
+            expires_at=track_expiry(),
         )
         db.add(track)
         db.commit()
@@ -237,6 +308,7 @@ def upload_audio(
                 file_path=ref_file_location,
                 type="reference",
                 upload_group_id=group_id,
+                expires_at=track_expiry(),
             )
             db.add(ref_track)
             db.commit()
@@ -247,9 +319,31 @@ def upload_audio(
             db.add(ref_result)
             db.commit()
 
+        stages.lap("db_write")
         print("Analysis data for main track (filtered keys):", list(filtered_analysis.keys()))
         print("Passing ref_analysis to prompt:", ref_analysis is not None)
 
+        # ---- Response payload
+        payload = {
+            "track_id": track.id,
+            "track_name": track_name,
+            "genre": genre,
+            "subgenre": subgenre,
+            "type": type,
+            "analysis": analysis,
+            "ref_analysis": ref_analysis,
+            "feedback": None,
+            "track_path": f"/uploads/{timestamped_name}",
+            "ref_track_path": f"/uploads/{ref_timestamped_name}" if ref_timestamped_name else None,
+            "rms_path": f"/static/analysis/{rms_filename}",
+        }
+
+        # ---- Client will stream feedback from /chat/feedback/stream
+        if defer_feedback:
+            payload["session_id"] = session_id
+            payload["feedback_stream"] = "/chat/feedback/stream"
+            return payload
+
         # ---- Generate GPT feedback
         prompt = generate_feedback_prompt(
             genre=genre,
@@ -259,7 +353,9 @@ def upload_audio(
             feedback_profile=feedback_profile,
             ref_analysis_data=ref_analysis,
         )
-        feedback = generate_feedback_response(prompt)
+        # Same analysis + settings => same prompt; re-uploads are served from the cache
+        feedback = generate_feedback_response(prompt, cache=True)
+        stages.lap("feedback")
 
         chat = ChatMessage(
             session_id=session_id,
@@ -270,20 +366,10 @@ def upload_audio(
         )
         db.add(chat)
         db.commit()
+        refresh_digest(db, track.id)
 
-        # ---- Response payload
-        return {
-            "track_name": track_name,
-            "genre": genre,
-            "subgenre": subgenre,
-            "type": type,
-            "analysis": analysis,
-            "ref_analysis": ref_analysis,
-            "feedback": feedback,
-            "track_path": f"/uploads/{timestamped_name}",
-            "ref_track_path": f"/uploads/{ref_timestamped_name}" if ref_timestamped_name else None,
-            "rms_path": f"/static/analysis/{rms_filename}",
-        }
+        payload["feedback"] = feedback
+        return payload
 
     except Exception as e:
         # Catch-all for anything above; keep 400 to match your frontend expectations
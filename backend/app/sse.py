@@ -0,0 +1,73 @@
+"""
+Server-Sent Events helpers for ZoundZcope.
+
+Streaming endpoints emit three kinds of events:
+
+    data: {"delta": "..."}                      - A chunk of generated text.
+    event: done  / data: {...}                  - Final payload (full text, ids).
+    event: error / data: {"detail": "..."}      - Generation failed mid-stream.
+
+Dependencies:
+    - FastAPI StreamingResponse.
+"""
+import json
+from typing import AsyncIterator, Callable, Optional
+
+from fastapi.responses import StreamingResponse
+
+
+def format_sse(data: dict, event: Optional[str] = None) -> str:
+    """
+        Encode one Server-Sent Event.
+
+        Args:
+            data (dict): JSON-serializable payload.
+            event (str, optional): Event name; omitted for plain data events.
+
+        Returns:
+            str: The event text including the terminating blank line.
+        """
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class _SSEResponse(StreamingResponse):
+    """StreamingResponse that runs `on_close` however sending it ends."""
+
+    def __init__(self, *args, on_close: Optional[Callable[[], None]] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.on_close = on_close
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            # Unlike a BackgroundTask, this also runs on client disconnect and cancellation
+            if self.on_close is not None:
+                self.on_close()
+
+
+def sse_response(events: AsyncIterator[str],
+                 on_close: Optional[Callable[[], None]] = None) -> StreamingResponse:
+    """
+        Wrap an async iterator of encoded events in a streaming response.
+
+        Disables caching and proxy buffering so each event reaches the
+        browser as soon as it is produced.
+
+        Args:
+            events (AsyncIterator[str]): Events built with `format_sse`.
+            on_close (Callable, optional): Called once the response is done,
+                whether the stream finished, failed, the client went away or
+                `events` was never started. Use it to free what the endpoint
+                acquired for the stream.
+
+        Returns:
+            StreamingResponse: `text/event-stream` response.
+        """
+    return _SSEResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        on_close=on_close,
+    )
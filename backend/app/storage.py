@@ -0,0 +1,361 @@
+"""
+Disk quota manager for ZoundZcope.
+
+Keeps an in-memory index of the artifacts the app writes to disk, grouped by
+category, with their size and last access time:
+
+    - uploads : Uploaded audio (backend/uploads).
+    - rms     : RMS waveform JSON (frontend-html/static/analysis).
+    - cache   : Decoded/derived caches (backend/cache).
+
+When usage crosses the high watermark, the least-recently-accessed artifacts
+are evicted until usage drops to the low watermark. Evicting an upload also
+evicts its RMS JSON, deletes the track's analysis results and clears
+`Track.file_path` in one transaction, exactly like expiry cleanup (chat
+history is kept). Files younger than STORAGE_MIN_AGE_SECONDS are never
+evicted so in-flight uploads survive.
+
+Access times are recorded by `touch()` (main.py calls it for every request to
+/uploads and /static/analysis); the filesystem atime is only used to seed the
+index at startup.
+
+Configuration:
+    STORAGE_QUOTA_MB         : Total budget for all categories (default 2048).
+    STORAGE_HIGH_WATERMARK   : Fraction of quota that triggers eviction (default 0.90).
+    STORAGE_LOW_WATERMARK    : Fraction of quota eviction brings usage down to (default 0.75).
+    STORAGE_MIN_AGE_SECONDS  : Minimum age before a file may be evicted (default 300).
+
+Usage:
+    storage.reserve(nbytes)  : Make room before writing; False means "disk full".
+    storage.register(path, reserved=nbytes)
+                             : Record a newly written file and settle its reservation.
+    storage.release(nbytes)  : Give back a reservation whose write failed or was aborted.
+    storage.forget(path)     : Drop a file removed elsewhere (cleanup, deletes).
+    storage.usage()          : Current usage per category.
+"""
+from pathlib import Path
+import os
+import time
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger("storage")
+
+BASE_DIR = Path(__file__).resolve().parents[2]
+UPLOAD_FOLDER = BASE_DIR / "backend" / "uploads"
+RMS_ANALYSIS_FOLDER = BASE_DIR / "frontend-html" / "static" / "analysis"
+CACHE_FOLDER = BASE_DIR / "backend" / "cache"
+
+CATEGORY_FOLDERS = {
+    "uploads": UPLOAD_FOLDER,
+    "rms": RMS_ANALYSIS_FOLDER,
+    "cache": CACHE_FOLDER,
+}
+
+STORAGE_QUOTA_BYTES = int(float(os.getenv("STORAGE_QUOTA_MB", "2048")) * 1024 * 1024)
+STORAGE_HIGH_WATERMARK = float(os.getenv("STORAGE_HIGH_WATERMARK", "0.90"))
+STORAGE_LOW_WATERMARK = float(os.getenv("STORAGE_LOW_WATERMARK", "0.75"))
+STORAGE_MIN_AGE_SECONDS = int(os.getenv("STORAGE_MIN_AGE_SECONDS", "300"))
+
+
+class _Entry:
+    __slots__ = ("category", "size", "created", "accessed")
+
+    def __init__(self, category: str, size: int, created: float, accessed: float):
+        self.category = category
+        self.size = size
+        self.created = created
+        self.accessed = accessed
+
+
+class StorageManager:
+    """
+        Tracks bytes used per category and evicts least-recently-used artifacts.
+
+        All methods are thread-safe; upload handlers run in the threadpool and
+        cleanup/deletion run in their own threads.
+        """
+
+    def __init__(self, folders: Dict[str, Path], quota_bytes: int,
+                 high_watermark: float, low_watermark: float, min_age_seconds: int):
+        self.folders = {name: Path(folder).resolve() for name, folder in folders.items()}
+        self.quota_bytes = quota_bytes
+        self.high_bytes = int(quota_bytes * high_watermark)
+        self.low_bytes = int(quota_bytes * low_watermark)
+        self.min_age_seconds = min_age_seconds
+        self._entries: Dict[Path, _Entry] = {}
+        self._used = {name: 0 for name in self.folders}
+        self._evicted = {"files": 0, "bytes": 0}
+        # Bytes reserved for writes that have not been registered yet
+        self._pending = 0
+        self._lock = threading.RLock()
+        self._scanned = False
+
+    # ---- index maintenance ----
+
+    def _category_for(self, path: Path) -> Optional[str]:
+        for name, folder in self.folders.items():
+            if path.parent == folder:
+                return name
+        return None
+
+    def _add(self, path: Path, category: str, size: int, created: float, accessed: float):
+        old = self._entries.pop(path, None)
+        if old:
+            self._used[old.category] -= old.size
+        self._entries[path] = _Entry(category, size, created, accessed)
+        self._used[category] += size
+
+    def _drop(self, path: Path) -> Optional[_Entry]:
+        entry = self._entries.pop(path, None)
+        if entry:
+            self._used[entry.category] -= entry.size
+        return entry
+
+    def scan(self):
+        """
+            Rebuild the index from disk with one scandir pass per category folder.
+            """
+        with self._lock:
+            self._entries.clear()
+            self._used = {name: 0 for name in self.folders}
+            for name, folder in self.folders.items():
+                try:
+                    entries = os.scandir(folder)
+                except FileNotFoundError:
+                    continue
+                with entries:
+                    for entry in entries:
+                        try:
+                            if not entry.is_file():
+                                continue
+                            st = entry.stat()
+                        except FileNotFoundError:
+                            continue
+                        self._add(Path(entry.path), name, st.st_size, st.st_mtime,
+                                  max(st.st_atime, st.st_mtime))
+            self._scanned = True
+        logger.info(f"Storage index built: {self.usage()['total_bytes']} bytes in {len(self._entries)} files")
+
+    def _ensure_scanned(self):
+        if not self._scanned:
+            self.scan()
+
+    def register(self, path, reserved: int = 0):
+        """
+            Record a newly written artifact.
+
+            Args:
+                path (str | Path): File inside one of the category folders.
+                reserved (int): Bytes reserved for this write via `reserve()`;
+                                they are released now that the file is counted.
+            """
+        path = Path(path).resolve()
+        category = self._category_for(path)
+        size = None
+        if category is not None:
+            try:
+                size = path.stat().st_size
+            except FileNotFoundError:
+                pass
+        now = time.time()
+        with self._lock:
+            self._ensure_scanned()
+            self._pending = max(self._pending - reserved, 0)
+            if size is not None:
+                self._add(path, category, size, now, now)
+
+    def release(self, nbytes: int):
+        """
+            Give back reserved bytes that will not be written (failed or aborted upload).
+
+            Args:
+                nbytes (int): Bytes previously reserved and not passed to `register()`.
+            """
+        if nbytes <= 0:
+            return
+        with self._lock:
+            self._pending = max(self._pending - nbytes, 0)
+
+    def forget(self, path):
+        """
+            Drop an artifact that was removed by someone else (cleanup, deletes).
+
+            Args:
+                path (str | Path): Removed file.
+            """
+        with self._lock:
+            self._drop(Path(path).resolve())
+
+    def touch(self, path):
+        """
+            Mark an artifact as just accessed.
+
+            Args:
+                path (str | Path): File that was read or served.
+            """
+        path = Path(path).resolve()
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry:
+                entry.accessed = time.time()
+
+    # ---- quota enforcement ----
+
+    def used_bytes(self) -> int:
+        with self._lock:
+            self._ensure_scanned()
+            return sum(self._used.values())
+
+    def reserve(self, nbytes: int) -> bool:
+        """
+            Make room for a write of `nbytes` and hold it until the write lands.
+
+            Reserved bytes count against the quota, alongside files on disk,
+            until `register()` or `release()` settles them, so concurrent
+            uploads cannot all pass the check for the same free space. If
+            usage plus reservations would cross the high watermark, evicts LRU
+            artifacts down to the low watermark first.
+
+            Args:
+                nbytes (int): Expected size of the upcoming write.
+
+            Returns:
+                bool: True if the write fits in the quota (the bytes are now
+                      reserved), False if the disk is full even after eviction.
+            """
+        victims, evicted_uploads = [], []
+        with self._lock:
+            self._ensure_scanned()
+            if self.used_bytes() + self._pending + nbytes > self.high_bytes:
+                victims, evicted_uploads = self._evict(target_bytes=max(self.low_bytes - self._pending - nbytes, 0))
+            fits = self.used_bytes() + self._pending + nbytes <= self.quota_bytes
+            if fits:
+                self._pending += nbytes
+        # File and DB I/O run outside the lock so uploads and touch() don't wait on them
+        if victims:
+            self._remove_files(victims)
+        if evicted_uploads:
+            self._release_tracks(evicted_uploads)
+        return fits
+
+    def _evict(self, target_bytes: int) -> Tuple[List[Path], List[Path]]:
+        """
+            Pick least-recently-accessed artifacts until usage <= target_bytes.
+
+            Called with the lock held. The victims are dropped from the index
+            right away; the caller deletes them with `_remove_files()` and
+            clears the evicted uploads' tracks with `_release_tracks()` once the
+            lock is released.
+
+            Returns:
+                tuple[list[Path], list[Path]]: Files to delete, evicted uploads.
+            """
+        cutoff = time.time() - self.min_age_seconds
+        candidates = sorted(
+            (entry.accessed, path)
+            for path, entry in self._entries.items()
+            if entry.created < cutoff
+        )
+        removed, evicted_uploads = [], []
+        files = freed = 0
+
+        for _, path in candidates:
+            if self.used_bytes() <= target_bytes:
+                break
+            entry = self._entries.get(path)
+            if entry is None:
+                continue  # already evicted as a companion file
+            victims = [path]
+            if entry.category == "uploads":
+                evicted_uploads.append(path)
+                victims.append(self.folders["rms"] / f"{path.name}_rms.json")
+            for victim in victims:
+                removed.append(victim)
+                victim_entry = self._drop(victim)
+                if victim_entry:
+                    files += 1
+                    freed += victim_entry.size
+
+        self._evicted["files"] += files
+        self._evicted["bytes"] += freed
+        logger.info(f"Evicting {files} files ({freed} bytes)")
+        return removed, evicted_uploads
+
+    @staticmethod
+    def _remove_files(paths: Iterable[Path]):
+        """Delete evicted files from disk (already dropped from the index)."""
+        started = time.perf_counter()
+        for path in paths:
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.error(f"Error evicting {path}: {e}")
+        logger.info(f"Removed evicted files in {time.perf_counter() - started:.3f}s")
+
+    @staticmethod
+    def _release_tracks(paths: Iterable[Path]):
+        """Expire tracks whose audio was evicted, as cleanup does: drop analysis, clear file_path."""
+        from app.database import SessionLocal
+        from app.models import AnalysisResult, Track
+
+        # Uploads store file_path relative to the backend working dir ("uploads/<name>")
+        stored = set()
+        for path in paths:
+            stored.add(str(path))
+            stored.add(os.path.relpath(path))
+        db = SessionLocal()
+        try:
+            track_ids = [
+                track_id for (track_id,) in
+                db.query(Track.id).filter(Track.file_path.in_(sorted(stored))).all()
+            ]
+            if track_ids:
+                db.query(AnalysisResult).filter(AnalysisResult.track_id.in_(track_ids)).delete(
+                    synchronize_session=False
+                )
+                db.query(Track).filter(Track.id.in_(track_ids)).update(
+                    {Track.file_path: None}, synchronize_session=False
+                )
+                db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error releasing evicted tracks: {e}")
+        finally:
+            db.close()
+
+    def usage(self) -> dict:
+        """
+            Report current disk usage.
+
+            Returns:
+                dict: Bytes per category, total, bytes reserved for pending
+                      writes, quota, watermarks, file count and eviction
+                      totals since startup.
+            """
+        with self._lock:
+            self._ensure_scanned()
+            total = sum(self._used.values())
+            return {
+                "categories": dict(self._used),
+                "total_bytes": total,
+                "quota_bytes": self.quota_bytes,
+                "high_watermark_bytes": self.high_bytes,
+                "low_watermark_bytes": self.low_bytes,
+                "pending_bytes": self._pending,
+                "used_ratio": round(total / self.quota_bytes, 4) if self.quota_bytes else None,
+                "files": len(self._entries),
+                "evicted": dict(self._evicted),
+            }
+
+
+storage = StorageManager(
+    CATEGORY_FOLDERS,
+    quota_bytes=STORAGE_QUOTA_BYTES,
+    high_watermark=STORAGE_HIGH_WATERMARK,
+    low_watermark=STORAGE_LOW_WATERMARK,
+    min_age_seconds=STORAGE_MIN_AGE_SECONDS,
+)
@@ -1,20 +1,61 @@
 """
 Token usage tracking utilities for ZoundZcope.
 
-This module tracks the total tokens consumed and estimated cost for AI model usage.
-It supports:
+This module tracks tokens consumed, estimated cost and LLM latency, persisted
+in the `token_usage_buckets` table in per-minute buckets by model and
+endpoint. It supports:
     - Adding token usage for a given model.
-    - Retrieving cumulative usage and cost.
+    - Recording a completion's usage off the request path (`record_usage`).
+    - Recording LLM call latency and failures (`record_llm_call`, used by the gateway).
+    - Retrieving cumulative usage and cost, or range/group-by queries (`query_token_stats`).
     - Resetting usage statistics.
 
+Accounting:
+    Provider-reported usage is recorded directly. Only when a response has no
+    usage (e.g. a stream from a provider that doesn't send the usage chunk)
+    are the prompt and completion tokenized locally, on a background worker,
+    so tiktoken never adds latency to a request.
+
+Persistence:
+    Increments are aggregated in memory and flushed every
+    TOKEN_STATS_FLUSH_SECONDS by a daemon thread (and on shutdown) as additive
+    upserts, so any number of uvicorn workers can write the same bucket.
+    Queries flush this process's buffer first; other workers' recent usage
+    shows up after their next flush.
+
+Endpoints:
+    The endpoint label comes from a context variable that main.py sets per
+    request to the path with numeric segments replaced by "{id}". Work outside
+    a request is labelled "background".
+
 Thread safety:
-    A threading.Lock is used to ensure atomic updates to usage counters.
+    A threading.Lock is used to ensure atomic updates to the in-memory buffer.
 
 Pricing:
     - Prices are stored per 1000 tokens in the `PRICES` dictionary.
     - Default model is "gpt-4o-mini" unless otherwise specified.
+
+Configuration:
+    TOKEN_STATS_FLUSH_SECONDS    : Buffer flush interval (default 10).
+    TOKEN_STATS_RETENTION_DAYS   : Buckets older than this are purged (default 90).
 """
-from threading import Lock
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone
+from threading import Lock, Thread
+import logging
+import os
+import time
+
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.database import SessionLocal
+from app.metrics import observe_llm_call, observe_llm_tokens
+from app.models import TokenUsageBucket
+from app.utils import count_tokens
+
+logger = logging.getLogger("token_tracker")
 
 # Pricing per 1000 tokens
 PRICES = {
@@ -22,16 +63,85 @@ PRICES = {
     "gpt-4o": 0.005          # $0.005 per 1K tokens
 }
 
+TOKEN_STATS_FLUSH_SECONDS = float(os.getenv("TOKEN_STATS_FLUSH_SECONDS", "10"))
+TOKEN_STATS_RETENTION_DAYS = int(os.getenv("TOKEN_STATS_RETENTION_DAYS", "90"))
+
+# Upper bounds of the latency histogram; the last column counts everything above
+LATENCY_BUCKETS_MS = (250, 500, 1000, 2000, 4000, 8000, 16000, 32000)
+HISTOGRAM_COLUMNS = [f"latency_le_{bound}ms" for bound in LATENCY_BUCKETS_MS] + [
+    f"latency_gt_{LATENCY_BUCKETS_MS[-1]}ms"
+]
+COUNTER_COLUMNS = [
+    "requests", "errors", "prompt_tokens", "completion_tokens", "total_tokens", "cost",
+    "latency_count", "latency_sum_ms", *HISTOGRAM_COLUMNS,
+]
+TIME_GROUPS = {"minute": 60, "hour": 3600, "day": 86400}
+
+_endpoint: ContextVar[str] = ContextVar("llm_endpoint", default="background")
+
 token_lock = Lock()
-_token_usage = {
-    "total_tokens": 0,
-    "total_cost": 0.0
-}
+# (bucket_start, model, endpoint) -> {column: increment}
+_buffer = {}
+_flush_lock = Lock()
+_flusher = None
+_last_purge = 0.0
+
+# Single worker: local tokenization is a fallback, ordering and throughput don't matter
+_accounting_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="token-accounting")
+
+
+def set_endpoint(label: str):
+    """
+        Label LLM usage in the current context (request) with an endpoint.
+
+        Args:
+            label (str): Normalized request path.
+
+        Returns:
+            contextvars.Token: Token for `ContextVar.reset`.
+        """
+    return _endpoint.set(label)
+
+
+def _minute(now: float = None) -> datetime:
+    now = time.time() if now is None else now
+    return datetime.fromtimestamp(now - now % 60, tz=timezone.utc)
+
+
+def _ensure_flusher():
+    global _flusher
+    if _flusher is None:
+        with _flush_lock:
+            if _flusher is None:
+                _flusher = Thread(target=_flush_loop, name="token-stats-flush", daemon=True)
+                _flusher.start()
+
+
+def _flush_loop():
+    while True:
+        time.sleep(TOKEN_STATS_FLUSH_SECONDS)
+        try:
+            flush_token_usage()
+        except Exception as e:
+            logger.error(f"Token stats flush failed: {e}")
+
+
+def _record(model_name: str, endpoint: str = None, **increments):
+    key = (_minute(), model_name or "unknown", endpoint or _endpoint.get())
+    with token_lock:
+        counters = _buffer.setdefault(key, {})
+        for column, value in increments.items():
+            counters[column] = counters.get(column, 0) + value
+    _ensure_flusher()
+
+
+def _cost(token_count: int, model_name: str) -> float:
+    return (token_count / 1000) * PRICES.get(model_name, PRICES["gpt-4o-mini"])
 
 
 def add_token_usage(token_count: int, model_name: str = "gpt-4o-mini"):
     """
-        Record additional token usage for a given model.
+        Record additional token usage for a given model (no prompt/completion split).
 
         Args:
             token_count (int): Number of tokens used.
@@ -41,10 +151,128 @@ def add_token_usage(token_count: int, model_name: str = "gpt-4o-mini"):
         Thread Safety:
             Uses a lock to ensure consistent updates to shared counters.
         """
+    _record(model_name, total_tokens=token_count, cost=_cost(token_count, model_name))
+
+
+def _add_split_usage(prompt_tokens: int, completion_tokens: int, model_name: str, endpoint: str = None):
+    total = prompt_tokens + completion_tokens
+    observe_llm_tokens(model_name, prompt_tokens, completion_tokens)
+    _record(
+        model_name, endpoint,
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        total_tokens=total,
+        cost=_cost(total, model_name),
+    )
+
+
+def _usage_field(usage, name: str):
+    if usage is None:
+        return None
+    if isinstance(usage, dict):
+        return usage.get(name)
+    return getattr(usage, name, None)
+
+
+def _count_and_add(prompt: str, completion: str, model_name: str, endpoint: str):
+    try:
+        prompt_tokens = count_tokens(prompt, model=model_name)
+        completion_tokens = count_tokens(completion, model=model_name)
+        _add_split_usage(prompt_tokens, completion_tokens, model_name, endpoint)
+        logger.info(f"Locally counted tokens ({model_name}): prompt {prompt_tokens}, completion {completion_tokens}")
+    except Exception as e:
+        logger.error(f"Local token accounting failed: {e}")
+
+
+def record_usage(usage=None, model_name: str = "gpt-4o-mini", prompt: str = None, completion: str = None):
+    """
+        Record the token usage of one completion without blocking the caller.
+
+        Args:
+            usage (CompletionUsage | dict | None): Provider-reported usage
+                ('prompt_tokens' / 'completion_tokens').
+            model_name (str, optional): Model identifier for pricing and tokenization.
+            prompt (str, optional): Prompt text, tokenized only if `usage` is missing.
+            completion (str, optional): Completion text, tokenized only if `usage` is missing.
+        """
+    prompt_tokens = _usage_field(usage, "prompt_tokens")
+    completion_tokens = _usage_field(usage, "completion_tokens")
+    if prompt_tokens is not None and completion_tokens is not None:
+        _add_split_usage(prompt_tokens, completion_tokens, model_name)
+        return
+    if prompt is None and completion is None:
+        return
+    # The worker thread doesn't see this context, so pass the label along
+    _accounting_pool.submit(_count_and_add, prompt or "", completion or "", model_name, _endpoint.get())
+
+
+def record_llm_call(model_name: str, seconds: float, error: bool = False):
+    """
+        Record one upstream LLM call and its end-to-end latency.
+
+        Args:
+            model_name (str): Model identifier.
+            seconds (float): Time from submission to result, including queueing and retries.
+            error (bool, optional): True if the call ultimately failed.
+        """
+    observe_llm_call(model_name, seconds, error)
+    ms = seconds * 1000
+    column = HISTOGRAM_COLUMNS[-1]
+    for bound, name in zip(LATENCY_BUCKETS_MS, HISTOGRAM_COLUMNS):
+        if ms <= bound:
+            column = name
+            break
+    _record(model_name, requests=1, errors=int(error), latency_count=1, latency_sum_ms=ms, **{column: 1})
+
+
+def _upsert(db, rows: list):
+    table = TokenUsageBucket.__table__
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    stmt = dialect.insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.bucket_start, table.c.model, table.c.endpoint],
+        set_={column: table.c[column] + stmt.excluded[column] for column in COUNTER_COLUMNS},
+    )
+    db.execute(stmt, rows)
+
+
+def flush_token_usage():
+    """
+        Write buffered increments to the database.
+
+        On failure the increments are put back into the buffer for the next flush.
+        """
+    global _last_purge
     with token_lock:
-        price_per_1k = PRICES.get(model_name, PRICES["gpt-4o-mini"])
-        _token_usage["total_tokens"] += token_count
-        _token_usage["total_cost"] += (token_count / 1000) * price_per_1k
+        pending = dict(_buffer)
+        _buffer.clear()
+    if not pending:
+        return
+
+    rows = []
+    for (bucket_start, model, endpoint), counters in pending.items():
+        row = {column: 0 for column in COUNTER_COLUMNS}
+        row.update(counters, bucket_start=bucket_start, model=model, endpoint=endpoint)
+        rows.append(row)
+
+    db = SessionLocal()
+    try:
+        _upsert(db, rows)
+        if time.time() - _last_purge > 3600:
+            cutoff = datetime.now(timezone.utc) - timedelta(days=TOKEN_STATS_RETENTION_DAYS)
+            db.query(TokenUsageBucket).filter(TokenUsageBucket.bucket_start < cutoff).delete(synchronize_session=False)
+            _last_purge = time.time()
+        db.commit()
+    except Exception:
+        db.rollback()
+        with token_lock:
+            for key, counters in pending.items():
+                merged = _buffer.setdefault(key, {})
+                for column, value in counters.items():
+                    merged[column] = merged.get(column, 0) + value
+        raise
+    finally:
+        db.close()
 
 
 def get_token_usage():
@@ -55,25 +283,166 @@ def get_token_usage():
             dict: {
                 "total_tokens" (int): Total tokens recorded.
                 "total_cost" (float): Rounded total cost in USD.
+                "prompt_tokens" (int): Prompt tokens (when the split is known).
+                "completion_tokens" (int): Completion tokens (when the split is known).
             }
+        """
+    flush_token_usage()
+    db = SessionLocal()
+    try:
+        total, cost, prompt, completion = db.query(
+            func.coalesce(func.sum(TokenUsageBucket.total_tokens), 0),
+            func.coalesce(func.sum(TokenUsageBucket.cost), 0.0),
+            func.coalesce(func.sum(TokenUsageBucket.prompt_tokens), 0),
+            func.coalesce(func.sum(TokenUsageBucket.completion_tokens), 0),
+        ).one()
+    finally:
+        db.close()
+    return {
+        "total_tokens": int(total),
+        "total_cost": round(float(cost), 5),  # 5 digits = clean, accurate
+        "prompt_tokens": int(prompt),
+        "completion_tokens": int(completion),
+    }
 
-        Thread Safety:
-            Uses a lock to ensure a consistent read of shared counters.
+
+def _percentile(histogram: list, count: int, q: float):
+    """Estimate a latency percentile (ms) by interpolating within histogram buckets."""
+    if not count:
+        return None
+    rank = q * count
+    seen = 0
+    lower = 0
+    for bound, n in zip(LATENCY_BUCKETS_MS, histogram):
+        if n and seen + n >= rank:
+            return round(lower + (bound - lower) * (rank - seen) / n, 1)
+        seen += n
+        lower = bound
+    return float(LATENCY_BUCKETS_MS[-1])  # in the overflow bucket; only a lower bound is known
+
+
+def _format_row(dims: dict, counters: dict) -> dict:
+    histogram = [counters[column] for column in HISTOGRAM_COLUMNS]
+    count = counters["latency_count"]
+    return {
+        **dims,
+        "requests": counters["requests"],
+        "errors": counters["errors"],
+        "prompt_tokens": counters["prompt_tokens"],
+        "completion_tokens": counters["completion_tokens"],
+        "total_tokens": counters["total_tokens"],
+        "cost": round(counters["cost"], 5),
+        "latency": {
+            "count": count,
+            "avg_ms": round(counters["latency_sum_ms"] / count, 1) if count else None,
+            "p50_ms": _percentile(histogram, count, 0.50),
+            "p95_ms": _percentile(histogram, count, 0.95),
+            "p99_ms": _percentile(histogram, count, 0.99),
+            "histogram": {column[len("latency_"):]: n for column, n in zip(HISTOGRAM_COLUMNS, histogram)},
+        },
+    }
+
+
+def query_token_stats(since: datetime = None, until: datetime = None, group_by=(),
+                      model: str = None, endpoint: str = None) -> dict:
+    """
+        Aggregate persisted usage over a time range.
+
+        Args:
+            since (datetime, optional): Inclusive start (UTC); default: all time.
+            until (datetime, optional): Exclusive end (UTC); default: now.
+            group_by (Iterable[str]): Any of "model", "endpoint" and at most one
+                of "minute", "hour", "day".
+            model (str, optional): Only this model.
+            endpoint (str, optional): Only this endpoint.
+
+        Returns:
+            dict: Range, grouping, one row per group (tokens, cost, requests,
+                  errors, latency avg/p50/p95/p99 and histogram) and totals.
+
+        Raises:
+            ValueError: Unknown or conflicting group_by values.
         """
-    with token_lock:
-        return {
-            "total_tokens": _token_usage["total_tokens"],
-            "total_cost": round(_token_usage["total_cost"], 5)  # 5 digits = clean, accurate
-        }
+    group_by = [g for g in group_by if g]
+    unknown = set(group_by) - {"model", "endpoint", *TIME_GROUPS}
+    if unknown:
+        raise ValueError(f"Unknown group_by value(s): {', '.join(sorted(unknown))}")
+    time_groups = [g for g in group_by if g in TIME_GROUPS]
+    if len(time_groups) > 1:
+        raise ValueError("group_by accepts only one of minute, hour, day")
+
+    flush_token_usage()
+
+    dims = [getattr(TokenUsageBucket, g) for g in ("model", "endpoint") if g in group_by]
+    if time_groups:
+        dims.append(TokenUsageBucket.bucket_start)
+    sums = [func.sum(getattr(TokenUsageBucket, column)) for column in COUNTER_COLUMNS]
+
+    db = SessionLocal()
+    try:
+        query = db.query(*dims, *sums)
+        if since is not None:
+            query = query.filter(TokenUsageBucket.bucket_start >= since)
+        if until is not None:
+            query = query.filter(TokenUsageBucket.bucket_start < until)
+        if model:
+            query = query.filter(TokenUsageBucket.model == model)
+        if endpoint:
+            query = query.filter(TokenUsageBucket.endpoint == endpoint)
+        if dims:
+            query = query.group_by(*dims)
+        results = query.all()
+    finally:
+        db.close()
+
+    # Minute rows are folded into hour/day buckets here so the SQL stays portable
+    step = TIME_GROUPS[time_groups[0]] if time_groups else None
+    groups = {}
+    totals = {column: 0 for column in COUNTER_COLUMNS}
+    for result in results:
+        values = list(result)
+        key_values = values[:len(dims)]
+        counters = {column: value or 0 for column, value in zip(COUNTER_COLUMNS, values[len(dims):])}
+        if step:
+            bucket = key_values[-1]
+            if bucket.tzinfo is None:  # SQLite returns naive UTC
+                bucket = bucket.replace(tzinfo=timezone.utc)
+            epoch = bucket.timestamp()
+            key_values[-1] = datetime.fromtimestamp(epoch - epoch % step, tz=timezone.utc).isoformat()
+        key = tuple(key_values)
+        merged = groups.setdefault(key, {column: 0 for column in COUNTER_COLUMNS})
+        for column, value in counters.items():
+            merged[column] += value
+            totals[column] += value
+
+    names = [g for g in ("model", "endpoint") if g in group_by] + (["bucket"] if step else [])
+    rows = [_format_row(dict(zip(names, key)), counters) for key, counters in groups.items()] if dims else []
+    rows.sort(key=lambda row: (row.get("bucket") or "", -row["total_tokens"]))
+
+    return {
+        "since": since.isoformat() if since else None,
+        "until": until.isoformat() if until else None,
+        "group_by": group_by,
+        "rows": rows,
+        "totals": _format_row({}, totals),
+    }
 
 
 def reset_token_usage():
     """
-        Reset all token usage statistics to zero.
+        Reset all token usage statistics to zero (deletes every persisted bucket).
 
         Thread Safety:
-            Uses a lock to ensure counters are reset atomically.
+            Uses a lock to ensure the in-memory buffer is cleared atomically.
         """
     with token_lock:
-        _token_usage["total_tokens"] = 0
-        _token_usage["total_cost"] = 0.0
+        _buffer.clear()
+    db = SessionLocal()
+    try:
+        db.query(TokenUsageBucket).delete(synchronize_session=False)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
@@ -5,7 +5,7 @@ This module provides common helper functions for:
     - Sanitizing and normalizing user input.
     - Validating allowed types, profiles, and genres.
     - Safe naming for sessions and tracks.
-    - Token counting for AI prompt cost estimation.
+    - Token counting for AI prompt cost estimation (memoized tiktoken encoders).
 
 Dependencies:
     - re, html, os for text cleaning and formatting.
@@ -15,12 +15,19 @@ Constants:
     ALLOWED_TYPES    : Permitted track types.
     ALLOWED_PROFILES : Permitted feedback profiles.
     ALLOWED_GENRES   : Permitted music genres.
+    TOKEN_ENCODER_MODELS : Models whose encoders are loaded by `warm_token_encoders()`.
+    TOKEN_ENCODER_RETRY_SECONDS : Wait before retrying an encoder that failed to load.
 """
 import re
 import html
 import os
+import time
+import logging
+import threading
 import tiktoken
 
+logger = logging.getLogger("utils")
+
 # from openai import OpenAI
 
 # import os
@@ -218,6 +225,67 @@ def normalize_subgenre(sub: str) -> str:
     return html.escape(sub)
 
 
+TOKEN_ENCODER_MODELS = ("gpt-4o", "gpt-4o-mini")
+TOKEN_ENCODER_RETRY_SECONDS = float(os.getenv("TOKEN_ENCODER_RETRY_SECONDS", "300"))
+
+# Model name -> tiktoken Encoding (only successful loads)
+_encoders = {}
+# Model name -> time.monotonic() before which a failed load is not retried
+_encoder_retry_at = {}
+_encoders_lock = threading.Lock()
+
+
+def get_encoder(model="gpt-4o"):
+    """
+    Return the tiktoken encoder for a model, loading it once per process.
+
+    The first load may read (or download) the BPE file, so it should happen
+    at startup via `warm_token_encoders()` rather than on a request. Unknown
+    model names use the o200k_base encoding. If the encoding can't be loaded
+    (e.g. the download failed), None is returned and `count_tokens` falls
+    back to an estimate; the load is retried on the first call after
+    TOKEN_ENCODER_RETRY_SECONDS, so a transient failure isn't permanent.
+
+    Args:
+        model (str, optional): Model name for encoding rules.
+
+    Returns:
+        tiktoken.Encoding | None: Cached encoder, or None while unavailable.
+    """
+    encoder = _encoders.get(model)
+    if encoder is not None:
+        return encoder
+    with _encoders_lock:
+        if model in _encoders:
+            return _encoders[model]
+        if time.monotonic() < _encoder_retry_at.get(model, 0):
+            return None
+        try:
+            try:
+                encoder = tiktoken.encoding_for_model(model)
+            except KeyError:
+                encoder = tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            logger.warning(f"tiktoken encoder for {model} unavailable, estimating tokens instead "
+                           f"(retrying in {TOKEN_ENCODER_RETRY_SECONDS:.0f}s): {e}")
+            _encoder_retry_at[model] = time.monotonic() + TOKEN_ENCODER_RETRY_SECONDS
+            return None
+        _encoders[model] = encoder
+        _encoder_retry_at.pop(model, None)
+        return encoder
+
+
+def warm_token_encoders(models=TOKEN_ENCODER_MODELS):
+    """
+    Load encoders ahead of the first request (called from the app lifespan).
+
+    Args:
+        models (Iterable[str], optional): Model names to load.
+    """
+    for model in models:
+        get_encoder(model)
+
+
 def count_tokens(text, model="gpt-4o"):
     """
     Count tokens in a string using tiktoken for a given model.
@@ -227,9 +295,11 @@ def count_tokens(text, model="gpt-4o"):
         model (str, optional): Model name for encoding rules.
 
     Returns:
-        int: Number of tokens.
+        int: Number of tokens (about len(text) / 4 if no encoder is available).
     """
-    encoding = tiktoken.encoding_for_model(model)
-    return len(encoding.encode(text))
+    encoder = get_encoder(model)
+    if encoder is None:
+        return len(text or "") // 4
+    return len(encoder.encode(text or ""))
 
 
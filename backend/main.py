@@ -4,12 +4,14 @@ Main entry point for the ZoundZcope FastAPI application.
 This module:
     - Configures the FastAPI app, CORS, static file serving, and templates.
     - Registers API routers for file upload, chat, RAG features, token tracking,
-      sessions, tracks, and export functionality.
+      sessions, tracks, export, storage usage and Prometheus metrics.
     - Initializes the database schema.
     - Serves HTML frontend pages.
     - Runs a background cleanup task to remove old uploads.
 
 Routes:
+    GET /healthz, /livez     - Liveness probes.
+    GET /readyz              - Readiness probe; 503 until the RAG warm-up has finished.
     GET /                    - Render the main index page.
     GET /info.html           - Render the info page.
     GET /feedback_history.html - Render the feedback history page.
@@ -20,21 +22,28 @@ Static Mounts:
 
 Background Tasks:
     periodic_cleanup_task(): Removes old uploaded files twice daily.
+    periodic_metrics_sampling(): Refreshes runtime gauges (threadpool, queues, storage).
 
 Dependencies:
     - FastAPI, Jinja2, SQLAlchemy, CORSMiddleware.
-    - Routers: upload, chat, rag, tokens, sessions, tracks, export.
+    - Routers: upload, chat, rag, tokens, sessions, tracks, export, storage, metrics.
     - Cleanup utility for old uploads.
 """
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import upload, chat, sessions, tracks, export, tokens
-from app.database import Base, engine
+from app.routers import upload, chat, sessions, tracks, export, tokens, storage as storage_router, metrics as metrics_router
+from app.database import init_db, async_engine
 from app.cleanup import cleanup_old_uploads
+from app.storage import storage, UPLOAD_FOLDER, RMS_ANALYSIS_FOLDER
+from app.utils import warm_token_encoders
+from app.token_tracker import set_endpoint, flush_token_usage
+from app.metrics import MetricsMiddleware, METRICS_SAMPLE_SECONDS, sample_runtime, sample_threadpool, mark_process_dead
 
 import os
+import re
 import asyncio
 import logging
+import threading
 from pathlib import Path
 from contextlib import asynccontextmanager
 from fastapi import HTTPException
@@ -53,25 +62,45 @@ async def lifespan(app: FastAPI):
     """
         Application lifespan context manager.
 
-        Starts a periodic cleanup task on application startup
-        and ensures it is cancelled on shutdown.
+        On startup it builds the storage quota index, starts warming the
+        tiktoken encoders in a background thread and, when RAG is enabled,
+        the FAISS indexes and embedding model as well (first loads may
+        download files; GET /readyz reports when RAG is warm). It then
+        starts the periodic cleanup and metrics sampling tasks.
+
+        On shutdown it cancels those tasks, marks this process's metrics as
+        dead, flushes buffered token statistics and disposes of the async
+        database engine's connection pool.
 
         Args:
             app (FastAPI): The running FastAPI application instance.
         """
+    await asyncio.to_thread(storage.scan)
+    threading.Thread(target=warm_token_encoders, name="tiktoken-warmup", daemon=True).start()
+    if RAG_ENABLED:
+        threading.Thread(target=warm_rag, name="rag-warmup", daemon=True).start()
     task = asyncio.create_task(periodic_cleanup_task())
+    sampler = asyncio.create_task(periodic_metrics_sampling())
     try:
         yield
     finally:
-        task.cancel()
+        for background in (task, sampler):
+            background.cancel()
+            try:
+                await background
+            except asyncio.CancelledError:
+                pass
+        mark_process_dead()
         try:
-            await task
-        except asyncio.CancelledError:
-            pass
+            await asyncio.to_thread(flush_token_usage)
+        except Exception as e:
+            logger.error(f"Final token stats flush failed: {e}")
+        await async_engine.dispose()
 
 
 app = FastAPI(title="ZoundZcope API", lifespan=lifespan)
 
+app.add_middleware(MetricsMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -82,6 +111,28 @@ app.add_middleware(
 
 logger = logging.getLogger("uvicorn.error")
 
+
+_NUMERIC_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+
+@app.middleware("http")
+async def label_llm_endpoint(request: Request, call_next):
+    """Attribute LLM usage during this request to its path (ids collapsed to {id})."""
+    set_endpoint(_NUMERIC_SEGMENT.sub("/{id}", request.url.path)[:128])
+    return await call_next(request)
+
+
+@app.middleware("http")
+async def track_artifact_access(request: Request, call_next):
+    """Record reads of uploads and RMS JSON so quota eviction is least-recently-used."""
+    path = request.url.path
+    if path.startswith("/uploads/"):
+        storage.touch(UPLOAD_FOLDER / Path(path).name)
+    elif path.startswith("/static/analysis/"):
+        storage.touch(RMS_ANALYSIS_FOLDER / Path(path).name)
+    return await call_next(request)
+
+
 BASE_DIR = Path(__file__).resolve().parents[1]
 STATIC_DIR = BASE_DIR / "frontend-html" / "static"
 TEMPLATE_DIR = BASE_DIR / "frontend-html" / "templates"
@@ -95,10 +146,10 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi import Request
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse
 
 
-Base.metadata.create_all(bind=engine)
+init_db()
 
 #/=====config for frontend-html======/#
 # Serve static files like your logo
@@ -120,6 +171,8 @@ app.include_router(tokens.router)
 app.include_router(sessions.router)
 app.include_router(tracks.router, prefix="/tracks", tags=["Tracks"])
 app.include_router(export.router, prefix="/export", tags=["Export"])
+app.include_router(storage_router.router, tags=["Storage"])
+app.include_router(metrics_router.router, tags=["Metrics"])
 
 app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
 app.mount("/uploads", StaticFiles(directory=str(UPLOAD_DIR)), name="uploads")
@@ -196,31 +249,63 @@ async def periodic_cleanup_task():
     """
         Background task to periodically clean up old uploaded files.
 
-        Runs every 12 hours and logs actions or errors.
+        Runs every 12 hours in a worker thread and logs counts,
+        durations or errors.
         """
     while True:
         try:
             logger.info("Running periodic cleanup task...")
-            cleanup_old_uploads()
+            # Blocking DB and filesystem work runs off the event loop
+            stats = await asyncio.to_thread(cleanup_old_uploads)
+            logger.info(f"Periodic cleanup stats: {stats}")
         except Exception as e:
             logger.error(f"Periodic cleanup error: {e}")
         await asyncio.sleep(12 * 60 * 60)  # Run twice daily
 
 
-@app.on_event("startup")
-async def startup_event():
+async def periodic_metrics_sampling():
     """
-        FastAPI startup event handler.
+        Background task refreshing runtime gauges (threadpool, queues, storage).
 
-        Starts the periodic cleanup task in the background.
+        Runs every METRICS_SAMPLE_SECONDS so each worker's gauges stay current
+        even when another worker serves the scrape.
         """
-    asyncio.create_task(periodic_cleanup_task())
+    while True:
+        try:
+            sample_threadpool()
+            await asyncio.to_thread(sample_runtime)
+        except Exception as e:
+            logger.error(f"Metrics sampling error: {e}")
+        await asyncio.sleep(METRICS_SAMPLE_SECONDS)
+
+
+def warm_rag():
+    """Load RAG indexes and the embedding model; failures leave /readyz at 503."""
+    from app.routers import rag
+    try:
+        rag.warm_up()
+    except Exception as e:
+        logger.error(f"RAG warm-up failed: {e}")
 
 
 @app.get("/healthz")
 async def healthz():
     return {"status": "ok"}
 
+
+@app.get("/readyz", include_in_schema=False)
+async def readyz():
+    """
+        Readiness probe: 200 once startup warm-up is done, 503 until then.
+
+        Only RAG needs warming; with RAG disabled the app is ready at once.
+        """
+    if RAG_ENABLED:
+        from app.routers import rag
+        if not rag.is_ready():
+            return JSONResponse(status_code=503, content={"status": "warming", "rag": "loading"})
+    return {"status": "ready"}
+
 # (Optional) split health:
 @app.get("/livez", include_in_schema=False)
 async def livez():
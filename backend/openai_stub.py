@@ -0,0 +1,394 @@
+"""
+Local OpenAI-compatible stub server for load and integration testing.
+
+Implements enough of the Chat Completions API for ZoundZcope's LLM gateway, so
+uploads, follow-ups, comparisons, exports and RAG can be exercised end to end
+without calling (or paying for) the real API.
+
+Endpoints:
+    - POST /v1/chat/completions : Non-streaming and streaming (SSE) completions,
+                                  including the final usage chunk when
+                                  `stream_options.include_usage` is set.
+    - GET  /v1/models           : Lists the configured model names.
+    - GET  /stub/stats          : Request, error and token counters.
+    - GET  /stub/config         : Current configuration.
+    - POST /stub/config         : Change configuration at runtime (same keys as below, lower-case).
+    - POST /stub/reset          : Reset counters.
+
+Latency specs (used for STUB_LATENCY and STUB_TOKEN_LATENCY):
+    fixed:S            always S seconds
+    uniform:A:B        uniform between A and B
+    normal:MU:SD       normal, clamped at 0
+    lognormal:MU:SIGMA log-normal (heavy tail, closest to real providers)
+    exp:MEAN           exponential
+
+Error injection (STUB_ERRORS) is a comma-separated list of `kind:probability`:
+    429 / 500 / 502 / 503 ... : Return that status with an OpenAI-style error body
+                                (429 includes Retry-After: STUB_RETRY_AFTER).
+    timeout                   : Hang for STUB_HANG_SECONDS before answering.
+    midstream                 : Streams only: drop the connection halfway through.
+
+Responses:
+    Without STUB_RESPONSES the stub answers with a canned INSIGHT/SUGGESTION
+    list shaped like real feedback. STUB_RESPONSES points at a JSON file with a
+    list of {"match": "<regex>", "response": "<template>"} rules; the first rule
+    whose regex matches the last user message wins. Templates may use {model},
+    {n} (request number), {prompt} (last user message, first 200 characters)
+    and {prompt_chars}.
+
+Configuration:
+    STUB_LATENCY        : Time to the full response / first token (default fixed:0).
+    STUB_TOKEN_LATENCY  : Delay between streamed chunks (default fixed:0).
+    STUB_ERRORS         : Error injection spec (default none).
+    STUB_RETRY_AFTER    : Retry-After seconds sent with 429 (default 1).
+    STUB_HANG_SECONDS   : How long a "timeout" error hangs (default 600).
+    STUB_RESPONSES      : Path to a JSON rules file (optional).
+    STUB_MODELS         : Comma-separated models for /v1/models (default gpt-4o-mini).
+    STUB_SEED           : Random seed for reproducible runs (optional).
+
+Usage:
+    python backend/openai_stub.py --port 8765 --latency lognormal:-0.7:0.5 --errors 429:0.05
+    cd backend && OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=stub uvicorn main:app
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from typing import List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+CANNED_RESPONSE = (
+    "- INSIGHT: The low end is slightly heavier than typical for this genre, which can mask the kick.\n"
+    "SUGGESTION: Try a gentle low-shelf cut around 100 Hz so the kick and bass separate more clearly.\n\n"
+    "- INSIGHT: The dynamic range is on the wide side, so quieter sections may feel less energetic.\n"
+    "SUGGESTION: Use light bus compression (2:1, slow attack) to glue the mix without losing punch.\n\n"
+    "- INSIGHT: The stereo image narrows in the upper frequencies.\n"
+    "SUGGESTION: Widen hats and pads slightly with a stereo imager above 5 kHz while keeping the low end mono."
+)
+
+_CHUNK_PATTERN = re.compile(r"\S+\s*|\s+")
+
+
+def parse_latency(spec: str):
+    """
+        Turn a latency spec into a sampler.
+
+        Args:
+            spec (str): e.g. "fixed:0.2", "uniform:0.1:0.5", "lognormal:-1:0.5".
+
+        Returns:
+            Callable[[], float]: Returns a delay in seconds (never negative).
+
+        Raises:
+            ValueError: Unknown distribution or wrong number of parameters.
+        """
+    name, *params = (spec or "fixed:0").split(":")
+    values = [float(p) for p in params]
+    samplers = {
+        "fixed": (1, lambda s: s),
+        "uniform": (2, lambda a, b: random.uniform(a, b)),
+        "normal": (2, lambda mu, sd: random.gauss(mu, sd)),
+        "lognormal": (2, lambda mu, sigma: random.lognormvariate(mu, sigma)),
+        "exp": (1, lambda mean: random.expovariate(1 / mean) if mean > 0 else 0.0),
+    }
+    if name not in samplers:
+        raise ValueError(f"Unknown latency distribution: {name}")
+    arity, fn = samplers[name]
+    if len(values) != arity:
+        raise ValueError(f"Latency '{name}' takes {arity} parameter(s), got {len(values)}")
+    return lambda: max(0.0, fn(*values))
+
+
+def parse_errors(spec: str) -> List[tuple]:
+    """
+        Parse an error injection spec.
+
+        Args:
+            spec (str): e.g. "429:0.05,500:0.01,timeout:0.01".
+
+        Returns:
+            list[tuple[str, float]]: (kind, probability) pairs.
+        """
+    errors = []
+    for item in filter(None, (part.strip() for part in (spec or "").split(","))):
+        kind, _, probability = item.partition(":")
+        errors.append((kind, float(probability or 0)))
+    return errors
+
+
+def load_rules(path: Optional[str]) -> List[tuple]:
+    """Load response rules from a JSON file as (compiled regex, template) pairs."""
+    if not path:
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        rules = json.load(f)
+    return [(re.compile(rule.get("match", ".*"), re.S | re.I), rule["response"]) for rule in rules]
+
+
+class StubState:
+    """
+        Mutable stub configuration and counters, shared by all requests.
+        """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.configure({
+            "latency": os.getenv("STUB_LATENCY", "fixed:0"),
+            "token_latency": os.getenv("STUB_TOKEN_LATENCY", "fixed:0"),
+            "errors": os.getenv("STUB_ERRORS", ""),
+            "retry_after": os.getenv("STUB_RETRY_AFTER", "1"),
+            "hang_seconds": os.getenv("STUB_HANG_SECONDS", "600"),
+            "responses": os.getenv("STUB_RESPONSES") or None,
+            "models": os.getenv("STUB_MODELS", "gpt-4o-mini"),
+        })
+        self.reset()
+
+    def configure(self, values: dict):
+        """Apply configuration keys; specs are validated before anything changes."""
+        config = dict(getattr(self, "config", {}), **{k: v for k, v in values.items() if v is not None or k == "responses"})
+        latency = parse_latency(config["latency"])
+        token_latency = parse_latency(config["token_latency"])
+        errors = parse_errors(config["errors"])
+        rules = load_rules(config["responses"])
+        with self.lock:
+            self.config = config
+            self.latency, self.token_latency = latency, token_latency
+            self.errors, self.rules = errors, rules
+
+    def reset(self):
+        with self.lock:
+            self.counters = {
+                "requests": 0, "streams": 0, "errors": {}, "prompt_tokens": 0,
+                "completion_tokens": 0, "inflight": 0, "max_inflight": 0, "started": time.time(),
+            }
+
+    def begin(self, stream: bool) -> int:
+        with self.lock:
+            c = self.counters
+            c["requests"] += 1
+            c["streams"] += int(stream)
+            c["inflight"] += 1
+            c["max_inflight"] = max(c["max_inflight"], c["inflight"])
+            return c["requests"]
+
+    def end(self, prompt_tokens: int = 0, completion_tokens: int = 0):
+        with self.lock:
+            self.counters["inflight"] -= 1
+            self.counters["prompt_tokens"] += prompt_tokens
+            self.counters["completion_tokens"] += completion_tokens
+
+    def record_error(self, kind: str):
+        with self.lock:
+            self.counters["errors"][kind] = self.counters["errors"].get(kind, 0) + 1
+
+    def draw_error(self, stream: bool) -> Optional[str]:
+        """Pick at most one injected error for this request."""
+        roll = random.random()
+        for kind, probability in self.errors:
+            if kind == "midstream" and not stream:
+                continue
+            if roll < probability:
+                return kind
+            roll -= probability
+        return None
+
+
+state = StubState()
+app = FastAPI(title="ZoundZcope OpenAI stub")
+
+
+def _estimate_tokens(text: str) -> int:
+    # Same ~4 characters per token the gateway uses for rate shaping
+    return max(1, math.ceil(len(text) / 4)) if text else 0
+
+
+def _last_user_message(messages: List[dict]) -> str:
+    for message in reversed(messages):
+        if message.get("role") == "user":
+            content = message.get("content") or ""
+            return content if isinstance(content, str) else json.dumps(content)
+    return ""
+
+
+def _render(model: str, n: int, messages: List[dict]) -> str:
+    prompt = _last_user_message(messages)
+    for pattern, template in state.rules:
+        if pattern.search(prompt):
+            return template.format_map({
+                "model": model, "n": n, "prompt": prompt[:200], "prompt_chars": len(prompt),
+            })
+    return CANNED_RESPONSE
+
+
+def _error_response(kind: str) -> JSONResponse:
+    status = int(kind) if kind.isdigit() else 500
+    headers = {"retry-after": str(state.config["retry_after"])} if status == 429 else {}
+    error_type = "rate_limit_exceeded" if status == 429 else "server_error"
+    return JSONResponse(
+        status_code=status,
+        headers=headers,
+        content={"error": {"message": f"Injected {kind} from stub", "type": error_type, "code": error_type}},
+    )
+
+
+def _chunk(completion_id: str, created: int, model: str, delta: dict, finish_reason=None) -> str:
+    payload = {
+        "id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    """
+        Chat Completions endpoint compatible with the OpenAI SDK.
+
+        Honors `model`, `messages`, `max_tokens` (output is cut at ~4 chars per
+        token with finish_reason "length"), `stream` and `stream_options`.
+        """
+    body = await request.json()
+    model = body.get("model", "gpt-4o-mini")
+    messages = body.get("messages") or []
+    stream = bool(body.get("stream"))
+    n = state.begin(stream)
+
+    prompt_tokens = sum(_estimate_tokens(m.get("content") or "") for m in messages
+                        if isinstance(m.get("content"), str))
+    text = _render(model, n, messages)
+    finish_reason = "stop"
+    max_tokens = body.get("max_tokens") or body.get("max_completion_tokens")
+    if max_tokens and len(text) > max_tokens * 4:
+        text, finish_reason = text[:max_tokens * 4], "length"
+    completion_tokens = _estimate_tokens(text)
+    usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+             "total_tokens": prompt_tokens + completion_tokens}
+
+    error = state.draw_error(stream)
+    if error:
+        state.record_error(error)
+    if error == "timeout":
+        try:
+            await asyncio.sleep(float(state.config["hang_seconds"]))
+        except asyncio.CancelledError:  # client gave up
+            state.end()
+            raise
+        error = None
+    elif error and error != "midstream":
+        state.end()
+        return _error_response(error)
+
+    await asyncio.sleep(state.latency())
+    completion_id = f"chatcmpl-stub-{uuid.uuid4().hex[:12]}"
+    created = int(time.time())
+
+    if not stream:
+        state.end(prompt_tokens, completion_tokens)
+        return {
+            "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text},
+                         "finish_reason": finish_reason}],
+            "usage": usage,
+        }
+
+    include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+    pieces = _CHUNK_PATTERN.findall(text)
+    cut_at = len(pieces) // 2 if error == "midstream" else None
+
+    async def events():
+        try:
+            yield _chunk(completion_id, created, model, {"role": "assistant", "content": ""})
+            for i, piece in enumerate(pieces):
+                if i == cut_at:
+                    return  # connection drops without [DONE]
+                if i:
+                    await asyncio.sleep(state.token_latency())
+                yield _chunk(completion_id, created, model, {"content": piece})
+            yield _chunk(completion_id, created, model, {}, finish_reason)
+            if include_usage:
+                payload = {"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                           "model": model, "choices": [], "usage": usage}
+                yield f"data: {json.dumps(payload)}\n\n"
+            yield "data: [DONE]\n\n"
+        finally:
+            state.end(prompt_tokens, completion_tokens if cut_at is None else 0)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.get("/v1/models")
+def list_models():
+    """List the models the stub pretends to serve."""
+    models = [m.strip() for m in state.config["models"].split(",") if m.strip()]
+    return {"object": "list", "data": [{"id": m, "object": "model", "created": 0, "owned_by": "stub"} for m in models]}
+
+
+@app.get("/stub/stats")
+def stub_stats():
+    """Counters since startup or the last reset."""
+    with state.lock:
+        stats = json.loads(json.dumps(state.counters))
+    stats["uptime_s"] = round(time.time() - stats.pop("started"), 3)
+    return stats
+
+
+@app.get("/stub/config")
+def get_stub_config():
+    """Current configuration."""
+    return state.config
+
+
+@app.post("/stub/config")
+async def set_stub_config(request: Request):
+    """
+        Update configuration at runtime, e.g. {"latency": "uniform:0.5:2", "errors": "429:0.2"}.
+
+        Returns 400 if a spec doesn't parse; the previous configuration stays active.
+        """
+    values = await request.json()
+    unknown = set(values) - set(state.config)
+    if unknown:
+        return JSONResponse(status_code=400, content={"error": f"Unknown keys: {sorted(unknown)}"})
+    try:
+        state.configure(values)
+    except (ValueError, OSError, KeyError, re.error) as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    return state.config
+
+
+@app.post("/stub/reset")
+def reset_stub():
+    """Reset counters."""
+    state.reset()
+    return {"ok": True}
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible stub server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", help="Latency spec for the response / first token.")
+    parser.add_argument("--token-latency", help="Latency spec between streamed chunks.")
+    parser.add_argument("--errors", help="Error injection spec, e.g. 429:0.05,timeout:0.01.")
+    parser.add_argument("--responses", help="JSON rules file with match/response templates.")
+    parser.add_argument("--seed", type=int, default=os.getenv("STUB_SEED"))
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(int(args.seed))
+    state.configure({
+        "latency": args.latency, "token_latency": args.token_latency,
+        "errors": args.errors, "responses": args.responses or state.config["responses"],
+    })
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,166 @@
+"""
+Recall/latency benchmark for the RAG FAISS index types.
+
+Builds every index type from `rag_utils.INDEX_TYPES` (except the legacy
+flat_l2) over the same vectors and compares it with exact inner-product
+search (flat_ip), which is the ground truth:
+
+    recall@k   share of the exact top-k found by the index, averaged over queries
+    build s    time to train + add all vectors
+    ms/query   single-query latency (p50 and p95), as the RAG endpoints search
+    MB         serialized index size
+
+HNSW is measured at several efSearch values and IVF-PQ (with its 8-bit
+re-ranking stage) at several nprobe values, so the output shows where each
+reaches the recall you need before setting RAG_HNSW_EF_SEARCH /
+RAG_IVF_NPROBE or the auto thresholds.
+
+Vectors come from an embedding store (default: the combined docs corpus) or
+from a synthetic set to see how the types behave at sizes the real
+corpora don't reach yet. Queries are corpus vectors with noise added, so they
+are near but not on indexed points.
+
+Usage:
+    python backend/rag/benchmark_ann.py
+    python backend/rag/benchmark_ann.py --synthetic 200000 --queries 500 -k 5
+    python backend/rag/benchmark_ann.py --store backend/rag/rag_tut_chunks_embedded
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from rag_utils import build_faiss_index, choose_index_type, load_embedding_store, normalize_embeddings
+
+RAG_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def synthetic_vectors(n, dim=384, latent_dim=32, seed=0):
+    """
+    Unit vectors on a noisy non-linear image of a low-dimensional space.
+
+    Sentence embeddings vary along far fewer directions than they have
+    dimensions; isotropic random vectors would make every neighbour almost
+    equally far and understate what the ANN indexes achieve on real text.
+    """
+    rng = np.random.default_rng(seed)
+    projection = rng.standard_normal((latent_dim, dim), dtype="float32")
+    points = np.tanh(rng.standard_normal((n, latent_dim), dtype="float32") @ projection)
+    return normalize_embeddings(points + 0.05 * rng.standard_normal((n, dim), dtype="float32"))
+
+
+def make_queries(vectors, n, noise=0.05, seed=1):
+    rng = np.random.default_rng(seed)
+    picks = vectors[rng.integers(0, len(vectors), n)]
+    return normalize_embeddings(picks + noise * rng.standard_normal(picks.shape, dtype="float32"))
+
+
+def recall_at_k(found, truth):
+    k = truth.shape[1]
+    return float(np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)]))
+
+
+def time_queries(index, queries, k):
+    """Search one query at a time; returns (indices, per-query latencies in ms)."""
+    found = np.empty((len(queries), k), dtype="int64")
+    latencies = []
+    for i, q in enumerate(queries):
+        started = time.perf_counter()
+        _, found[i] = index.search(q[None, :], k)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return found, np.array(latencies)
+
+
+def benchmark(vectors, queries, k, ef_search, nprobe):
+    """
+    Build and measure each index type.
+
+    Args:
+        vectors (numpy.ndarray): Corpus, float32 (n, dim).
+        queries (numpy.ndarray): Normalized query vectors.
+        k (int): Neighbours per query.
+        ef_search (list[int]): HNSW efSearch values to try.
+        nprobe (list[int]): IVF-PQ nprobe values to try.
+
+    Returns:
+        list[dict]: One row per index type and search setting.
+    """
+    import faiss
+
+    dim = vectors.shape[1]
+    rows = []
+    truth = None
+    for index_type in ("flat_ip", "hnsw", "ivfpq"):
+        if choose_index_type(len(vectors), index_type) != index_type:
+            continue
+        started = time.perf_counter()
+        index = build_faiss_index(None, dim, embeddings=vectors, index_type=index_type)
+        build_seconds = time.perf_counter() - started
+        size_mb = len(faiss.serialize_index(index)) / 1e6
+
+        if index_type == "hnsw":
+            settings = [("efSearch", v) for v in ef_search]
+        elif index_type == "ivfpq":
+            ivf = faiss.extract_index_ivf(index)
+            settings = [("nprobe", v) for v in nprobe if v <= ivf.nlist]
+        else:
+            settings = [(None, None)]
+
+        for param, value in settings:
+            if param == "efSearch":
+                index.hnsw.efSearch = value
+            elif param == "nprobe":
+                ivf.nprobe = value
+            found, latencies = time_queries(index, queries, k)
+            if truth is None:
+                truth = found
+            rows.append({
+                "type": index_type,
+                "setting": f"{param}={value}" if param else "exact",
+                f"recall@{k}": recall_at_k(found, truth),
+                "build s": build_seconds,
+                "p50 ms": float(np.percentile(latencies, 50)),
+                "p95 ms": float(np.percentile(latencies, 95)),
+                "MB": size_mb,
+            })
+    return rows
+
+
+def print_table(rows):
+    headers = list(rows[0])
+    print("  ".join(f"{h:>12}" for h in headers))
+    for row in rows:
+        print("  ".join(f"{v:>12.3f}" if isinstance(v, float) else f"{v:>12}" for v in row.values()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare RAG FAISS index types against exact search.")
+    parser.add_argument("--store", default=os.path.join(RAG_DIR, "combined_chunks_embedded"),
+                        help="Embedding store to index (ignored with --synthetic)")
+    parser.add_argument("--synthetic", type=int, metavar="N", help="Use N synthetic vectors instead")
+    parser.add_argument("--queries", type=int, default=200, help="Number of queries (default 200)")
+    parser.add_argument("-k", type=int, default=5, help="Neighbours per query (default 5, as the RAG endpoints)")
+    parser.add_argument("--ef-search", default="16,32,64,128", help="HNSW efSearch values to try")
+    parser.add_argument("--nprobe", default="16,64,256", help="IVF-PQ nprobe values to try")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        vectors = synthetic_vectors(args.synthetic)
+        source = f"{args.synthetic} synthetic vectors"
+    else:
+        embeddings, _ = load_embedding_store(args.store)
+        vectors = normalize_embeddings(embeddings)
+        source = f"{len(vectors)} vectors from {args.store}"
+
+    print(f"Benchmarking {source}, {args.queries} queries, k={args.k}")
+    print_table(benchmark(
+        vectors,
+        make_queries(vectors, args.queries),
+        args.k,
+        [int(v) for v in args.ef_search.split(",")],
+        [int(v) for v in args.nprobe.split(",")],
+    ))
+
+
+# python backend/rag/benchmark_ann.py
@@ -1,42 +1,243 @@
+"""
+Function-level chunking of the backend sources for the docs RAG corpus.
+
+Each Python file yields:
+
+    module chunk     module docstring + module-level constants (e.g. ALLOWED_GENRES)
+    function chunks  every def / async def, decorators included, named by its
+                     qualified name ("Class.method", "outer.inner")
+
+Chunk ids and filenames use the path relative to the scanned root
+("routers/metrics.py"), so same-named files in different packages
+(app/metrics.py and app/routers/metrics.py) don't collide.
+
+Files are parsed (asttokens) in a process pool and the chunks of each file are
+cached in CHUNK_CACHE_PATH. A file whose size and mtime are unchanged is not
+read again; one whose mtime changed but content did not (checkout, touch) is
+read and hashed but not re-parsed. `iter_python_chunks` yields chunks file by
+file, so they can be streamed into the embedding stage (`--embed`) instead of
+going through function_chunks.json.
+
+Configuration:
+    CHUNK_PROCESSES : Parser processes (default: CPU count; 1 parses in-process).
+
+Usage:
+    python backend/rag/chunk_by_function.py                       # -> function_chunks.json
+    python backend/rag/chunk_by_function.py --embed backend/rag/function_chunks_embedded
+"""
+import argparse
 import ast
-import asttokens
-import os
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
 import json
+import os
 
-def extract_functions_with_decorators(filepath):
-    with open(filepath, "r", encoding="utf-8") as f:
-        source = f.read()
+import asttokens
+
+RAG_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(os.path.dirname(RAG_DIR), "app")
+CHUNK_CACHE_PATH = os.path.join(RAG_DIR, "function_chunks.cache.json")
+CHUNK_PROCESSES = int(os.getenv("CHUNK_PROCESSES", str(os.cpu_count() or 1)))
+
+# Bump when the chunk layout changes so cached files are re-parsed
+CHUNKER_VERSION = 3
+# Below this many files to parse, pool startup costs more than it saves
+MIN_FILES_FOR_POOL = 8
 
+
+def _function_chunk(atok, node, qualname, filename, kind):
+    label = {"method": "Method", "async_function": "Async function"}.get(kind, "Function")
+    # get_text spans the decorators too
+    return {
+        "id": f"{filename}_{qualname}",
+        "filename": filename,
+        "function_name": qualname,
+        "kind": kind,
+        "lineno": node.lineno,
+        "text": f"## {label}: {qualname} ({filename})\n\n```python\n{atok.get_text(node)}\n```\n",
+    }
+
+
+def _module_chunk(atok, tree, filename):
+    """Docstring and UPPER_CASE assignments at module level, or None if there are neither."""
+    docstring = ast.get_docstring(tree)
+    constants = []
+    for node in tree.body:
+        targets = node.targets if isinstance(node, ast.Assign) else \
+            [node.target] if isinstance(node, ast.AnnAssign) else []
+        if any(isinstance(t, ast.Name) and t.id.isupper() for t in targets):
+            constants.append(atok.get_text(node))
+    if not docstring and not constants:
+        return None
+    text = f"## Module: {filename}\n\n"
+    if docstring:
+        text += f"{docstring}\n\n"
+    if constants:
+        text += "```python\n" + "\n".join(constants) + "\n```\n"
+    return {
+        "id": f"{filename}_module",
+        "filename": filename,
+        "function_name": "<module>",
+        "kind": "module",
+        "lineno": 1,
+        "text": text,
+    }
+
+
+def extract_chunks_from_source(source, filename):
+    """
+    Chunk one Python source.
+
+    Args:
+        source (str): File contents.
+        filename (str): Name used in chunk ids and headings; the path relative
+            to the scanned root, with "/" separators.
+
+    Returns:
+        list[dict]: Module chunk (if any) followed by function chunks in
+            source order; each has id, filename, function_name (qualified),
+            kind ("module", "function", "async_function" or "method"),
+            lineno and text.
+    """
     atok = asttokens.ASTTokens(source, parse=True)
-    tree = atok.tree
-
-    chunks = []
-    for node in ast.walk(tree):
-        if isinstance(node, ast.FunctionDef):
-            # Get full text span including decorators
-            func_text = atok.get_text(node)
-            func_name = node.name
-            md_text = f"## Function: {func_name} ({os.path.basename(filepath)})\n\n```python\n{func_text}\n```\n"
-            chunk = {
-                "id": f"{os.path.basename(filepath)}_{func_name}",
-                "filename": os.path.basename(filepath),
-                "function_name": func_name,
-                "text": md_text
-            }
-            chunks.append(chunk)
+    module_chunk = _module_chunk(atok, atok.tree, filename)
+    chunks = [module_chunk] if module_chunk else []
+
+    def visit(body, prefix, in_class):
+        for node in body:
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                qualname = f"{prefix}{node.name}"
+                kind = "method" if in_class else \
+                    "async_function" if isinstance(node, ast.AsyncFunctionDef) else "function"
+                chunks.append(_function_chunk(atok, node, qualname, filename, kind))
+                visit(node.body, f"{qualname}.", False)
+            elif isinstance(node, ast.ClassDef):
+                visit(node.body, f"{prefix}{node.name}.", True)
+            else:
+                # Defs under if/try/with blocks at this level
+                for field in ("body", "orelse", "finalbody", "handlers"):
+                    visit(getattr(node, field, []), prefix, in_class)
+
+    visit(atok.tree.body, "", False)
     return chunks
 
 
-def chunk_all_python_files(root_dir = "../app"):
-    all_chunks = []
-    for subdir, _, files in os.walk(root_dir):
-        for file in files:
+def _chunk_filename(path, root_dir):
+    """Path of a source file relative to root_dir, with "/" separators."""
+    return os.path.relpath(path, root_dir).replace(os.sep, "/")
+
+
+def extract_functions_with_decorators(filepath, root_dir=APP_DIR):
+    """Chunks of one file (see `extract_chunks_from_source`), named relative to root_dir."""
+    with open(filepath, "r", encoding="utf-8") as f:
+        return extract_chunks_from_source(f.read(), _chunk_filename(filepath, root_dir))
+
+
+def _parse(job):
+    """Pool worker: (path, source, filename) -> (path, chunks or None on a syntax error)."""
+    path, source, filename = job
+    try:
+        return path, extract_chunks_from_source(source, filename)
+    except SyntaxError as e:
+        print(f"Skipping {path}: {e}")
+        return path, None
+
+
+def _load_cache(cache_path):
+    if not cache_path or not os.path.exists(cache_path):
+        return {}
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data["files"] if data.get("version") == CHUNKER_VERSION else {}
+
+
+def _save_cache(cache_path, files):
+    tmp = cache_path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": CHUNKER_VERSION, "files": files}, f, ensure_ascii=False)
+    os.replace(tmp, cache_path)
+
+
+def _python_files(root_dir):
+    for subdir, dirs, files in os.walk(root_dir):
+        dirs[:] = sorted(d for d in dirs if d != "__pycache__")
+        for file in sorted(files):
             if file.endswith(".py"):
-                filepath = os.path.join(subdir, file)
-                # chunks = extract_functions_from_file(filepath)
-                chunks = extract_functions_with_decorators(filepath)
-                all_chunks.extend(chunks)
-    return all_chunks
+                yield os.path.join(subdir, file)
+
+
+def iter_python_chunks(root_dir=APP_DIR, processes=CHUNK_PROCESSES, cache_path=CHUNK_CACHE_PATH):
+    """
+    Yield the chunks of every Python file under a directory, file by file.
+
+    Unchanged files come from the cache; the rest are parsed, in a process
+    pool when there are enough of them. Files are yielded in path order
+    either way. The cache is written once the iteration completes.
+
+    Args:
+        root_dir (str): Directory scanned recursively.
+        processes (int): Parser processes; 1 parses in-process.
+        cache_path (str | None): Per-file chunk cache; None disables it.
+
+    Yields:
+        tuple[str, dict]: Path of the source file and one of its chunks.
+    """
+    cached = _load_cache(cache_path)
+    files = {}
+    results = {}
+    to_parse = []
+    for path in _python_files(root_dir):
+        key = os.path.relpath(path, root_dir)
+        stat = os.stat(path)
+        entry = cached.get(key)
+        if entry and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+            files[key] = entry
+            results[path] = entry["chunks"]
+            continue
+        with open(path, "rb") as f:
+            raw = f.read()
+        sha = hashlib.sha256(raw).hexdigest()
+        if entry and entry["sha256"] == sha:
+            files[key] = {**entry, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+            results[path] = entry["chunks"]
+            continue
+        files[key] = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "sha256": sha}
+        results[path] = None
+        to_parse.append((path, raw.decode("utf-8"), _chunk_filename(path, root_dir)))
+
+    n_files = len(results)
+    pool = ProcessPoolExecutor(max_workers=processes) \
+        if processes > 1 and len(to_parse) >= MIN_FILES_FOR_POOL else None
+    parsed = pool.map(_parse, to_parse, chunksize=4) if pool else map(_parse, to_parse)
+    try:
+        for path in list(results):
+            chunks = results.pop(path)
+            if chunks is None:
+                # Parsed files come back in submission order, which is path order
+                _, chunks = next(parsed)
+                key = os.path.relpath(path, root_dir)
+                if chunks is None:
+                    del files[key]
+                    continue
+                files[key]["chunks"] = chunks
+            for chunk in chunks:
+                yield path, dict(chunk)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    if cache_path:
+        _save_cache(cache_path, files)
+    if to_parse:
+        print(f"Parsed {len(to_parse)} of {n_files} Python files ({n_files - len(to_parse)} cached)")
+
+
+def chunk_all_python_files(root_dir=APP_DIR, processes=CHUNK_PROCESSES, cache_path=CHUNK_CACHE_PATH):
+    """All chunks of `iter_python_chunks` as a list."""
+    return [chunk for _, chunk in iter_python_chunks(root_dir, processes, cache_path)]
+
 
 def save_chunks(chunks, out_json="backend/rag/function_chunks.json"):
     os.makedirs(os.path.dirname(out_json), exist_ok=True)  # create folder if needed
@@ -44,6 +245,39 @@ def save_chunks(chunks, out_json="backend/rag/function_chunks.json"):
         json.dump(chunks, f, indent=2, ensure_ascii=False)
     print(f"Saved {len(chunks)} function chunks to {out_json}")
 
+
+def embed_python_chunks(root_dir, store_out, processes=CHUNK_PROCESSES, cache_path=CHUNK_CACHE_PATH):
+    """
+    Chunk and embed in one pass, without an intermediate chunks file.
+
+    Chunks flow from the parser into `embed_chunk_stream` batch by batch and
+    each embedded batch is written to the store before the next is encoded.
+
+    Returns:
+        int: Number of chunks embedded.
+    """
+    from rag_utils import embed_chunk_stream, save_embedding_store_stream
+
+    chunks = (chunk for _, chunk in iter_python_chunks(root_dir, processes, cache_path))
+    return save_embedding_store_stream(embed_chunk_stream(chunks), store_out)
+
+
 if __name__ == "__main__":
-    chunks = chunk_all_python_files()
-    save_chunks(chunks)
+    parser = argparse.ArgumentParser(description="Chunk Python sources by function for RAG.")
+    parser.add_argument("--root", default=APP_DIR, help="Source directory (default: backend/app)")
+    parser.add_argument("--output", default="backend/rag/function_chunks.json", help="Chunks JSON to write")
+    parser.add_argument("--embed", metavar="STORE",
+                        help="Embed straight into this embedding store instead of writing --output")
+    parser.add_argument("--processes", type=int, default=CHUNK_PROCESSES, help="Parser processes (1 = in-process)")
+    parser.add_argument("--no-cache", action="store_true", help="Re-parse every file")
+    args = parser.parse_args()
+
+    cache_path = None if args.no_cache else CHUNK_CACHE_PATH
+    if args.embed:
+        count = embed_python_chunks(args.root, args.embed, args.processes, cache_path)
+        print(f"Embedded {count} function chunks into {args.embed}")
+    else:
+        save_chunks(chunk_all_python_files(args.root, args.processes, cache_path), args.output)
+
+
+# python backend/rag/chunk_by_function.py --embed backend/rag/function_chunks_embedded
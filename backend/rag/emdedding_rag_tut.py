@@ -1,29 +1,26 @@
 from dotenv import load_dotenv
 load_dotenv()
 
-import time
 import argparse
-from rag_utils import load_chunks, save_chunks, embed_text
+from rag_utils import EMBED_BATCH_SIZE, EMBED_PROCESSES, embed_chunks_file
 
 
-def embed_all_chunks(json_in, json_out):
-    chunks = load_chunks(json_in)
-    for i, chunk in enumerate(chunks):
-        print(f"Embedding chunk {i+1}/{len(chunks)}: {chunk['id']}")
-        chunk["embedding"] = embed_text(chunk["text"])
-        time.sleep(0.5)
-    save_chunks(chunks, json_out)
-    print(f"All chunks embedded and saved to {json_out}")
+def embed_all_chunks(json_in, json_out, batch_size=EMBED_BATCH_SIZE, processes=EMBED_PROCESSES):
+    # Local model: batch the encode calls, no API rate limit to sleep for
+    count = embed_chunks_file(json_in, json_out, batch_size=batch_size, processes=processes)
+    print(f"All {count} chunks embedded and saved to {json_out}")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--input", default="backend/rag/rag_tut_chunks.json", help="Input chunks JSON file")
-    parser.add_argument("--output", default="backend/rag/rag_tut_chunks_embedded.json", help="Output embedded chunks JSON file")
+    parser.add_argument("--output", default="backend/rag/rag_tut_chunks_embedded", help="Output embedding store (.npy matrix + .meta.json)")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE, help="Texts per encode call")
+    parser.add_argument("--processes", type=int, default=EMBED_PROCESSES, help="CPU worker processes (1 = in-process)")
     args = parser.parse_args()
 
-    embed_all_chunks(args.input, args.output)
+    embed_all_chunks(args.input, args.output, args.batch_size, args.processes)
 
 
 # python backend/rag/embedding.py
 
-# python backend/rag/embedding.py --input backend/rag/rag_tut_chunks.json --output backend/rag/rag_tut_chunks_embedded.json
\ No newline at end of file
+# python backend/rag/embedding.py --input backend/rag/rag_tut_chunks.json --output backend/rag/rag_tut_chunks_embedded
\ No newline at end of file
@@ -0,0 +1,180 @@
+"""
+Incremental RAG indexing keyed by chunk content hash.
+
+Replaces the chunking → embedding.py → merge_and_index.py rebuild for routine
+doc edits. Each chunk gets a stable key (corpus file + section, or file +
+function name) and a SHA-256 of its text. A run compares them with the keys and
+hashes stored in the corpus metadata file and only touches what changed:
+
+    new chunk      -> embedded and added
+    changed chunk  -> old vector removed, re-embedded, added under the same id
+    deleted chunk  -> vector removed
+    unchanged      -> left alone (not re-embedded)
+
+Vectors live in a FAISS IndexIDMap2 whose ids are derived from the chunk key,
+so add/remove works in place and the metadata file maps ids back to chunks
+(`load_metadata` returns it keyed by FAISS id). An index without that layout
+(built by indexing.py or merge_and_index.py, or an older L2 one) is rebuilt
+once on the first run. The wrapped index is always exact inner-product search
+(flat_ip): HNSW and refined IVF-PQ cannot remove vectors, so those types
+(`rag_utils.choose_index_type`) come from a full build with merge_and_index.py.
+The BM25 lexical index next to the metadata (lexical_index.py) is rebuilt
+from the metadata whenever the corpus changed; it takes well under a second.
+
+Usage:
+    python backend/rag/incremental_index.py                 # both corpora
+    python backend/rag/incremental_index.py --corpus tut
+    python backend/rag/incremental_index.py --full          # force a rebuild
+"""
+import argparse
+import hashlib
+import os
+
+import numpy as np
+
+from chunk_by_function import iter_python_chunks
+from chunking import process_files
+from lexical_index import build_lexical_file, lexical_path
+from rag_utils import (
+    embed_texts,
+    is_inner_product,
+    load_faiss_index,
+    load_metadata,
+    new_faiss_index,
+    save_faiss,
+    save_metadata,
+)
+
+RAG_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(os.path.dirname(RAG_DIR), "app")
+EMBEDDING_DIM = 384
+
+
+def _doc_chunks(root, prefix):
+    chunks = []
+    for c in process_files(root):
+        key = f"{prefix}:{c['filename']}#{c['chunk_index']}"
+        chunks.append({**c, "id": key, "key": key, "type": "doc"})
+    return chunks
+
+
+def _function_chunks(root):
+    chunks = []
+    seen = {}
+    for path, c in iter_python_chunks(root):
+        key = f"func:{os.path.relpath(path, root)}:{c['function_name']}"
+        # Redefinitions under the same qualified name (e.g. in if/else branches) get a counter
+        seen[key] = seen.get(key, 0) + 1
+        if seen[key] > 1:
+            key = f"{key}#{seen[key]}"
+        chunks.append({**c, "id": key, "key": key, "type": "function"})
+    return chunks
+
+
+CORPORA = {
+    "docs": {
+        "collect": lambda: _doc_chunks(os.path.join(RAG_DIR, "rag_docs"), "doc") + _function_chunks(APP_DIR),
+        "index": os.path.join(RAG_DIR, "rag_docs", "combined_faiss.index"),
+        "metadata": os.path.join(RAG_DIR, "rag_docs", "combined_metadata.json"),
+    },
+    "tut": {
+        "collect": lambda: _doc_chunks(os.path.join(RAG_DIR, "rag_tut"), "tut"),
+        "index": os.path.join(RAG_DIR, "rag_tut", "rag_tut_faiss.index"),
+        "metadata": os.path.join(RAG_DIR, "rag_tut", "rag_tut_metadata.json"),
+    },
+}
+
+
+def content_hash(text):
+    """SHA-256 hex digest of a chunk's text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def faiss_id(key):
+    """Stable non-negative int64 FAISS id for a chunk key."""
+    return int.from_bytes(hashlib.sha256(key.encode("utf-8")).digest()[:8], "big") & ((1 << 63) - 1)
+
+
+def _load_existing(index_path, metadata_path):
+    """Return (index, {key: metadata}) when both files use the incremental layout, else (None, {})."""
+    import faiss
+
+    if not (os.path.exists(index_path) and os.path.exists(metadata_path)):
+        return None, {}
+    index = load_faiss_index(index_path)
+    entries = list(load_metadata(metadata_path).values())
+    if not isinstance(index, faiss.IndexIDMap2) or not is_inner_product(index) \
+            or not all("content_hash" in e for e in entries):
+        return None, {}
+    return index, {e["key"]: e for e in entries}
+
+
+def update_corpus(name, full=False):
+    """
+    Bring one corpus index in line with its sources.
+
+    Args:
+        name (str): Key of CORPORA ("docs" or "tut").
+        full (bool): Ignore the stored index and rebuild everything.
+
+    Returns:
+        dict: Counts of added, changed, removed and unchanged chunks.
+    """
+    import faiss
+
+    corpus = CORPORA[name]
+    chunks = corpus["collect"]()
+    index, previous = (None, {}) if full else _load_existing(corpus["index"], corpus["metadata"])
+    if index is None:
+        index = faiss.IndexIDMap2(new_faiss_index("flat_ip", EMBEDDING_DIM, len(chunks)))
+        previous = {}
+
+    stats = {"added": 0, "changed": 0, "removed": 0, "unchanged": 0}
+    to_embed = []
+    stale_ids = []
+    for chunk in chunks:
+        chunk["content_hash"] = content_hash(chunk["text"])
+        chunk["faiss_id"] = faiss_id(chunk["key"])
+        old = previous.get(chunk["key"])
+        if old is None:
+            stats["added"] += 1
+            to_embed.append(chunk)
+        elif old["content_hash"] != chunk["content_hash"]:
+            stats["changed"] += 1
+            stale_ids.append(chunk["faiss_id"])
+            to_embed.append(chunk)
+        else:
+            stats["unchanged"] += 1
+
+    current_keys = {c["key"] for c in chunks}
+    for key, old in previous.items():
+        if key not in current_keys:
+            stats["removed"] += 1
+            stale_ids.append(old["faiss_id"])
+
+    if stale_ids:
+        index.remove_ids(np.array(stale_ids, dtype="int64"))
+    if to_embed:
+        embeddings = embed_texts([c["text"] for c in to_embed])
+        index.add_with_ids(embeddings, np.array([c["faiss_id"] for c in to_embed], dtype="int64"))
+
+    if to_embed or stale_ids or not previous or not os.path.exists(lexical_path(corpus["metadata"])):
+        save_faiss(index, corpus["index"])
+        save_metadata(chunks, corpus["metadata"])
+        build_lexical_file(load_metadata(corpus["metadata"]), corpus["metadata"])
+    print(f"[{name}] {stats} -> {index.ntotal} vectors in {corpus['index']}")
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incrementally update the RAG FAISS indexes.")
+    parser.add_argument("--corpus", choices=sorted(CORPORA), action="append",
+                        help="Corpus to update (repeatable; default: all)")
+    parser.add_argument("--full", action="store_true", help="Rebuild from scratch instead of diffing")
+    args = parser.parse_args()
+
+    for corpus_name in args.corpus or sorted(CORPORA):
+        update_corpus(corpus_name, full=args.full)
+
+
+# python backend/rag/incremental_index.py
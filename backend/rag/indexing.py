@@ -1,8 +1,8 @@
-from rag_utils import load_chunks, build_faiss_index, save_faiss, save_metadata
+from rag_utils import load_embedding_store, build_faiss_index, save_faiss, save_metadata
 
-def create_index(json_embedded="backend/rag/rag_chunks_embedded.json"):
-    chunks = load_chunks(json_embedded)
-    index = build_faiss_index(chunks)
+def create_index(store="backend/rag/rag_chunks_embedded"):
+    embeddings, chunks = load_embedding_store(store)
+    index = build_faiss_index(chunks, embeddings=embeddings)
     save_faiss(index, "backend/rag/rag_faiss.index")
     save_metadata(chunks, "backend/rag/rag_metadata.json")
     print("FAISS index and metadata saved.")
@@ -1,11 +1,13 @@
-from rag_utils import load_chunks, build_faiss_index, save_faiss, save_metadata
+from lexical_index import build_lexical_file
+from rag_utils import load_embedding_store, build_faiss_index, save_faiss, save_metadata, load_metadata
 
-def create_index(json_embedded="backend/rag/rag_tut_chunks_embedded.json"):
-    chunks = load_chunks(json_embedded)
-    index = build_faiss_index(chunks)
+def create_index(store="backend/rag/rag_tut_chunks_embedded"):
+    embeddings, chunks = load_embedding_store(store)
+    index = build_faiss_index(chunks, embeddings=embeddings)
     save_faiss(index, "backend/rag/rag_tut/rag_tut_faiss.index")
     save_metadata(chunks, "backend/rag/rag_tut/rag_tut_metadata.json")
-    print("FAISS index and metadata saved.")
+    build_lexical_file(load_metadata("backend/rag/rag_tut/rag_tut_metadata.json"), "backend/rag/rag_tut/rag_tut_metadata.json")
+    print("FAISS index, metadata and lexical index saved.")
 
 if __name__ == "__main__":
     create_index()
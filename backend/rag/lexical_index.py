@@ -0,0 +1,232 @@
+"""
+BM25 lexical index for the RAG corpora, fused with FAISS results.
+
+MiniLM embeddings match meaning, not spelling: a question about
+`compute_loudest_section_lufs` or `ALLOWED_GENRES` often retrieves chunks that
+are merely "about loudness" or "about genres". A small in-process inverted
+index scores exact identifier hits, and reciprocal-rank fusion (RRF) merges
+both rankings so a chunk ranked high by either retriever makes the cut:
+
+    score(chunk) = sum over rankings of 1 / (RRF_K + rank)
+
+Tokenization is code-aware: every identifier is indexed whole
+("compute_loudest_section_lufs") and split into its snake_case / camelCase
+parts ("compute", "loudest", ...), lowercased.
+
+The index is keyed like the metadata file (`load_metadata` keys: FAISS id, or
+position for older indexes) and stored next to it as `*_lexical.json` by
+indexing_rag_tut.py, merge_and_index.py and incremental_index.py, together
+with the SHA-1 of the metadata file it was built from (`is_current_for`). It has no
+dependencies beyond numpy, so both the indexing scripts and the API import it.
+
+Usage (rebuild from an existing metadata file without re-embedding):
+    python backend/rag/lexical_index.py backend/rag/rag_docs/combined_metadata.json
+"""
+from collections import Counter, defaultdict
+import hashlib
+import json
+import math
+import os
+import re
+import sys
+
+import numpy as np
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+RRF_K = 60
+
+_WORD = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\d+(?:\.\d+)?")
+_PARTS = re.compile(r"_+|(?<=[a-z0-9])(?=[A-Z])")
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it its me my of on or so that the "
+    "this to was we what when where which who why will with you your".split()
+)
+
+
+def tokenize(text):
+    """
+    Split text into lowercase terms, keeping identifiers whole and split.
+
+    Args:
+        text (str): Markdown, code or a question.
+
+    Returns:
+        list[str]: Terms (repeats kept for term frequency), stopwords removed.
+    """
+    terms = []
+    for word in _WORD.findall(text):
+        lower = word.lower()
+        if lower not in _STOPWORDS:
+            terms.append(lower)
+        parts = [p.lower() for p in _PARTS.split(word) if p]
+        if len(parts) > 1:
+            terms.extend(p for p in parts if p not in _STOPWORDS)
+    return terms
+
+
+class LexicalIndex:
+    """
+    Okapi BM25 over an inverted index of chunk texts.
+
+    Per-posting BM25 weights are computed once at load, so a query costs one
+    vector add per query term that occurs in the corpus.
+
+    Args:
+        doc_ids (list[int]): Chunk keys, as in the metadata dict.
+        postings (dict[str, list[list[int]]]): term -> [[doc position, term frequency], ...].
+        doc_lens (list[int]): Terms per chunk, aligned with `doc_ids`.
+        source (str, optional): SHA-1 of the metadata file the index was built from.
+    """
+
+    def __init__(self, doc_ids, postings, doc_lens, k1=BM25_K1, b=BM25_B, source=None):
+        self.doc_ids = np.asarray(doc_ids, dtype="int64")
+        self.source = source
+        self.postings = postings
+        self.doc_lens = [int(n) for n in doc_lens]
+        self.k1 = k1
+        self.b = b
+        lens = np.asarray(doc_lens, dtype="float32")
+        avg_len = float(lens.mean()) if len(lens) else 0.0
+        n_docs = len(self.doc_ids)
+        self._weights = {}
+        for term, entries in postings.items():
+            positions = np.array([p for p, _ in entries], dtype="int64")
+            tf = np.array([t for _, t in entries], dtype="float32")
+            idf = math.log(1 + (n_docs - len(entries) + 0.5) / (len(entries) + 0.5))
+            norm = k1 * (1 - b + b * lens[positions] / max(avg_len, 1e-9))
+            self._weights[term] = (positions, idf * tf * (k1 + 1) / (tf + norm))
+
+    @classmethod
+    def from_metadata(cls, metadata, source=None):
+        """
+        Build the index from chunk metadata.
+
+        Args:
+            metadata (dict[int, dict]): As returned by `load_metadata`; each
+                entry's "filename" and "text" are indexed.
+            source (str, optional): `file_sha1` of the metadata file.
+
+        Returns:
+            LexicalIndex: Index over all chunks.
+        """
+        doc_ids, doc_lens = [], []
+        postings = defaultdict(list)
+        for position, (doc_id, entry) in enumerate(metadata.items()):
+            terms = tokenize(f"{entry.get('filename', '')} {entry.get('text', '')}")
+            doc_ids.append(int(doc_id))
+            doc_lens.append(len(terms))
+            for term, tf in Counter(terms).items():
+                postings[term].append([position, tf])
+        return cls(doc_ids, dict(postings), doc_lens, source=source)
+
+    def is_current_for(self, metadata_path):
+        """True if the index was built from the metadata file as it is now."""
+        return self.source is not None and self.source == file_sha1(metadata_path)
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def search(self, query, top_k=20):
+        """
+        Rank chunks by BM25 score for a query.
+
+        Args:
+            query (str): Question text.
+            top_k (int): Most results to return.
+
+        Returns:
+            list[int]: Chunk keys with a positive score, best first.
+        """
+        scores = np.zeros(len(self.doc_ids), dtype="float32")
+        for term in set(tokenize(query)):
+            weights = self._weights.get(term)
+            if weights is not None:
+                scores[weights[0]] += weights[1]
+        hits = np.flatnonzero(scores)
+        if not len(hits):
+            return []
+        best = hits[np.argsort(-scores[hits], kind="stable")[:top_k]]
+        return [int(i) for i in self.doc_ids[best]]
+
+    def save(self, path):
+        """Write the index as JSON (source hash, doc ids, lengths, postings)."""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                "k1": self.k1,
+                "b": self.b,
+                "source": self.source,
+                "doc_ids": [int(i) for i in self.doc_ids],
+                "doc_lens": self.doc_lens,
+                "postings": self.postings,
+            }, f)
+        print(f"Saved lexical index ({len(self.doc_ids)} chunks, {len(self.postings)} terms) to {path}")
+
+    @classmethod
+    def load(cls, path):
+        """Read an index written by `save`."""
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["doc_ids"], data["postings"], data["doc_lens"],
+                   data.get("k1", BM25_K1), data.get("b", BM25_B), data.get("source"))
+
+
+def file_sha1(path):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def lexical_path(metadata_path):
+    """`*_metadata.json` -> `*_lexical.json` next to it."""
+    base = metadata_path[:-len("_metadata.json")] if metadata_path.endswith("_metadata.json") \
+        else os.path.splitext(metadata_path)[0]
+    return base + "_lexical.json"
+
+
+def build_lexical_file(metadata, metadata_path):
+    """
+    Build and save the lexical index for a metadata file.
+
+    Args:
+        metadata (dict[int, dict]): Chunk metadata keyed as in `load_metadata`.
+        metadata_path (str): The metadata file the index belongs to.
+
+    Returns:
+        LexicalIndex: The saved index.
+    """
+    index = LexicalIndex.from_metadata(metadata, source=file_sha1(metadata_path))
+    index.save(lexical_path(metadata_path))
+    return index
+
+
+def reciprocal_rank_fusion(rankings, top_k, k=RRF_K):
+    """
+    Merge several best-first rankings of chunk keys.
+
+    Args:
+        rankings (list[list[int]]): One ranking per retriever; -1 entries
+            (FAISS padding) are skipped.
+        top_k (int): Number of fused results.
+        k (int): RRF damping constant; larger flattens rank differences.
+
+    Returns:
+        list[int]: Fused chunk keys, best first.
+    """
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            if doc_id >= 0:
+                scores[doc_id] += 1.0 / (k + rank + 1)
+    return sorted(scores, key=lambda d: -scores[d])[:top_k]
+
+
+if __name__ == "__main__":
+    from rag_utils import load_metadata
+
+    if len(sys.argv) < 2:
+        sys.exit("usage: lexical_index.py METADATA_JSON [METADATA_JSON ...]")
+    for path in sys.argv[1:]:
+        build_lexical_file(load_metadata(path), path)
+
+
+# python backend/rag/lexical_index.py backend/rag/rag_docs/combined_metadata.json backend/rag/rag_tut/rag_tut_metadata.json
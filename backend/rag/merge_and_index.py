@@ -1,21 +1,11 @@
 # merge_and_index.py
-import json
-import os
-from rag_utils import load_chunks, build_faiss_index, save_faiss, save_metadata
+import numpy as np
+from lexical_index import build_lexical_file
+from rag_utils import load_embedding_store, save_embedding_store, build_faiss_index, save_faiss, save_metadata, load_metadata
 
-def load_chunks_file(file_path):
-    with open(file_path, "r", encoding="utf-8") as f:
-        return json.load(f)
-
-def save_chunks_file(chunks, out_path):
-    os.makedirs(os.path.dirname(out_path), exist_ok=True)
-    with open(out_path, "w", encoding="utf-8") as f:
-        json.dump(chunks, f, indent=2, ensure_ascii=False)
-    print(f"Saved {len(chunks)} chunks to {out_path}")
-
-def merge_chunks(file1, file2, out_file):
-    chunks1 = load_chunks_file(file1)
-    chunks2 = load_chunks_file(file2)
+def merge_chunks(store1, store2, out_store):
+    embeddings1, chunks1 = load_embedding_store(store1)
+    embeddings2, chunks2 = load_embedding_store(store2)
 
     # Prefix IDs and add type to avoid collision and mark chunk origin
     for c in chunks1:
@@ -26,20 +16,22 @@ def merge_chunks(file1, file2, out_file):
         c["type"] = "function"
 
     merged = chunks1 + chunks2
-    save_chunks_file(merged, out_file)
+    save_embedding_store(merged, out_store, embeddings=np.concatenate([embeddings1, embeddings2]))
+    print(f"Saved {len(merged)} chunks to {out_store}")
 
-def create_combined_index(merged_json, index_path, metadata_path):
-    chunks = load_chunks(merged_json)
-    index = build_faiss_index(chunks)
+def create_combined_index(merged_store, index_path, metadata_path):
+    embeddings, chunks = load_embedding_store(merged_store)
+    index = build_faiss_index(chunks, embeddings=embeddings)
     save_faiss(index, index_path)
     save_metadata(chunks, metadata_path)
+    build_lexical_file(load_metadata(metadata_path), metadata_path)
     print(f"Combined FAISS index saved to {index_path}")
     print(f"Combined metadata saved to {metadata_path}")
 
 if __name__ == "__main__":
-    file1 = "backend/rag/rag_chunks_embedded.json"
-    file2 = "backend/rag/function_chunks_embedded.json"
-    merged_out = "backend/rag/combined_chunks_embedded.json"
+    file1 = "backend/rag/rag_chunks_embedded"
+    file2 = "backend/rag/function_chunks_embedded"
+    merged_out = "backend/rag/combined_chunks_embedded"
     faiss_out = "backend/rag/combined_faiss.index"
     metadata_out = "backend/rag/combined_metadata.json"
 
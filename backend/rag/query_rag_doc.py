@@ -69,7 +69,7 @@ def main():
 
         query_emb = embed_query(query)
         indices, _ = search_index(index, query_emb, top_k=3)
-        retrieved = [metadata[i] for i in indices]
+        retrieved = [metadata[i] for i in indices if i in metadata]
 
         prompt = build_prompt(query, retrieved)
         answer = generate_answer(prompt)
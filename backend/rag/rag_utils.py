@@ -3,8 +3,16 @@ RAG (Retrieval-Augmented Generation) utilities for ZoundZcope.
 
 This module provides helper functions for:
     - Splitting markdown content into manageable chunks.
-    - Creating and saving embeddings for text chunks.
-    - Building, saving, and loading FAISS vector indexes.
+    - Creating and saving embeddings for text chunks (batched, optionally
+      across a multi-process CPU pool, written out incrementally).
+    - Storing embeddings as a float32 `.npy` matrix (memory-mappable) plus a
+      `.meta.json` table instead of JSON float lists; legacy
+      `*_embedded.json` files are still read.
+    - Building, saving, and loading FAISS vector indexes. Embeddings are
+      L2-normalized so inner product is cosine similarity; the index type
+      (exact flat, HNSW graph, or compressed IVF-PQ) is picked from the
+      corpus size unless RAG_INDEX_TYPE forces one. benchmark_ann.py
+      measures each type's recall@k against the exact search.
     - Managing associated metadata for chunk retrieval.
     - Performing semantic search queries against FAISS indexes.
 
@@ -13,15 +21,46 @@ Dependencies:
     - FAISS for vector indexing and similarity search.
     - numpy for numerical operations.
     - json/os/re for file and text processing.
+
+Configuration:
+    EMBED_BATCH_SIZE : Texts per `SentenceTransformer.encode` call (default 64).
+    EMBED_PROCESSES  : CPU worker processes for corpus embedding; 1 encodes
+                       in-process (default 1).
+    RAG_INDEX_TYPE   : "auto" (default), "flat_ip", "hnsw", "ivfpq", or
+                       "flat_l2" (the previous unnormalized exact index).
+    RAG_HNSW_MIN_VECTORS  : Corpus size from which "auto" uses HNSW (default 20000).
+    RAG_IVFPQ_MIN_VECTORS : Corpus size from which "auto" uses IVF-PQ (default 500000).
+    RAG_HNSW_M, RAG_HNSW_EF_SEARCH : HNSW graph degree and search breadth (32, 64).
+    RAG_IVF_NPROBE   : IVF lists scanned per query (default 64).
+    RAG_IVF_REFINE   : IVF-PQ candidates per result re-ranked with 8-bit
+                       vectors (default 16).
 """
 import os
 import json
 import re
+import shutil
 import numpy as np
 from openai import OpenAI
 from sentence_transformers import SentenceTransformer
 import numpy as np
 
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+EMBED_PROCESSES = int(os.getenv("EMBED_PROCESSES", "1"))
+
+INDEX_TYPES = ("flat_l2", "flat_ip", "hnsw", "ivfpq")
+RAG_INDEX_TYPE = os.getenv("RAG_INDEX_TYPE", "auto")
+RAG_HNSW_MIN_VECTORS = int(os.getenv("RAG_HNSW_MIN_VECTORS", "20000"))
+RAG_IVFPQ_MIN_VECTORS = int(os.getenv("RAG_IVFPQ_MIN_VECTORS", "500000"))
+RAG_HNSW_M = int(os.getenv("RAG_HNSW_M", "32"))
+RAG_HNSW_EF_SEARCH = int(os.getenv("RAG_HNSW_EF_SEARCH", "64"))
+RAG_IVF_NPROBE = int(os.getenv("RAG_IVF_NPROBE", "64"))
+RAG_IVF_REFINE = int(os.getenv("RAG_IVF_REFINE", "16"))
+# PQ trains 256 centroids per sub-quantizer (~39 points each); smaller corpora fall back to flat_ip
+IVFPQ_MIN_TRAIN = 10000
+
+# Metadata fields written by incremental_index.py and kept by save_metadata
+INCREMENTAL_FIELDS = ("key", "content_hash", "faiss_id")
+
 # Load the model once globally to avoid reloading every call
 _model = None
 
@@ -135,6 +174,217 @@ def embed_text(text):
     return embedding.tolist()
 
 
+def embed_texts(texts, batch_size=EMBED_BATCH_SIZE, pool=None):
+    """
+    Embed many texts with batched model calls.
+
+    Args:
+        texts (list[str]): Texts to embed.
+        batch_size (int, optional): Texts per forward pass.
+        pool (dict, optional): Pool from `SentenceTransformer.start_multi_process_pool`;
+            the batches are then spread over its worker processes.
+
+    Returns:
+        numpy.ndarray: float32 array of shape (len(texts), dim), unit length rows.
+    """
+    model = get_embedding_model()
+    if pool is not None:
+        embeddings = model.encode_multi_process(texts, pool, batch_size=batch_size)
+    else:
+        embeddings = model.encode(texts, batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False)
+    return normalize_embeddings(embeddings)
+
+
+def _batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def embed_chunk_stream(chunks, batch_size=EMBED_BATCH_SIZE, processes=EMBED_PROCESSES):
+    """
+    Embed chunk dicts lazily, one batch at a time.
+
+    Chunks are consumed from any iterable and yielded back with an
+    "embedding" (float32 vector) as soon as their batch is encoded, so callers
+    can write results out while later batches are still being computed.
+
+    Args:
+        chunks (Iterable[dict]): Chunk dicts with a "text" key.
+        batch_size (int, optional): Texts per forward pass.
+        processes (int, optional): CPU worker processes; 1 encodes in-process.
+
+    Yields:
+        dict: Each input chunk with its "embedding" set.
+    """
+    model = get_embedding_model()
+    pool = model.start_multi_process_pool(["cpu"] * processes) if processes > 1 else None
+    # Keep every worker busy: one multi-process call covers `processes` batches
+    group_size = batch_size * max(processes, 1)
+    try:
+        for group in _batches(chunks, group_size):
+            embeddings = embed_texts([c["text"] for c in group], batch_size=batch_size, pool=pool)
+            for chunk, embedding in zip(group, embeddings):
+                chunk["embedding"] = embedding
+                yield chunk
+    finally:
+        if pool is not None:
+            model.stop_multi_process_pool(pool)
+
+
+def embed_chunks_file(json_in, store_out, batch_size=EMBED_BATCH_SIZE, processes=EMBED_PROCESSES):
+    """
+    Embed every chunk of a chunks JSON file into an embedding store.
+
+    Args:
+        json_in (str): Input chunks JSON (list of dicts with "text").
+        store_out (str): Output store path (see `save_embedding_store`).
+        batch_size (int, optional): Texts per forward pass.
+        processes (int, optional): CPU worker processes; 1 encodes in-process.
+
+    Returns:
+        int: Number of chunks embedded.
+    """
+    chunks = load_chunks(json_in)
+    total = len(chunks)
+
+    def progress(stream):
+        for i, chunk in enumerate(stream, 1):
+            if i % batch_size == 0 or i == total:
+                print(f"Embedded {i}/{total} chunks")
+            yield chunk
+
+    return save_embedding_store_stream(progress(embed_chunk_stream(chunks, batch_size, processes)), store_out, total)
+
+
+def _store_paths(path):
+    """Map a store path given with or without extension to its (.npy, .meta.json) pair."""
+    base = re.sub(r"(\.meta)?\.(json|npy)$", "", path)
+    return base + ".npy", base + ".meta.json"
+
+
+def save_embedding_store(chunks, path, embeddings=None):
+    """
+    Save embedded chunks as a float32 matrix plus a metadata table.
+
+    Writes `<base>.npy` (one row per chunk) and `<base>.meta.json` (the chunk
+    dicts without their embeddings, in row order). Loading the matrix needs
+    no float parsing and can be memory-mapped.
+
+    Args:
+        chunks (list[dict]): Chunk dicts; their "embedding" key is used when
+            `embeddings` isn't given and is never written to the metadata.
+        path (str): Store path, with or without extension
+            (e.g. "rag_chunks_embedded" or "rag_chunks_embedded.json").
+        embeddings (numpy.ndarray, optional): Matrix aligned with `chunks`.
+    """
+    npy_path, meta_path = _store_paths(path)
+    if embeddings is None:
+        embeddings = np.array([c["embedding"] for c in chunks], dtype="float32")
+    np.save(npy_path, np.asarray(embeddings, dtype="float32"))
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump([{k: v for k, v in c.items() if k != "embedding"} for c in chunks], f, ensure_ascii=False)
+
+
+def save_embedding_store_stream(chunks, path, total=None):
+    """
+    Write chunks to an embedding store as they arrive.
+
+    Rows go straight into a memory-mapped `.npy` sized for `total` chunks.
+    When the count isn't known up front (a chunker streaming its output),
+    rows are appended to a raw file that gets its `.npy` header at the end.
+    Both files are written next to their targets and moved into place at
+    the end, so readers never see a half-written store.
+
+    Args:
+        chunks (Iterable[dict]): Chunks with "embedding" set (e.g. from `embed_chunk_stream`).
+        path (str): Store path, with or without extension.
+        total (int, optional): Number of chunks the iterable yields.
+
+    Returns:
+        int: Number of chunks written.
+    """
+    npy_path, meta_path = _store_paths(path)
+    tmp_npy, tmp_meta, tmp_raw = npy_path + ".tmp", meta_path + ".tmp", npy_path + ".raw.tmp"
+    matrix = None
+    raw = open(tmp_raw, "wb") if total is None else None
+    dim = 0
+    metadata = []
+    try:
+        for row, chunk in enumerate(chunks):
+            embedding = np.asarray(chunk.pop("embedding"), dtype="float32")
+            dim = embedding.shape[0]
+            if raw is not None:
+                raw.write(embedding.tobytes())
+            else:
+                if matrix is None:
+                    matrix = np.lib.format.open_memmap(tmp_npy, mode="w+", dtype="float32", shape=(total, dim))
+                matrix[row] = embedding
+            metadata.append(chunk)
+        if raw is not None:
+            raw.close()
+            with open(tmp_npy, "wb") as f, open(tmp_raw, "rb") as rows:
+                np.lib.format.write_array_header_1_0(
+                    f, {"descr": np.lib.format.dtype_to_descr(np.dtype("float32")),
+                        "fortran_order": False, "shape": (len(metadata), dim)}
+                )
+                shutil.copyfileobj(rows, f)
+        elif matrix is None:
+            with open(tmp_npy, "wb") as f:
+                np.save(f, np.zeros((0, 0), dtype="float32"))
+        else:
+            matrix.flush()
+            del matrix
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump(metadata, f, ensure_ascii=False)
+        os.replace(tmp_npy, npy_path)
+        os.replace(tmp_meta, meta_path)
+    finally:
+        if raw is not None:
+            raw.close()
+        for tmp in (tmp_npy, tmp_meta, tmp_raw):
+            if os.path.exists(tmp):
+                os.remove(tmp)
+    return len(metadata)
+
+
+def load_embedding_store(path, mmap=True):
+    """
+    Load embedded chunks, preferring the binary store.
+
+    Falls back to a legacy `*_embedded.json` file (chunks with "embedding"
+    float lists) when no `.npy` store exists for `path`.
+
+    Args:
+        path (str): Store path, with or without extension.
+        mmap (bool, optional): Memory-map the matrix read-only instead of reading it.
+
+    Returns:
+        tuple:
+            - embeddings (numpy.ndarray): float32 matrix, one row per chunk.
+            - metadata (list[dict]): Chunk dicts without embeddings, in row order.
+
+    Raises:
+        FileNotFoundError: If neither the store nor the legacy JSON exists.
+    """
+    npy_path, meta_path = _store_paths(path)
+    if os.path.exists(npy_path):
+        embeddings = np.load(npy_path, mmap_mode="r" if mmap else None)
+        with open(meta_path, "r", encoding="utf-8") as f:
+            return embeddings, json.load(f)
+    legacy_path = npy_path[:-len(".npy")] + ".json"
+    if not os.path.exists(legacy_path):
+        raise FileNotFoundError(f"No embedding store at {npy_path} and no legacy {legacy_path}")
+    chunks = load_chunks(legacy_path)
+    embeddings = np.array([c.pop("embedding") for c in chunks], dtype="float32")
+    return embeddings, chunks
+
+
 # def embed_text(text):
 #     """
 #     Generate embedding vector for a text using OpenAI.
@@ -160,25 +410,134 @@ def embed_text(text):
 #     return response.data[0].embedding
 
 
-def build_faiss_index(chunks, embedding_dim=384):
+def normalize_embeddings(embeddings):
     """
-    Build a FAISS index from chunk embeddings.
+    L2-normalize embedding rows so inner product equals cosine similarity.
+
+    Args:
+        embeddings (numpy.ndarray): One vector or a (n, dim) matrix.
+
+    Returns:
+        numpy.ndarray: float32 copy with unit-length rows (zero rows stay zero).
+    """
+    embeddings = np.array(embeddings, dtype="float32")
+    norms = np.linalg.norm(embeddings, axis=-1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+
+def choose_index_type(n_vectors, index_type=None):
+    """
+    Resolve the FAISS index type for a corpus.
+
+    "auto" keeps exact search (flat_ip) for small corpora, where a scan is
+    already fast, moves to an HNSW graph from RAG_HNSW_MIN_VECTORS, and to
+    IVF-PQ from RAG_IVFPQ_MIN_VECTORS, where full float vectors stop fitting
+    comfortably in RAM.
 
     Args:
-        chunks (list): List of chunk dicts containing an "embedding" key.
+        n_vectors (int): Number of vectors to index.
+        index_type (str, optional): One of INDEX_TYPES or "auto"; defaults
+            to RAG_INDEX_TYPE.
+
+    Returns:
+        str: One of INDEX_TYPES.
+
+    Raises:
+        ValueError: If the type is unknown.
+    """
+    index_type = index_type or RAG_INDEX_TYPE
+    if index_type == "auto":
+        if n_vectors >= RAG_IVFPQ_MIN_VECTORS:
+            index_type = "ivfpq"
+        elif n_vectors >= RAG_HNSW_MIN_VECTORS:
+            index_type = "hnsw"
+        else:
+            index_type = "flat_ip"
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown RAG index type {index_type!r}; expected 'auto' or one of {INDEX_TYPES}")
+    if index_type == "ivfpq" and n_vectors < IVFPQ_MIN_TRAIN:
+        print(f"IVF-PQ needs at least {IVFPQ_MIN_TRAIN} vectors to train, got {n_vectors}; using flat_ip")
+        index_type = "flat_ip"
+    return index_type
+
+
+def new_faiss_index(index_type, embedding_dim, n_vectors):
+    """
+    Create an empty FAISS index of the given type.
+
+    Args:
+        index_type (str): One of INDEX_TYPES (already resolved, not "auto").
         embedding_dim (int): Dimensionality of embeddings.
+        n_vectors (int): Expected corpus size; sizes the IVF coarse quantizer.
 
     Returns:
-        faiss.Index: In-memory FAISS index.
+        faiss.Index: Untrained for "ivfpq" (see `build_faiss_index`), ready
+        to add vectors otherwise. IVF-PQ codes alone lose too much precision
+        on 384-dim vectors for top-5 retrieval, so its shortlist is re-ranked
+        against 8-bit scalar-quantized copies (IndexRefine, ~430 bytes per
+        vector instead of 1536).
     """
+    import faiss
+
+    if index_type == "flat_l2":
+        return faiss.IndexFlatL2(embedding_dim)
+    if index_type == "flat_ip":
+        return faiss.IndexFlatIP(embedding_dim)
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(embedding_dim, RAG_HNSW_M, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = max(2 * RAG_HNSW_M, 40)
+        index.hnsw.efSearch = RAG_HNSW_EF_SEARCH
+        return index
+    # ivfpq: ~4*sqrt(N) lists, 8-dim sub-vectors at 8 bits (48 bytes per 384-dim vector)
+    nlist = max(1, min(int(4 * np.sqrt(n_vectors)), n_vectors // 39))
+    m = next(m for m in (embedding_dim // 8, embedding_dim // 4, embedding_dim // 2, embedding_dim)
+             if m and embedding_dim % m == 0)
+    quantizer = faiss.IndexFlatIP(embedding_dim)
+    ivf = faiss.IndexIVFPQ(quantizer, embedding_dim, nlist, m, 8, faiss.METRIC_INNER_PRODUCT)
+    ivf.nprobe = min(RAG_IVF_NPROBE, nlist)
+    refine = faiss.IndexScalarQuantizer(embedding_dim, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+    index = faiss.IndexRefine(ivf, refine)
+    index.k_factor = RAG_IVF_REFINE
+    return index
+
 
-    # Import faiss only when needed
+def is_inner_product(index):
+    """True if `index` ranks by inner product (higher is closer) rather than L2 distance."""
     import faiss
-    import numpy as np
 
-    index = faiss.IndexFlatL2(embedding_dim)
-    embeddings = np.array([chunk["embedding"] for chunk in chunks], dtype='float32')
+    return index.metric_type == faiss.METRIC_INNER_PRODUCT
+
+
+def build_faiss_index(chunks, embedding_dim=384, embeddings=None, index_type=None):
+    """
+    Build a FAISS index from chunk embeddings.
+
+    Args:
+        chunks (list): List of chunk dicts; must contain an "embedding" key
+            unless `embeddings` is given.
+        embedding_dim (int): Dimensionality of embeddings.
+        embeddings (numpy.ndarray, optional): float32 matrix aligned with
+            `chunks`, e.g. from `load_embedding_store`.
+        index_type (str, optional): One of INDEX_TYPES or "auto"; defaults
+            to RAG_INDEX_TYPE (see `choose_index_type`).
+
+    Returns:
+        faiss.Index: In-memory FAISS index. Search params (efSearch, nprobe)
+        are stored with it by `save_faiss`.
+    """
+    if embeddings is None:
+        embeddings = np.array([chunk["embedding"] for chunk in chunks], dtype='float32')
+    index_type = choose_index_type(len(embeddings), index_type)
+    if index_type == "flat_l2":
+        embeddings = np.ascontiguousarray(embeddings, dtype='float32')
+    else:
+        embeddings = normalize_embeddings(embeddings)
+
+    index = new_faiss_index(index_type, embedding_dim, len(embeddings))
+    if not index.is_trained:
+        index.train(embeddings)
     index.add(embeddings)
+    print(f"Built {index_type} FAISS index with {index.ntotal} vectors")
     return index
 
 
@@ -195,19 +554,27 @@ def save_faiss(index, path):
     faiss.write_index(index, path)
 
 
-def load_faiss_index(path):
+def load_faiss_index(path, mmap=False):
     """
     Load a FAISS index from disk.
 
     Args:
         path (str): Path to the FAISS index file.
+        mmap (bool, optional): Memory-map the vectors read-only instead of
+            copying them into RAM (flat codes need faiss >= 1.10 for this;
+            older versions fall back to plain IO_FLAG_MMAP). Pages are shared
+            between worker processes and loaded on demand.
 
     Returns:
-        faiss.Index: Loaded FAISS index.
+        faiss.Index: Loaded FAISS index (must not be modified when memory-mapped).
     """
     import faiss
 
-    return faiss.read_index(path)
+    if not mmap:
+        return faiss.read_index(path)
+    if hasattr(faiss, "IO_FLAG_MMAP_IFC"):
+        return faiss.read_index(path, faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY)
+    return faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
 
 
 def save_metadata(chunks, out_path):
@@ -220,16 +587,21 @@ def save_metadata(chunks, out_path):
 
     Notes:
         - Ensures the directory exists.
-        - Saves id, filename, chunk_index, and text.
+        - Saves id, filename, chunk_index, and text, plus the incremental
+          indexing fields (key, content_hash, faiss_id) when present.
     """
     metadata = []
     for c in chunks:
-        metadata.append({
+        entry = {
             "id": c["id"],
             "filename": c.get("filename", "unknown"),
             "chunk_index": c.get("chunk_index", -1),  # use -1 or None if missing
             "text": c.get("text", "")
-        })
+        }
+        for field in INCREMENTAL_FIELDS:
+            if field in c:
+                entry[field] = c[field]
+        metadata.append(entry)
     os.makedirs(os.path.dirname(out_path), exist_ok=True)
     with open(out_path, "w", encoding="utf-8") as f:
         json.dump(metadata, f, indent=2, ensure_ascii=False)
@@ -238,16 +610,20 @@ def save_metadata(chunks, out_path):
 
 def load_metadata(path):
     """
-    Load chunk metadata from a JSON file.
+    Load chunk metadata from a JSON file, keyed by FAISS id.
+
+    Incrementally built indexes (see incremental_index.py) store an explicit
+    "faiss_id" per entry; for indexes built in one go the id is the position.
 
     Args:
         path (str): Metadata file path.
 
     Returns:
-        list: List of chunk metadata dicts.
+        dict[int, dict]: FAISS id -> chunk metadata dict.
     """
     with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+        entries = json.load(f)
+    return {entry.get("faiss_id", position): entry for position, entry in enumerate(entries)}
 
 
 def embed_query(query):
@@ -258,12 +634,10 @@ def embed_query(query):
             query (str): Search query.
 
         Returns:
-            numpy.ndarray: Embedding vector as float32 array.
+            numpy.ndarray: Unit-length embedding vector as float32 array.
         """
     model = get_embedding_model()
-    embedding = model.encode(query)
-    return np.array(embedding).astype('float32')
-    return np.array(response.data[0].embedding).astype('float32')
+    return normalize_embeddings(model.encode(query))
 
 
 def search_index(index, query_embedding, top_k=3):
@@ -278,7 +652,9 @@ def search_index(index, query_embedding, top_k=3):
     Returns:
         tuple:
             - indices (list[int]): Indices of matching chunks.
-            - distances (list[float]): Corresponding L2 distances.
+            - distances (list[float]): Corresponding scores: L2 distances
+              (lower is closer) or cosine similarities for inner-product
+              indexes (higher is closer; see `is_inner_product`).
     """
     distances, indices = index.search(np.array([query_embedding]), top_k)
     return indices[0], distances[0]
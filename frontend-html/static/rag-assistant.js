@@ -40,18 +40,26 @@ function appendMessage(container, sender, text) {
   container.scrollTop = container.scrollHeight;
 }
 
+// Server-side conversation id per assistant endpoint (history lives on the server)
+const ragConversationIds = {};
+
 // Query backend RAG API
 async function queryRagAPI(endpoint, question, history) {
+  const conversationId = ragConversationIds[endpoint];
   try {
     const response = await fetch(endpoint, {
       method: 'POST',
       headers: {'Content-Type': 'application/json'},
-      body: JSON.stringify({ question, history })
+      // History is only needed to start a conversation
+      body: JSON.stringify(conversationId ? { question, conversation_id: conversationId } : { question, history })
     });
     if (!response.ok) {
       throw new Error(`API error: ${response.statusText}`);
     }
     const data = await response.json();
+    if (data.conversation_id) {
+      ragConversationIds[endpoint] = data.conversation_id;
+    }
     return data.answer;
   } catch (err) {
     return `Error: ${err.message}`;
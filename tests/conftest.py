@@ -0,0 +1,184 @@
+"""
+Shared fixtures: every database test runs against SQLite and PostgreSQL.
+
+PostgreSQL comes from TEST_POSTGRES_URL when set (a server URL; each test
+gets its own database on it). Otherwise the harness starts a throwaway
+server in a temp directory: with pg_ctl/initdb (from PG_BIN or PATH), or
+with pgserver when running as root, which postgres refuses. Without either
+the PostgreSQL cases are skipped.
+
+Fixtures:
+    database_url : Empty database, parametrized over sqlite / postgresql.
+    migrated_url : Same, after `alembic upgrade head`.
+    db_session   : Sync session on a migrated database, with app.database
+                   rebound to it (default user seeded).
+    client       : TestClient for the sessions, tracks and chat routers on
+                   that database.
+"""
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import uuid
+from pathlib import Path
+
+# Before any app import: main.py runs init_db() against DATABASE_URL at import time
+_IMPORT_DIR = tempfile.mkdtemp(prefix="zz-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_IMPORT_DIR}/import.db"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+os.environ["RAG_ENABLED"] = "false"
+
+import pytest
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, make_url, text
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def alembic_config() -> Config:
+    """Alembic config for the repo's migrations, without the ini's logging setup."""
+    cfg = Config()
+    cfg.set_main_option("script_location", str(ROOT / "alembic"))
+    return cfg
+
+
+def run_alembic(monkeypatch, url: str, action: str, revision: str):
+    """Run `alembic upgrade|downgrade <revision>` against `url` (env.py reads DATABASE_URL)."""
+    monkeypatch.setenv("DATABASE_URL", url)
+    getattr(command, action)(alembic_config(), revision)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_pg_ctl(workdir: Path):
+    """Start postgres with initdb/pg_ctl; None when unavailable or running as root."""
+    pg_ctl = shutil.which("pg_ctl", path=os.getenv("PG_BIN") or os.environ.get("PATH"))
+    if not pg_ctl or os.geteuid() == 0:
+        return None
+    bin_dir = Path(pg_ctl).parent
+    data = workdir / "data"
+    subprocess.run([bin_dir / "initdb", "-D", data, "-U", "postgres", "-A", "trust", "--no-sync"],
+                   check=True, capture_output=True)
+    port = _free_port()
+    subprocess.run([pg_ctl, "-D", data, "-l", workdir / "postgres.log", "-w", "start",
+                    "-o", f"-p {port} -k {workdir} -c listen_addresses=127.0.0.1 -c fsync=off"],
+                   check=True, capture_output=True)
+
+    def stop():
+        subprocess.run([pg_ctl, "-D", data, "-m", "immediate", "stop"], capture_output=True)
+
+    return f"postgresql+psycopg://postgres@127.0.0.1:{port}/postgres", stop
+
+
+def _start_pgserver(workdir: Path):
+    """Start postgres through pgserver (bundled binaries, handles root); None if not installed."""
+    try:
+        import pgserver
+    except ImportError:
+        return None
+    # pgserver runs postgres as a separate user when we're root; it must reach the data dir
+    workdir.chmod(0o755)
+    server = pgserver.get_server(workdir, cleanup_mode="stop")
+    url = make_url(server.get_uri()).set(drivername="postgresql+psycopg")
+    return url.render_as_string(hide_password=False), server.cleanup
+
+
+@pytest.fixture(scope="session")
+def postgres_server():
+    """URL of a PostgreSQL server for the session (see module docstring)."""
+    if os.getenv("TEST_POSTGRES_URL"):
+        yield os.environ["TEST_POSTGRES_URL"]
+        return
+    workdir = Path(tempfile.mkdtemp(prefix="zz-pg-"))
+    started = _start_pg_ctl(workdir) or _start_pgserver(workdir)
+    if started is None:
+        shutil.rmtree(workdir, ignore_errors=True)
+        pytest.skip("no PostgreSQL available (set TEST_POSTGRES_URL, PG_BIN, or install pgserver)")
+    url, stop = started
+    try:
+        yield url
+    finally:
+        stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+@pytest.fixture(params=["sqlite", "postgresql"])
+def database_url(request, tmp_path):
+    """An empty database on each backend."""
+    if request.param == "sqlite":
+        yield f"sqlite:///{tmp_path / 'test.db'}"
+        return
+
+    server_url = request.getfixturevalue("postgres_server")
+    name = f"zz_test_{uuid.uuid4().hex[:12]}"
+    admin = create_engine(server_url, isolation_level="AUTOCOMMIT")
+    with admin.connect() as conn:
+        conn.execute(text(f'CREATE DATABASE "{name}"'))
+    try:
+        yield make_url(server_url).set(database=name).render_as_string(hide_password=False)
+    finally:
+        with admin.connect() as conn:
+            conn.execute(text(f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)'))
+        admin.dispose()
+
+
+@pytest.fixture
+def migrated_url(database_url, monkeypatch):
+    run_alembic(monkeypatch, database_url, "upgrade", "head")
+    return database_url
+
+
+@pytest.fixture
+def db_session(migrated_url, monkeypatch):
+    """
+    Point app.database at the migrated test database.
+
+    The session factories are module-level objects imported by the routers,
+    so they are rebound in place rather than replaced.
+    """
+    from app import database
+
+    sync_engine, async_engine = database.create_engines(migrated_url)
+    old_sync_bind = database.SessionLocal.kw["bind"]
+    old_async_bind = database.AsyncSessionLocal.kw["bind"]
+    monkeypatch.setattr(database, "engine", sync_engine)
+    monkeypatch.setattr(database, "async_engine", async_engine)
+    database.SessionLocal.configure(bind=sync_engine)
+    database.AsyncSessionLocal.configure(bind=async_engine)
+    database.init_db()
+
+    db = database.SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+        database.SessionLocal.configure(bind=old_sync_bind)
+        database.AsyncSessionLocal.configure(bind=old_async_bind)
+        sync_engine.dispose()
+
+
+@pytest.fixture
+def client(db_session):
+    """TestClient for the database-backed routers, mounted as in main.py."""
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from app import database
+    from app.routers import chat, sessions, tracks
+
+    app = FastAPI()
+    app.include_router(chat.router, prefix="/chat")
+    app.include_router(sessions.router)
+    app.include_router(tracks.router, prefix="/tracks")
+
+    # One portal (event loop) for all requests, so pooled asyncpg connections stay on their loop
+    with TestClient(app) as test_client:
+        yield test_client
+        test_client.portal.call(database.AsyncSessionLocal.kw["bind"].dispose)
@@ -0,0 +1,94 @@
+"""Bulk delete paths: app.deletion, the delete endpoints and ON DELETE CASCADE."""
+from sqlalchemy import text
+
+from app import deletion
+from app.database import DEFAULT_USER_ID
+from app.models import AnalysisResult, ChatMessage, Session as UserSession, Track
+
+from tests.test_read_endpoints import seed
+
+
+def counts(db):
+    return {
+        model.__tablename__: db.query(model).count()
+        for model in (UserSession, Track, AnalysisResult, ChatMessage)
+    }
+
+
+def add_other_session(db):
+    """Rows that must survive deleting session s1."""
+    db.add(UserSession(id="s2", user_id=DEFAULT_USER_ID, session_name="Other"))
+    db.add(Track(id="u1", session_id="s2", track_name="Keep", type="mixdown", file_path="uploads/keep.wav"))
+    db.flush()
+    db.add(ChatMessage(session_id="s2", track_id="u1", sender="assistant", message="kept"))
+    db.commit()
+
+
+def test_delete_session_endpoint(client, db_session, monkeypatch):
+    queued = []
+    monkeypatch.setattr("app.routers.sessions.enqueue_artifact_removal", queued.extend)
+    seed(db_session)
+    add_other_session(db_session)
+
+    assert client.delete("/sessions/s1").status_code == 200
+    assert client.delete("/sessions/s1").status_code == 404
+
+    db_session.expire_all()
+    assert counts(db_session) == {"sessions": 1, "tracks": 1, "analysis_results": 0, "chat_history": 1}
+    assert {p.name for p in queued} == {"intro.wav", "intro.wav_rms.json", "outro.wav", "outro.wav_rms.json"}
+
+
+def test_delete_track_endpoint_removes_its_comparisons(client, db_session, monkeypatch):
+    monkeypatch.setattr("app.routers.tracks.enqueue_artifact_removal", lambda paths: 0)
+    seed(db_session)
+
+    assert client.delete("/tracks/t1").status_code == 200
+    assert client.delete("/tracks/t1").status_code == 404
+
+    db_session.expire_all()
+    assert [t.id for t in db_session.query(Track)] == ["t2"]
+    assert db_session.query(AnalysisResult).count() == 0
+    # Both the track's chat and the comparison group that included it are gone
+    assert db_session.query(ChatMessage).count() == 0
+
+
+def test_delete_comparison_endpoint(client, db_session):
+    seed(db_session)
+    assert client.delete("/chat/comparisons/g1").json()["detail"].startswith("Deleted 1 ")
+    assert client.delete("/chat/comparisons/g1").status_code == 404
+    db_session.expire_all()
+    assert db_session.query(ChatMessage).filter(ChatMessage.comparison_group_id.isnot(None)).count() == 0
+    assert db_session.query(ChatMessage).count() == 2
+
+
+def test_delete_tracks_batches_comparison_lookup(db_session):
+    """More tracks than one LIKE batch; every referencing comparison group is found."""
+    n = deletion._LIKE_BATCH + 20
+    db_session.add(UserSession(id="big", user_id=DEFAULT_USER_ID, session_name="Big"))
+    db_session.add_all(Track(id=f"bt{i}", session_id="big", track_name=f"T{i}", file_path=f"uploads/{i}.wav")
+                       for i in range(n))
+    db_session.flush()
+    db_session.add_all([
+        ChatMessage(session_id="big", sender="assistant", message="first batch",
+                    comparison_group_id="ga", compared_track_ids="bt0,bt1"),
+        ChatMessage(session_id="big", sender="assistant", message="last batch",
+                    comparison_group_id="gb", compared_track_ids=f"bt{n - 1},bt{n - 2}"),
+    ])
+    db_session.commit()
+
+    result = deletion.delete_tracks(db_session, [f"bt{i}" for i in range(n)])
+    db_session.commit()
+
+    assert result["tracks"] == n
+    assert result["comparison_groups"] == 2
+    assert result["chats"] == 2
+    assert len(result["artifacts"]) == 2 * n
+    assert db_session.query(Track).count() == 0
+
+
+def test_database_cascades_session_delete(db_session):
+    """The migrated foreign keys cascade without the ORM (raw DELETE)."""
+    seed(db_session)
+    db_session.execute(text("DELETE FROM sessions WHERE id = 's1'"))
+    db_session.commit()
+    assert counts(db_session) == {"sessions": 0, "tracks": 0, "analysis_results": 0, "chat_history": 0}
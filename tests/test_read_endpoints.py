@@ -0,0 +1,81 @@
+"""Async (AsyncSession) read endpoints of the sessions, tracks and chat routers."""
+from datetime import datetime, timedelta, timezone
+import json
+
+from app.database import DEFAULT_USER_ID
+from app.models import AnalysisResult, ChatMessage, Session as UserSession, Track
+
+
+def seed(db):
+    """One session with two tracks (one analyzed, with feedback) and a comparison group."""
+    db.add(UserSession(id="s1", user_id=DEFAULT_USER_ID, session_name="Album"))
+    now = datetime.now(timezone.utc)
+    db.add_all([
+        Track(id="t1", session_id="s1", track_name="Intro", type="mixdown",
+              file_path="uploads/intro.wav", uploaded_at=now - timedelta(minutes=2)),
+        Track(id="t2", session_id="s1", track_name="Outro", type="master",
+              file_path="uploads/outro.wav", uploaded_at=now - timedelta(minutes=1)),
+    ])
+    db.flush()
+    db.add(AnalysisResult(track_id="t1", peak_db=-1.0, lufs=-9.5, tempo=120.0,
+                          band_energies=json.dumps({"low": 0.4}), issues=json.dumps(["clipping"])))
+    db.add_all([
+        ChatMessage(session_id="s1", track_id="t1", sender="user", message="How is the low end?",
+                    timestamp=now - timedelta(seconds=30)),
+        ChatMessage(session_id="s1", track_id="t1", sender="assistant", message="Tight and punchy.",
+                    feedback_profile="detailed", timestamp=now - timedelta(seconds=20)),
+        ChatMessage(session_id="s1", sender="assistant", message="### Comparison\nIntro is louder.",
+                    comparison_group_id="g1", compared_track_ids="t1,t2",
+                    compared_track_names="Intro,Outro"),
+    ])
+    db.commit()
+
+
+def test_list_and_get_session(client, db_session):
+    seed(db_session)
+    assert {"id": "s1", "session_name": "Album"} in client.get("/sessions/").json()
+    assert client.get("/sessions/s1").json()["session_name"] == "Album"
+    assert client.get("/sessions/missing").status_code == 404
+
+
+def test_tracks_for_session_filter_and_sort(client, db_session):
+    seed(db_session)
+    tracks = client.get("/sessions/s1/tracks", params={"sort_by": "track_name", "sort_order": "asc"}).json()
+    assert [t["track_name"] for t in tracks] == ["Intro", "Outro"]
+
+    newest_first = client.get("/sessions/s1/tracks").json()
+    assert [t["track_name"] for t in newest_first] == ["Outro", "Intro"]
+
+    intro = client.get("/sessions/s1/tracks", params={"type": "MIXDOWN"}).json()
+    assert [t["track_name"] for t in intro] == ["Intro"]
+    assert client.get("/sessions/missing/tracks").status_code == 404
+
+
+def test_get_single_track(client, db_session):
+    seed(db_session)
+    body = client.get("/tracks/t2").json()
+    assert body == {"id": "t2", "track_name": "Outro", "type": "master",
+                    "session_id": "s1", "file_path": "uploads/outro.wav"}
+    assert client.get("/tracks/missing").status_code == 404
+
+
+def test_messages_for_track_in_order(client, db_session):
+    seed(db_session)
+    messages = client.get("/chat/tracks/t1/messages").json()
+    assert [m["message"] for m in messages] == ["How is the low end?", "Tight and punchy."]
+    assert messages[1]["feedback_profile"] == "detailed"
+    assert client.get("/chat/tracks/missing/messages").status_code == 404
+
+
+def test_comparison_history_and_group(client, db_session):
+    seed(db_session)
+    history = client.get("/chat/comparisons").json()
+    assert len(history) == 1
+    assert history[0]["group_id"] == "g1"
+    assert history[0]["track_ids"] == ["t1", "t2"]
+    assert sorted(history[0]["track_names"]) == ["Intro", "Outro"]
+
+    group = client.get("/chat/comparisons/g1").json()
+    assert group["feedback"].startswith("### Comparison")
+    assert group["track_names"] == ["Intro", "Outro"]
+    assert client.get("/chat/comparisons/missing").status_code == 404
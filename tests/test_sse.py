@@ -0,0 +1,47 @@
+"""sse_response: on_close runs however the response ends."""
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.requests import ClientDisconnect
+
+from app.sse import format_sse, sse_response
+
+
+def test_on_close_after_stream_finishes():
+    closed = []
+
+    async def events():
+        yield format_sse({"delta": "hi"})
+        yield format_sse({"answer": "hi"}, event="done")
+
+    app = FastAPI()
+    app.get("/stream")(lambda: sse_response(events(), on_close=lambda: closed.append(True)))
+
+    body = TestClient(app).get("/stream").text
+    assert body.endswith('event: done\ndata: {"answer": "hi"}\n\n')
+    assert closed == [True]
+
+
+def test_on_close_when_client_is_gone_before_the_stream_starts():
+    """The generator never runs; a BackgroundTask would be skipped here."""
+    closed = []
+    started = []
+
+    async def events():
+        started.append(True)
+        yield format_sse({"delta": "never sent"})
+
+    async def send(message):
+        raise OSError("connection reset")
+
+    async def receive():
+        return {"type": "http.disconnect"}
+
+    response = sse_response(events(), on_close=lambda: closed.append(True))
+    scope = {"type": "http", "asgi": {"spec_version": "2.4"}}
+    with pytest.raises(ClientDisconnect):
+        asyncio.run(response(scope, receive, send))
+    assert closed == [True]
+    assert started == []
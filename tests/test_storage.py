@@ -0,0 +1,89 @@
+"""Quota reservations and eviction in app.storage."""
+import os
+import threading
+
+from app.database import DEFAULT_USER_ID
+from app.models import AnalysisResult, Session as UserSession, Track
+from app.storage import StorageManager
+
+
+def make_storage(tmp_path, quota=1000):
+    folders = {name: tmp_path / name for name in ("uploads", "rms", "cache")}
+    for folder in folders.values():
+        folder.mkdir()
+    return StorageManager(folders, quota_bytes=quota, high_watermark=0.9,
+                          low_watermark=0.5, min_age_seconds=0)
+
+
+def write(path, size, age=3600):
+    path.write_bytes(b"x" * size)
+    old = path.stat().st_mtime - age
+    os.utime(path, (old, old))
+
+
+def test_pending_reservations_count_against_quota(tmp_path):
+    storage = make_storage(tmp_path)
+    assert storage.reserve(600)
+    # Nothing is on disk yet, but the first upload's bytes are spoken for
+    assert not storage.reserve(600)
+    assert storage.usage()["pending_bytes"] == 600
+
+    write(tmp_path / "uploads" / "a.wav", 550, age=0)
+    storage.register(tmp_path / "uploads" / "a.wav", reserved=600)
+    assert storage.usage()["pending_bytes"] == 0
+    assert storage.usage()["total_bytes"] == 550
+
+    assert storage.reserve(300)
+    storage.release(300)
+    assert storage.usage()["pending_bytes"] == 0
+
+
+def test_eviction_expires_tracks_like_cleanup(tmp_path, db_session, monkeypatch):
+    # Uploads store file_path relative to the backend working dir
+    monkeypatch.chdir(tmp_path)
+    storage = make_storage(tmp_path)
+    write(tmp_path / "uploads" / "old.wav", 500)
+    write(tmp_path / "rms" / "old.wav_rms.json", 100)
+    db_session.add(UserSession(id="s1", user_id=DEFAULT_USER_ID, session_name="S"))
+    db_session.add_all([
+        Track(id="old", session_id="s1", track_name="Old", file_path="uploads/old.wav"),
+        Track(id="other", session_id="s1", track_name="Other", file_path="uploads/other.wav"),
+    ])
+    db_session.flush()
+    db_session.add_all([AnalysisResult(track_id="old", lufs=-9.0), AnalysisResult(track_id="other", lufs=-8.0)])
+    db_session.commit()
+
+    assert storage.reserve(400)
+
+    assert not (tmp_path / "uploads" / "old.wav").exists()
+    assert not (tmp_path / "rms" / "old.wav_rms.json").exists()
+    assert storage.usage()["evicted"] == {"files": 2, "bytes": 600}
+    db_session.expire_all()
+    assert db_session.get(Track, "old").file_path is None
+    assert db_session.get(Track, "other").file_path == "uploads/other.wav"
+    assert [a.track_id for a in db_session.query(AnalysisResult)] == ["other"]
+
+
+def test_evicted_files_are_removed_outside_the_lock(tmp_path, monkeypatch):
+    storage = make_storage(tmp_path)
+    write(tmp_path / "cache" / "old.bin", 800)
+    lock_free = []
+    unlink = type(tmp_path).unlink
+
+    def try_lock():
+        acquired = storage._lock.acquire(timeout=1)
+        if acquired:
+            storage._lock.release()
+        lock_free.append(acquired)
+
+    def checked_unlink(path, *args, **kwargs):
+        # Another thread must be able to take the lock while files are deleted
+        thread = threading.Thread(target=try_lock)
+        thread.start()
+        thread.join()
+        return unlink(path, *args, **kwargs)
+
+    monkeypatch.setattr(type(tmp_path), "unlink", checked_unlink)
+    assert storage.reserve(300)
+    assert not (tmp_path / "cache" / "old.bin").exists()
+    assert lock_free == [True]
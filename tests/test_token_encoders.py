@@ -0,0 +1,31 @@
+"""app.utils.get_encoder: failed loads are retried, not cached for good."""
+from app import utils
+
+
+def test_failed_encoder_load_is_retried(monkeypatch):
+    monkeypatch.setattr(utils, "_encoders", {})
+    monkeypatch.setattr(utils, "_encoder_retry_at", {})
+    monkeypatch.setattr(utils, "TOKEN_ENCODER_RETRY_SECONDS", 60)
+    now = [1000.0]
+    monkeypatch.setattr(utils.time, "monotonic", lambda: now[0])
+    attempts = []
+    encoder = object()
+
+    def encoding_for_model(model):
+        attempts.append(model)
+        if len(attempts) == 1:
+            raise ConnectionError("BPE download failed")
+        return encoder
+
+    monkeypatch.setattr(utils.tiktoken, "encoding_for_model", encoding_for_model)
+
+    assert utils.get_encoder("gpt-4o") is None
+    # Within the retry window the failure is not re-attempted
+    now[0] += 30
+    assert utils.get_encoder("gpt-4o") is None
+    assert len(attempts) == 1
+
+    now[0] += 31
+    assert utils.get_encoder("gpt-4o") is encoder
+    assert utils.get_encoder("gpt-4o") is encoder
+    assert len(attempts) == 2